@@ -0,0 +1,159 @@
+"""
+Compact forms of example code and API chunks for prompt injection.
+
+The compact form keeps everything the model can learn from (calls, kwargs,
+structure, signatures) and drops what it cannot: comments, blank lines, the
+`from manim import *` header every scene shares, and the bulk of long
+literal tables.
+"""
+import ast
+import io
+import tokenize
+from typing import List, Dict, Any
+
+# Literal lists/tuples longer than this are cut down to their first items
+MAX_LITERAL_ITEMS = 6
+KEPT_LITERAL_ITEMS = 3
+
+MAX_NOTE_LINES = 6
+MAX_DOC_LINES = 3
+
+# Every generated scene starts with this, so examples need not repeat it
+IMPLICIT_IMPORTS = {"from manim import *"}
+
+
+def compact_code(code: str) -> str:
+    """Strip comments, blank lines and shared imports, and elide long literals."""
+    code = _strip_comments(code)
+    code = _elide_long_literals(code)
+
+    lines = []
+    seen_imports = set(IMPLICIT_IMPORTS)
+    for line in code.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith(("import ", "from ")) and not line[:1].isspace():
+            if stripped in seen_imports:
+                continue
+            seen_imports.add(stripped)
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def compact_notes(notes: str) -> str:
+    """Keep the bullet points of an example's notes, without headings."""
+    lines = []
+    for line in notes.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#") or stripped.endswith(":"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines[:MAX_NOTE_LINES])
+
+
+def compact_api_chunk(chunk: Dict[str, Any]) -> str:
+    """
+    Signature-only view of an API chunk from ManimChunker.
+
+    Classes become "class Name(Bases)  # module", the first docstring lines
+    and one ".method(signature)" per line; modules keep only the start of
+    their docstring.
+    """
+    if chunk.get("type") != "class":
+        doc_lines = [l for l in chunk.get("content", "").splitlines()[1:] if l.strip()]
+        return f"module {chunk.get('module', '')}\n" + "\n".join(doc_lines[:MAX_DOC_LINES])
+
+    bases = ", ".join(chunk.get("bases") or [])
+    header = f"class {chunk['name']}({bases})" if bases else f"class {chunk['name']}"
+    lines = [f"{header}  # {chunk.get('module', '')}"]
+    lines.extend(f"  {l}" for l in _docstring_lines(chunk.get("content", ""))[:MAX_DOC_LINES])
+    lines.extend(f"  .{m}" for m in chunk.get("methods") or [])
+    return "\n".join(lines)
+
+
+def _docstring_lines(content: str) -> List[str]:
+    """First paragraph of the docstring section of a chunk's content."""
+    lines = content.splitlines()
+    if "Docstring:" not in lines:
+        return []
+    doc = []
+    for line in lines[lines.index("Docstring:") + 1:]:
+        if not line.strip():
+            if doc:
+                break
+            continue
+        if line.startswith("Methods:"):
+            break
+        doc.append(line.strip())
+    return doc
+
+
+def _strip_comments(code: str) -> str:
+    """Remove comments with the tokenizer, so '#' inside strings survives."""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code
+
+    lines = code.splitlines()
+    for tok in reversed(tokens):
+        if tok.type == tokenize.COMMENT:
+            row, col = tok.start
+            lines[row - 1] = lines[row - 1][:col].rstrip()
+    return "\n".join(lines)
+
+
+def _elide_long_literals(code: str) -> str:
+    """Shorten long list/tuple literals of constants to their first items."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+
+    targets = []
+    for node in ast.walk(tree):
+        if (isinstance(node, (ast.List, ast.Tuple, ast.Set))
+                and len(node.elts) > MAX_LITERAL_ITEMS
+                and all(_is_simple_literal(e) for e in node.elts)):
+            targets.append(node)
+
+    if not targets:
+        return code
+
+    # AST column offsets are UTF-8 byte offsets, so splice the encoded source
+    data = code.encode("utf-8")
+    line_offsets = [0]
+    for line in data.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def offset(lineno: int, col: int) -> int:
+        return line_offsets[lineno - 1] + col
+
+    # Outermost literals only, replaced back to front
+    spans = []
+    for node in sorted(targets, key=lambda n: offset(n.lineno, n.col_offset)):
+        start = offset(node.lineno, node.col_offset)
+        end = offset(node.end_lineno, node.end_col_offset)
+        if spans and start < spans[-1][1]:
+            continue
+        kept = ", ".join(ast.get_source_segment(code, e) for e in node.elts[:KEPT_LITERAL_ITEMS])
+        open_, close = {ast.List: "[]", ast.Tuple: "()", ast.Set: "{}"}[type(node)]
+        spans.append((start, end, f"{open_}{kept}, ...{close}".encode("utf-8")))
+
+    for start, end, replacement in reversed(spans):
+        data = data[:start] + replacement + data[end:]
+    return data.decode("utf-8")
+
+
+def _is_simple_literal(node: ast.expr) -> bool:
+    """Constants, names like RED or PI, and small nested tuples/lists of them."""
+    if isinstance(node, (ast.Constant, ast.Name)):
+        return True
+    if isinstance(node, ast.UnaryOp):
+        return _is_simple_literal(node.operand)
+    if isinstance(node, ast.BinOp):
+        return _is_simple_literal(node.left) and _is_simple_literal(node.right)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return len(node.elts) <= MAX_LITERAL_ITEMS and all(_is_simple_literal(e) for e in node.elts)
+    return False
@@ -5,6 +5,8 @@ import json
 from pathlib import Path
 from typing import List, Dict, Any
 
+from app.compact import compact_code, compact_notes
+
 
 class ExampleManager:
     """Manages curated Manim examples."""
@@ -114,7 +116,10 @@ class ExampleManager:
                 "difficulty": meta.get("difficulty", "medium"),
                 "description": meta.get("description", ""),
                 "code": code,
-                "notes": notes
+                "notes": notes,
+                "compact_code": compact_code(code),
+                "compact_notes": compact_notes(notes),
+                "template": meta.get("template")
             })
 
         return examples
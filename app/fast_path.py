@@ -0,0 +1,194 @@
+"""
+Template fast path: render a parameterized example without an LLM call.
+
+An example opts in with a "template" section in its meta.json:
+
+    "template": {
+        "match": ["moving dot", "dot moving"],
+        "vocabulary": ["sine", "axes"],
+        "params": {
+            "DOT_COLOR": {"type": "color", "default": "RED", "aliases": ["dot"]},
+            "RUN_TIME": {"type": "number", "default": 4, "min": 1, "max": 15,
+                         "patterns": ["(\\d+(?:\\.\\d+)?)\\s*(?:s|sec|seconds)\\b"]}
+        }
+    }
+
+Each parameter is a module-level constant in example.py (`DOT_COLOR = RED`)
+whose assignment line is rewritten with the value extracted from the prompt.
+"""
+import logging
+import os
+import re
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_ENABLED = os.getenv("TEMPLATE_FAST_PATH", "1") == "1"
+
+# Minimum retrieval similarity of the example (when retrieval is scored)
+FAST_PATH_MIN_SCORE = float(os.getenv("TEMPLATE_MIN_SCORE", "0.5"))
+
+# Share of the prompt's content words the template must account for
+FAST_PATH_MIN_COVERAGE = float(os.getenv("TEMPLATE_MIN_COVERAGE", "0.9"))
+
+# Longer prompts ask for more than a template can show
+MAX_PROMPT_WORDS = 30
+
+# A color word binds to the nearest alias within this many words
+COLOR_ALIAS_WINDOW = 4
+
+COLOR_NAMES = {
+    "red": "RED", "blue": "BLUE", "green": "GREEN", "yellow": "YELLOW",
+    "orange": "ORANGE", "purple": "PURPLE", "pink": "PINK", "white": "WHITE",
+    "teal": "TEAL", "gold": "GOLD", "maroon": "MAROON", "gray": "GRAY", "grey": "GRAY",
+}
+
+# Words any animation prompt may contain without asking for anything extra
+GENERIC_WORDS = {
+    "the", "and", "with", "from", "into", "onto", "that", "this", "its", "for",
+    "show", "shows", "showing", "create", "make", "draw", "display", "animate",
+    "animation", "animated", "scene", "video", "simple", "using", "use", "please",
+    "move", "moves", "moving", "along", "across", "color", "colored", "colour",
+    "seconds", "second", "sec", "over", "slowly", "quickly", "smoothly",
+    "render", "nice", "small", "little", "big", "basic", "smooth", "some", "our",
+}
+
+_SEQUENCE_RE = re.compile(r'\b(then|after that|afterwards|finally|followed by)\b', re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def extract_params(prompt: str, params: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fill template parameters from the prompt; unmentioned ones keep their default.
+
+    Colors bind to the nearest alias word ("a green dot", "dot in green");
+    a lone color with no alias nearby goes to the first color parameter.
+    Numbers come from the parameter's regex patterns and are clamped to
+    [min, max].
+    """
+    values = {name: spec.get("default") for name, spec in params.items()}
+    words = _words(prompt)
+
+    color_params = [name for name, spec in params.items() if spec.get("type") == "color"]
+    unbound = []
+    for i, word in enumerate(words):
+        if word not in COLOR_NAMES:
+            continue
+        best, best_distance = None, COLOR_ALIAS_WINDOW + 1
+        for name in color_params:
+            for j, other in enumerate(words):
+                if other in params[name].get("aliases", []) and abs(i - j) < best_distance:
+                    best, best_distance = name, abs(i - j)
+        if best:
+            values[best] = COLOR_NAMES[word]
+        else:
+            unbound.append(COLOR_NAMES[word])
+    if unbound and color_params:
+        values[color_params[0]] = unbound[0]
+
+    for name, spec in params.items():
+        if spec.get("type") != "number":
+            continue
+        for pattern in spec.get("patterns", []):
+            match = re.search(pattern, prompt, re.IGNORECASE)
+            if match:
+                value = float(match.group(1))
+                # Bounds in meta.json may be ints
+                value = float(max(spec.get("min", value), min(spec.get("max", value), value)))
+                values[name] = int(value) if value.is_integer() else value
+                break
+
+    return values
+
+
+def fill_template(code: str, values: Dict[str, Any]) -> str:
+    """Rewrite the module-level `NAME = ...` assignments of the template constants."""
+    for name, value in values.items():
+        literal = value if isinstance(value, str) else repr(value)
+        code, count = re.subn(rf'^{name}\s*=.*$', f"{name} = {literal}", code, count=1, flags=re.MULTILINE)
+        if not count:
+            raise ValueError(f"Template constant {name} not found in example code")
+    return code
+
+
+def template_coverage(prompt: str, example: Dict[str, Any]) -> float:
+    """Share of the prompt's content words explained by the example's vocabulary."""
+    template = example["template"]
+    vocabulary = set(GENERIC_WORDS) | set(COLOR_NAMES)
+    for text in [example.get("name", ""), example.get("description", "")] + list(example.get("tags", [])):
+        vocabulary.update(_words(text))
+    for phrase in template.get("match", []) + template.get("vocabulary", []):
+        vocabulary.update(_words(phrase))
+    for spec in template.get("params", {}).values():
+        vocabulary.update(spec.get("aliases", []))
+
+    content = [w for w in _words(prompt) if len(w) > 2]
+    if not content:
+        return 0.0
+    return sum(1 for w in content if w in vocabulary or w.rstrip("s") in vocabulary) / len(content)
+
+
+class TemplateFastPath:
+    """Matches prompts to parameterized examples and fills them in."""
+
+    def __init__(self, examples_manager, enabled: bool = FAST_PATH_ENABLED):
+        self.examples_manager = examples_manager
+        self.enabled = enabled
+        self.stats = {"checked": 0, "matched": 0}
+
+    def match(self, prompt: str, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Return {"example_id", "code", "params", "coverage"} for a confident
+        match among the retrieved `candidates`, or None.
+
+        Unscored candidates (keyword search) do not narrow the choice, so every
+        template example is considered.
+        """
+        if not self.enabled:
+            return None
+        self.stats["checked"] += 1
+
+        if len(prompt.split()) > MAX_PROMPT_WORDS or _SEQUENCE_RE.search(prompt):
+            return None
+
+        scored = [c for c in candidates if "score" in c and c["score"] != float("inf")]
+        if scored:
+            ids = [c["id"] for c in scored if c["score"] >= FAST_PATH_MIN_SCORE]
+        else:
+            ids = [ex["id"] for ex in self.examples_manager.list_examples()]
+
+        best = None
+        prompt_lower = prompt.lower()
+        for example_id in ids:
+            example = self.examples_manager.get_example(example_id)
+            if not example or not example.get("template"):
+                continue
+            if not any(phrase in prompt_lower for phrase in example["template"].get("match", [])):
+                continue
+            coverage = template_coverage(prompt, example)
+            if coverage >= FAST_PATH_MIN_COVERAGE and (best is None or coverage > best[0]):
+                best = (coverage, example)
+
+        if best is None:
+            return None
+
+        coverage, example = best
+        try:
+            params = extract_params(prompt, example["template"].get("params", {}))
+            code = fill_template(example["code"], params)
+        except Exception as e:
+            logger.warning(f"Template {example['id']} unusable: {e}")
+            return None
+
+        self.stats["matched"] += 1
+        logger.info(f"Template fast path: {example['id']} (coverage {coverage:.2f}) params={params}")
+        return {
+            "example_id": example["id"],
+            "code": code,
+            "params": params,
+            "coverage": round(coverage, 3),
+        }
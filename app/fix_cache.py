@@ -0,0 +1,284 @@
+"""
+Learned fixes for recurring render errors.
+
+Successful fixes are reduced to small patches keyed by a normalized error
+signature. When the same error comes back, a stored patch is applied locally
+before any LLM call is made.
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from app.tracebacks import normalized_signature
+
+logger = logging.getLogger(__name__)
+
+FIX_CACHE_PATH = Path(os.getenv(
+    "MANIM_FIX_CACHE_PATH",
+    str(Path(__file__).parent.parent / "generated" / "fix_cache.json"),
+))
+
+# A fix touching more than this is a rewrite, not a reusable patch
+MAX_HUNKS = 3
+MAX_HUNK_LINES = 6
+
+# Patches that keep failing are skipped once they have had a fair chance
+MIN_USES_BEFORE_DISABLE = 3
+MIN_SUCCESS_RATE = 0.34
+
+
+def _is_ident(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class FixCache:
+    """Stores (error signature, code pattern → replacement) patches and their track record."""
+
+    def __init__(self, path: Path = FIX_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def apply(self, code: str, traceback: str) -> Optional[Dict[str, Any]]:
+        """
+        Try the stored patches for this error on `code`.
+
+        Returns {"fixed_code", "entry_id"} for the best patch that applies and
+        still compiles, or None if nothing matches.
+        """
+        signature = normalized_signature(traceback)
+        candidates = [
+            e for e in self._entries.values()
+            if e["signature"] == signature and self._usable(e)
+        ]
+        candidates.sort(key=self._score, reverse=True)
+
+        for entry in candidates:
+            fixed = self._apply_patches(code, entry["patches"])
+            if fixed is None or fixed == code:
+                continue
+            try:
+                compile(fixed, "scene.py", "exec")
+            except SyntaxError:
+                continue
+
+            with self._lock:
+                self.hits += 1
+                entry["uses"] += 1
+            return {"fixed_code": fixed, "entry_id": entry["id"]}
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def report(self, entry_id: str, success: bool):
+        """Record whether a patch returned by `apply` actually fixed the error."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return
+            entry["successes" if success else "failures"] += 1
+            self._save()
+
+    def record(self, original_code: str, fixed_code: str, traceback: str) -> Optional[str]:
+        """
+        Learn a patch from a fix that resolved `traceback`.
+
+        Returns the entry id, or None if the change was too large to reuse.
+        """
+        patches = self._extract_patches(original_code, fixed_code)
+        if not patches:
+            return None
+
+        signature = normalized_signature(traceback)
+        entry_id = hashlib.sha1(
+            json.dumps([signature, patches], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                entry = {
+                    "id": entry_id,
+                    "signature": signature,
+                    "patches": patches,
+                    "learned": 0,
+                    "uses": 0,
+                    "successes": 0,
+                    "failures": 0,
+                }
+                self._entries[entry_id] = entry
+                logger.info(f"Learned fix {entry_id} for: {signature}")
+            entry["learned"] += 1
+            self._save()
+        return entry_id
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and per-patch success rates."""
+        lookups = self.hits + self.misses
+        entries = sorted(self._entries.values(), key=lambda e: e["uses"], reverse=True)
+        return {
+            "entries": len(entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "patches": [
+                {
+                    "id": e["id"],
+                    "signature": e["signature"],
+                    "learned": e["learned"],
+                    "uses": e["uses"],
+                    "successes": e["successes"],
+                    "failures": e["failures"],
+                    "enabled": self._usable(e),
+                }
+                for e in entries
+            ],
+        }
+
+    def _usable(self, entry: Dict[str, Any]) -> bool:
+        """A patch stays enabled until it has a clear record of not working."""
+        reported = entry["successes"] + entry["failures"]
+        if reported < MIN_USES_BEFORE_DISABLE:
+            return True
+        return entry["successes"] / reported >= MIN_SUCCESS_RATE
+
+    def _score(self, entry: Dict[str, Any]) -> float:
+        """Smoothed success rate, so new patches rank between good and bad ones."""
+        return (entry["successes"] + 1) / (entry["successes"] + entry["failures"] + 2)
+
+    def _extract_patches(self, original_code: str, fixed_code: str) -> List[Dict[str, Any]]:
+        """Reduce a fix to inline substitutions or small line-block replacements."""
+        old_lines = original_code.splitlines()
+        new_lines = fixed_code.splitlines()
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        hunks = [op for op in matcher.get_opcodes() if op[0] != "equal"]
+
+        if not hunks or len(hunks) > MAX_HUNKS:
+            return []
+
+        patches = []
+        for tag, i1, i2, j1, j2 in hunks:
+            if max(i2 - i1, j2 - j1) > MAX_HUNK_LINES:
+                return []
+
+            if tag == "replace" and i2 - i1 == 1 and j2 - j1 == 1:
+                inline = self._inline_patch(old_lines[i1], new_lines[j1])
+                if inline:
+                    patches.append(inline)
+                    continue
+
+            # Pure insertions need an anchor line to know where they go
+            if i1 == i2:
+                if i1 > 0:
+                    i1, j1 = i1 - 1, j1 - 1
+                elif i2 < len(old_lines):
+                    i2, j2 = i2 + 1, j2 + 1
+                else:
+                    return []
+
+            pattern = [l.strip() for l in old_lines[i1:i2]]
+            if not any(pattern):
+                return []
+            base_indent = self._indent(old_lines[i1])
+            replacement = [
+                l[base_indent:] if self._indent(l) >= base_indent else l.lstrip()
+                for l in new_lines[j1:j2]
+            ]
+            patches.append({"kind": "lines", "pattern": pattern, "replacement": replacement})
+
+        return patches
+
+    def _inline_patch(self, old: str, new: str) -> Optional[Dict[str, Any]]:
+        """Describe a one-line change as a substitution of the changed identifiers."""
+        prefix = 0
+        while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(old), len(new)) - prefix
+               and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]):
+            suffix += 1
+
+        start = prefix
+        old_end, new_end = len(old) - suffix, len(new) - suffix
+
+        # Widen to whole identifiers, then take one trailing character of
+        # context (e.g. "=" for kwargs, "(" for calls, ")" for base classes)
+        while start > 0 and _is_ident(old[start - 1]):
+            start -= 1
+        while old_end < len(old) and _is_ident(old[old_end]):
+            old_end += 1
+            new_end += 1
+        if old_end < len(old) and not old[old_end].isspace():
+            old_end += 1
+            new_end += 1
+
+        old_fragment = old[start:old_end]
+        new_fragment = new[start:new_end]
+        if not old_fragment.strip() or old_fragment == new_fragment:
+            return None
+
+        return {"kind": "inline", "old": old_fragment, "new": new_fragment}
+
+    def _apply_patches(self, code: str, patches: List[Dict[str, Any]]) -> Optional[str]:
+        """Apply every patch of an entry, or return None if any does not match."""
+        for patch in patches:
+            if patch["kind"] == "inline":
+                old = patch["old"]
+                boundary = r'(?<![\w.])' if _is_ident(old[0]) else ''
+                regex = re.compile(boundary + re.escape(old))
+                if not regex.search(code):
+                    return None
+                code = regex.sub(lambda _: patch["new"], code)
+            else:
+                code = self._apply_lines(code, patch["pattern"], patch["replacement"])
+                if code is None:
+                    return None
+        return code
+
+    def _apply_lines(self, code: str, pattern: List[str], replacement: List[str]) -> Optional[str]:
+        """Replace the first block whose stripped lines equal `pattern`."""
+        lines = code.splitlines()
+        stripped = [l.strip() for l in lines]
+        for i in range(len(lines) - len(pattern) + 1):
+            if stripped[i:i + len(pattern)] == pattern:
+                indent = " " * self._indent(lines[i])
+                new_block = [indent + l if l else l for l in replacement]
+                lines[i:i + len(pattern)] = new_block
+                return "\n".join(lines) + "\n"
+        return None
+
+    def _indent(self, line: str) -> int:
+        return len(line) - len(line.lstrip())
+
+    def _load(self):
+        """Load stored patches, starting empty if the file is missing or corrupt."""
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = {e["id"]: e for e in data.get("entries", [])}
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable fix cache {self.path}: {e}")
+
+    def _save(self):
+        """Persist patches atomically (caller holds the lock)."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps({"entries": list(self._entries.values())}, indent=2),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save fix cache: {e}")
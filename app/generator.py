@@ -4,8 +4,112 @@ LLM-based Manim code generation.
 import os
 import json
 import re
-from typing import List, Dict, Any
-from anthropic import AsyncAnthropic
+import logging
+import time
+from typing import List, Dict, Any, Tuple
+
+from app.llm_client import LLMClient
+from app.router import ModelRouter
+from app.prompt_budget import PromptBudget
+from app.patching import PatchError, number_lines, code_window, apply_line_edits
+from app.tracebacks import scene_line_numbers, trim_traceback
+from app.metrics import stage
+from app.scene_dsl import DslAnswer, SceneDslError, parse_spec, scene_file, track_keys
+
+logger = logging.getLogger(__name__)
+
+# "patch" sends a traceback-centred code window and applies line edits locally;
+# "full" asks for the complete fixed file.
+FIX_MODE = os.getenv("MANIM_FIX_MODE", "patch")
+FIX_WINDOW_CONTEXT = 8
+
+# Use the precomputed compact code/API forms in prompts when available
+COMPACT_CONTEXT = os.getenv("PROMPT_COMPACT_CONTEXT", "1") == "1"
+
+# Structured outputs: the model must answer by calling one of these tools, so
+# the response arrives as parsed JSON instead of text to be regex-extracted.
+SCENE_TOOL = {
+    "name": "emit_scene",
+    "description": "Return the generated Manim scene.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "plan": {"type": "array", "items": {"type": "string"}, "description": "Animation steps"},
+            "imports": {"type": "string", "description": "Import lines, starting with 'from manim import *'"},
+            "scene_code": {"type": "string", "description": "The single Scene class"},
+            "notes": {"type": "string", "description": "Assumptions and tweaks"},
+        },
+        "required": ["plan", "imports", "scene_code", "notes"],
+    },
+}
+
+PATCH_TOOL = {
+    "name": "emit_patch",
+    "description": "Return line edits that fix the error.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "analysis": {"type": "string"},
+            "edits": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "start_line": {"type": "integer"},
+                        "end_line": {"type": "integer"},
+                        "original": {"type": "string"},
+                        "replacement": {"type": "string"},
+                    },
+                    "required": ["start_line", "end_line", "original", "replacement"],
+                },
+            },
+        },
+        "required": ["analysis", "edits"],
+    },
+}
+
+SCENE_PLAN_TOOL = {
+    "name": "emit_scene_plan",
+    "description": "Split an animation request into short, self-contained scenes.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "parts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string"},
+                        "prompt": {"type": "string", "description": "Complete, standalone request for this scene"},
+                        "seconds": {"type": "integer"},
+                    },
+                    "required": ["title", "prompt", "seconds"],
+                },
+            },
+        },
+        "required": ["parts"],
+    },
+}
+
+SCENE_DSL_TOOL = {
+    "name": "emit_scene_description",
+    "description": "Return the animation as a JSON scene description, or say it cannot be expressed.",
+    "input_schema": DslAnswer.model_json_schema(),
+}
+
+FULL_FIX_TOOL = {
+    "name": "emit_fixed_code",
+    "description": "Return the complete fixed scene file.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "analysis": {"type": "string"},
+            "fix": {"type": "string"},
+            "fixed_code": {"type": "string"},
+        },
+        "required": ["analysis", "fix", "fixed_code"],
+    },
+}
 
 
 class ManimGenerator:
@@ -16,25 +120,52 @@ class ManimGenerator:
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set")
 
-        self.client = AsyncAnthropic(api_key=api_key)
-        self.model = "claude-sonnet-4-5-20250929"
-
-    async def generate(self, prompt: str, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.client = LLMClient(api_key=api_key)
+        self.router = ModelRouter()
+        # Default (strong) model, used when no route is given
+        self.model = self.router.models["strong"]
+        self.fix_mode = FIX_MODE
+        self.prompt_budget = PromptBudget()
+        self.compact_context = COMPACT_CONTEXT
+        # How responses were parsed: tool_use, json_fallback or failed
+        self.parse_stats = {"tool_use": 0, "json_fallback": 0, "parse_failures": 0}
+
+    async def generate(self, prompt: str, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None, previous_code: str = None) -> Dict[str, Any]:
         """
         Generate Manim scene code from prompt and examples.
 
+        Simple prompts go to the fast model; a failed fast generation is
+        retried once on the strong model.
+
         Returns:
             {
                 "status": "success" | "error",
                 "plan": str,
                 "scene_code": str,
                 "notes": str,
+                "route": "fast" | "strong",
                 "error": str (if error)
             }
         """
+        decision = self.router.route_generation(prompt, previous_code=previous_code)
+        while True:
+            start = time.perf_counter()
+            result = await self._generate_with_model(prompt, examples, api_refs, decision["model"])
+            success = result["status"] == "success"
+            self.router.record("generate", decision["route"], success, time.perf_counter() - start)
+
+            stronger = None if success else self.router.escalate(decision)
+            if stronger is None:
+                result["route"] = decision["route"]
+                return result
+            logger.info(f"Fast generation failed, escalating: {result['error'][:200]}")
+            decision = stronger
+
+    async def _generate_with_model(self, prompt: str, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]], model: str) -> Dict[str, Any]:
+        """One generation call on `model`."""
         try:
             # Build system prompt with examples and API refs
-            system_prompt = self._build_system_prompt(examples, api_refs=api_refs)
+            system_prompt, budget_report = self._build_system_prompt(examples, api_refs=api_refs)
 
             # Build user prompt
             user_prompt = f"""Generate a Manim Community animation for this request:
@@ -44,24 +175,15 @@ class ManimGenerator:
 Remember:
 - Keep the animation 8-15 seconds
 - Use only Manim Community v0.18.0 compatible APIs
-- Return strict JSON format as specified
+- Answer with the emit_scene tool
 - Create exactly one Scene class
 """
 
             # Call Claude
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
+            result, content = await self._structured_call(
+                system_prompt, user_prompt, SCENE_TOOL, max_tokens=4096, model=model
             )
 
-            # Extract JSON from response
-            content = response.content[0].text
-            result = self._extract_json(content)
-
             if not result:
                 return {
                     "status": "error",
@@ -84,7 +206,8 @@ Remember:
                 "status": "success",
                 "plan": plan,
                 "scene_code": scene_code,
-                "notes": result.get("notes", "")
+                "notes": result.get("notes", ""),
+                "prompt_budget": budget_report
             }
 
         except Exception as e:
@@ -93,17 +216,408 @@ Remember:
                 "error": f"Generation failed: {str(e)}"
             }
 
-    async def fix_error(self, original_code: str, prompt: str, traceback: str) -> Dict[str, Any]:
+    async def plan_scenes(self, prompt: str, max_parts: int, part_seconds: int) -> Dict[str, Any]:
+        """
+        Split a long request into up to `max_parts` short scenes.
+
+        Splitting is a light task, so it runs on the fast model.
+
+        Returns:
+            {
+                "status": "success" | "error",
+                "parts": [{"title": str, "prompt": str, "seconds": int}, ...],
+                "error": str (if error)
+            }
+        """
+        decision = self.router.route_planning()
+        system_prompt = f"""You split Manim animation requests into short scenes that are generated and rendered separately, then played back to back.
+
+Rules:
+1. At most {max_parts} scenes of about {part_seconds} seconds each, in playback order
+2. Every scene prompt must be COMPLETE on its own: repeat the shared setup
+   (axes, functions, colors, positions) instead of referring to other scenes
+3. Each scene starts from an empty frame; recreate what it needs to show
+4. Keep the user's wording for what happens in each scene
+
+Answer by calling the emit_scene_plan tool.
+"""
+        start = time.perf_counter()
+        try:
+            result, content = await self._structured_call(
+                system_prompt, f"Animation request:\n\n{prompt}", SCENE_PLAN_TOOL,
+                max_tokens=2048, model=decision["model"]
+            )
+            parts = [
+                {
+                    "title": str(p.get("title", "")).strip(),
+                    "prompt": str(p.get("prompt", "")).strip(),
+                    "seconds": int(p.get("seconds") or part_seconds),
+                }
+                for p in (result or {}).get("parts") or []
+                if isinstance(p, dict) and p.get("prompt")
+            ][:max_parts]
+
+            if not parts:
+                outcome = {
+                    "status": "error",
+                    "error": f"Failed to parse scene plan. Response: {content[:500]}"
+                }
+            else:
+                outcome = {"status": "success", "parts": parts}
+
+        except Exception as e:
+            outcome = {
+                "status": "error",
+                "error": f"Scene planning failed: {str(e)}"
+            }
+
+        self.router.record("plan", decision["route"], outcome["status"] == "success", time.perf_counter() - start)
+        return outcome
+
+    async def generate_dsl(self, prompt: str, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Generate a JSON scene description instead of Python code.
+
+        The description is validated here; the scene file that interprets it
+        is returned like generated code. Requests the description cannot
+        express come back as errors with "expressible": False.
+
+        Returns the `generate` result shape plus "spec" and "track_keys".
+        """
+        decision = self.router.route_generation(prompt)
+        system_prompt = """You describe Manim animations as JSON scene descriptions, interpreted by a fixed engine.
+
+A scene has "objects" (id, type and style; nothing is on screen until a track shows it)
+and "tracks": each track is a list of animations played together for run_time seconds,
+with a rate_func and an optional wait afterwards.
+
+Rules:
+1. Object types: circle, square, rectangle, triangle, dot, line, arrow, polygon,
+   axes, number_plane, number_line, graph (a function of x plotted on an axes object)
+2. Show objects with create, fade_in, grow or add before animating them
+3. Graph functions use x, numbers, pi, e, + - * / ** and sin, cos, tan, exp, log, sqrt, abs
+4. Colors are Manim color names (BLUE, RED_E, ...) or #RRGGBB
+5. Keep animations SHORT: 8-15 seconds in total
+6. No text or labels
+7. If the request needs anything else (updaters, 3D, text, custom paths, value
+   trackers), set "expressible" to false and give the reason
+
+Answer by calling the emit_scene_description tool.
+"""
+        start = time.perf_counter()
+        try:
+            result, content = await self._structured_call(
+                system_prompt, f"Animation request:\n\n{prompt}", SCENE_DSL_TOOL,
+                max_tokens=4096, model=decision["model"]
+            )
+            if not result:
+                outcome = {
+                    "status": "error",
+                    "error": f"Failed to parse scene description. Response: {content[:500]}"
+                }
+            elif not result.get("expressible") or not result.get("scene"):
+                outcome = {
+                    "status": "error",
+                    "expressible": False,
+                    "error": f"Not expressible as a scene description: {result.get('reason', '')}"
+                }
+            else:
+                spec = parse_spec(result["scene"])
+                outcome = {
+                    "status": "success",
+                    "plan": "\n".join(
+                        f"{i}. " + ", ".join(f"{a.action} {a.target or ''}".strip() for a in track.animations)
+                        for i, track in enumerate(spec.tracks, 1)
+                    ),
+                    "scene_code": scene_file(spec),
+                    "notes": result.get("reason", ""),
+                    "spec": spec.model_dump(exclude_none=True),
+                    "track_keys": track_keys(spec),
+                }
+
+        except SceneDslError as e:
+            outcome = {"status": "error", "error": str(e)}
+        except Exception as e:
+            outcome = {
+                "status": "error",
+                "error": f"Scene description generation failed: {str(e)}"
+            }
+
+        self.router.record("generate_dsl", decision["route"], outcome["status"] == "success", time.perf_counter() - start)
+        outcome["route"] = decision["route"]
+        return outcome
+
+    async def edit_scene(self, previous_code: str, edit_request: str, prompt: str = "", plan: str = "") -> Dict[str, Any]:
+        """
+        Apply a follow-up request ("now make it blue") to an existing scene.
+
+        The numbered previous code is sent and line edits come back, so the
+        untouched animations stay byte-identical and hit the render cache. If
+        the edits do not apply, the scene is regenerated with the previous
+        code as the starting point.
+
+        Returns:
+            {
+                "status": "success" | "error",
+                "scene_code": str,
+                "edit_mode": "patch" | "regenerate",
+                "route": "fast" | "strong",
+                "error": str (if error)
+            }
+        """
+        decision = self.router.route_generation(edit_request, previous_code=previous_code)
+
+        start = time.perf_counter()
+        result = await self._edit_with_patch(previous_code, edit_request, prompt, plan, decision["model"])
+        success = result["status"] == "success"
+        self.router.record("edit_patch", decision["route"], success, time.perf_counter() - start)
+        if success:
+            result["route"] = decision["route"]
+            return result
+        logger.info(f"Edit patch unavailable, regenerating: {result['error']}")
+
+        decision = self.router.escalate(decision) or decision
+        start = time.perf_counter()
+        result = await self._edit_with_regeneration(previous_code, edit_request, prompt, decision["model"])
+        self.router.record("edit_full", decision["route"], result["status"] == "success", time.perf_counter() - start)
+        result["route"] = decision["route"]
+        return result
+
+    async def _edit_with_patch(self, previous_code: str, edit_request: str, prompt: str, plan: str, model: str) -> Dict[str, Any]:
+        """Edit a scene by requesting line edits against the whole numbered file."""
+        try:
+            system_prompt = """You are a Manim Community expert editing an existing, working scene.
+
+Rules:
+1. Change ONLY what the edit request asks for
+2. Leave every other line exactly as it is, so unchanged animations are reused
+3. Use only Manim Community v0.18.0 compatible APIs
+4. Keep the original indentation in replacement lines
+5. DO NOT use Text, MathTex or Tex (LaTeX not configured)
+
+Answer by calling the emit_patch tool with this format:
+{
+    "analysis": "what has to change",
+    "edits": [
+        {
+            "start_line": 12,
+            "end_line": 12,
+            "original": "exact current text of lines start_line..end_line",
+            "replacement": "new text for those lines (may span several lines, empty to delete)"
+        }
+    ]
+}
+"""
+
+            user_prompt = f"""Original prompt: {prompt}
+"""
+            if plan:
+                user_prompt += f"""
+Plan:
+{plan}
+"""
+            user_prompt += f"""
+Current code:
+```python
+{number_lines(previous_code, 1, len(previous_code.splitlines()))}
+```
+
+Edit request: {edit_request}
+
+Return only the edits needed.
+"""
+
+            result, content = await self._structured_call(
+                system_prompt, user_prompt, PATCH_TOOL, max_tokens=2048, model=model
+            )
+
+            if not result or not isinstance(result.get("edits"), list) or not result["edits"]:
+                return {
+                    "status": "error",
+                    "error": f"Failed to parse edit response. Response: {content[:500]}"
+                }
+
+            return {
+                "status": "success",
+                "scene_code": apply_line_edits(previous_code, result["edits"]),
+                "edit_mode": "patch"
+            }
+
+        except PatchError as e:
+            return {
+                "status": "error",
+                "error": f"Edit did not apply: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": f"Edit failed: {str(e)}"
+            }
+
+    async def _edit_with_regeneration(self, previous_code: str, edit_request: str, prompt: str, model: str) -> Dict[str, Any]:
+        """Edit a scene by regenerating it from the previous code."""
+        try:
+            system_prompt, _ = self._build_system_prompt([], api_refs=None)
+            user_prompt = f"""Modify this working Manim scene.
+
+Original prompt: {prompt}
+
+Current code:
+```python
+{previous_code}
+```
+
+Edit request: {edit_request}
+
+Keep everything the edit request does not mention unchanged. Answer with the emit_scene tool.
+"""
+
+            result, content = await self._structured_call(
+                system_prompt, user_prompt, SCENE_TOOL, max_tokens=4096, model=model
+            )
+
+            if not result:
+                return {
+                    "status": "error",
+                    "error": f"Failed to parse LLM response as JSON. Response: {content[:500]}"
+                }
+
+            return {
+                "status": "success",
+                "scene_code": self._build_scene_file(
+                    imports=result.get("imports", ""),
+                    scene_code=result.get("scene_code", ""),
+                    notes=result.get("notes", "")
+                ),
+                "edit_mode": "regenerate"
+            }
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": f"Edit regeneration failed: {str(e)}"
+            }
+
+    async def fix_error(self, original_code: str, prompt: str, traceback: str, mode: str = None, attempt: int = 1, api_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Fix a compilation error with minimal patch.
 
+        `api_refs` are the exact API chunks of the symbols the traceback
+        names (see `RAGRetriever.lookup_symbols`); they are quoted in the
+        prompt so the model does not have to guess signatures.
+
+        In "patch" mode only the code around the failing lines is sent and a
+        small line edit comes back; if that edit does not apply cleanly the
+        full-file fix is used instead. A first attempt at a minor error uses
+        the fast model; the full-file fallback and later attempts escalate.
+
         Returns:
             {
                 "status": "success" | "error",
                 "fixed_code": str,
+                "fix_mode": "patch" | "full",
+                "route": "fast" | "strong",
                 "error": str (if error)
             }
         """
+        decision = self.router.route_fix(original_code, traceback, attempt=attempt)
+
+        if (mode or self.fix_mode) == "patch":
+            start = time.perf_counter()
+            result = await self._fix_with_patch(original_code, prompt, traceback, decision["model"], api_refs=api_refs)
+            success = result["status"] == "success"
+            self.router.record("fix_patch", decision["route"], success, time.perf_counter() - start)
+            if success:
+                result["route"] = decision["route"]
+                return result
+            logger.info(f"Patch fix unavailable, falling back to full file: {result['error']}")
+            decision = self.router.escalate(decision) or decision
+
+        start = time.perf_counter()
+        result = await self._fix_full_file(original_code, prompt, traceback, decision["model"], api_refs=api_refs)
+        self.router.record("fix_full", decision["route"], result["status"] == "success", time.perf_counter() - start)
+        result["route"] = decision["route"]
+        return result
+
+    async def _fix_with_patch(self, original_code: str, prompt: str, traceback: str, model: str = None, api_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fix an error by requesting line edits for a traceback-centred window."""
+        window = code_window(original_code, scene_line_numbers(traceback, original_code), FIX_WINDOW_CONTEXT)
+        if window is None:
+            return {"status": "error", "error": "Traceback does not point into the scene code"}
+
+        try:
+            system_prompt = """You are a Manim Community expert fixing compilation errors.
+
+You are shown a numbered excerpt of a scene file and the relevant part of the traceback.
+
+Rules:
+1. Make the SMALLEST possible change to fix the error
+2. Only edit lines inside the excerpt
+3. Do NOT rewrite or refactor the code
+4. Use only Manim Community v0.18.0 compatible APIs
+5. Keep the original indentation in replacement lines
+
+Answer by calling the emit_patch tool with this format:
+{
+    "analysis": "brief explanation of the error",
+    "edits": [
+        {
+            "start_line": 12,
+            "end_line": 12,
+            "original": "exact current text of lines start_line..end_line",
+            "replacement": "new text for those lines (may span several lines, empty to delete)"
+        }
+    ]
+}
+"""
+
+            total_lines = len(original_code.splitlines())
+            user_prompt = f"""Original prompt: {prompt}
+
+Code (lines {window[0]}-{window[1]} of {total_lines}):
+```python
+{number_lines(original_code, window[0], window[1])}
+```
+
+Error traceback:
+```
+{trim_traceback(traceback, code=original_code)}
+```
+{self._fix_api_block(api_refs)}
+Return only the edits needed to fix this error.
+"""
+
+            result, content = await self._structured_call(
+                system_prompt, user_prompt, PATCH_TOOL, max_tokens=1024, model=model
+            )
+
+            if not result or not isinstance(result.get("edits"), list):
+                return {
+                    "status": "error",
+                    "error": f"Failed to parse patch response. Response: {content[:500]}"
+                }
+
+            fixed_code = apply_line_edits(original_code, result["edits"], window=window)
+
+            return {
+                "status": "success",
+                "fixed_code": fixed_code,
+                "fix_mode": "patch"
+            }
+
+        except PatchError as e:
+            return {
+                "status": "error",
+                "error": f"Patch did not apply: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": f"Patch fix failed: {str(e)}"
+            }
+
+    async def _fix_full_file(self, original_code: str, prompt: str, traceback: str, model: str = None, api_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fix an error by requesting the complete fixed file."""
         try:
             system_prompt = """You are a Manim Community expert fixing compilation errors.
 
@@ -115,7 +629,7 @@ Rules:
 5. Return the COMPLETE fixed code (not a diff)
 6. Use only Manim Community v0.18.0 compatible APIs
 
-Return your response as JSON with this exact format:
+Answer by calling the emit_fixed_code tool with this format:
 {
     "analysis": "brief explanation of the error",
     "fix": "what you changed",
@@ -134,34 +648,26 @@ Error traceback:
 ```
 {traceback}
 ```
-
+{self._fix_api_block(api_refs)}
 Fix this error with the minimal possible change. Return the complete fixed code.
 """
 
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
+            result, content = await self._structured_call(
+                system_prompt, user_prompt, FULL_FIX_TOOL, max_tokens=4096, model=model
             )
 
-            content = response.content[0].text
-            result = self._extract_json(content)
-
             if not result or "fixed_code" not in result:
                 return {
                     "status": "error",
                     "error": f"Failed to parse fix response. Response: {content[:500]}"
                 }
 
-            # Unescape literal \n characters if present
-            fixed_code = result["fixed_code"].replace('\\n', '\n').replace('\\t', '\t')
+            fixed_code = self._unescape(result["fixed_code"])
 
             return {
                 "status": "success",
-                "fixed_code": fixed_code
+                "fixed_code": fixed_code,
+                "fix_mode": "full"
             }
 
         except Exception as e:
@@ -170,14 +676,31 @@ Fix this error with the minimal possible change. Return the complete fixed code.
                 "error": f"Fix generation failed: {str(e)}"
             }
 
-    def _build_system_prompt(self, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None) -> str:
-        """Build system prompt including API references and example code."""
+    def _fix_api_block(self, api_refs: List[Dict[str, Any]] = None) -> str:
+        """Exact API of the failing symbols for a fix prompt ("" without refs)."""
+        if not api_refs:
+            return ""
+        text = "\nInstalled Manim API of the classes involved:\n```\n"
+        for ref in api_refs:
+            if self.compact_context and ref.get("compact"):
+                text += ref["compact"] + "\n\n"
+            else:
+                text += f"--- {ref.get('name', '')} ({ref.get('module', '')}) ---\n{ref.get('content', '')}\n\n"
+        return text.rstrip() + "\n```\n"
+
+    def _build_system_prompt(self, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build system prompt including API references and example code.
+
+        Retrieved context is fitted into the token budget in relevance order;
+        returns the prompt and the budget report.
+        """
         prompt = """You are a Manim Community animation expert. You generate clean, working Manim scenes.
 
 CRITICAL RULES:
 1. Use ONLY Manim Community v0.18.0 APIs (not 3b1b/manim legacy)
 2. Keep animations SHORT: 8-15 seconds by default
-3. Return ONLY valid JSON with this exact structure:
+3. Answer by calling the emit_scene tool with this structure:
 {
     "plan": ["step 1", "step 2", ...],
     "imports": "from manim import *\\n...",
@@ -199,30 +722,124 @@ CRITICAL RULES:
 
 """
 
+        chosen, report = self.prompt_budget.fill(self._context_blocks(examples, api_refs))
+        chosen_refs = [b for b in chosen if b["kind"] == "api"]
+        chosen_examples = [b for b in chosen if b["kind"] == "example"]
+
         # Add relevant API references if provided
-        if api_refs:
+        if chosen_refs:
             prompt += "\n=== RELEVANT MANIM APIs ===\n"
             prompt += "Use these API references to write correct code:\n\n"
-            for ref in api_refs[:10]:
-                prompt += f"--- {ref.get('name', '')} ({ref.get('module', '')}) ---\n"
-                prompt += ref.get('content', '')
+            for block in sorted(chosen_refs, key=lambda b: b["rank"]):
+                prompt += block["text"]
                 prompt += "\n\n"
 
         # Add examples if provided
-        if examples:
+        if chosen_examples:
             prompt += "\n=== WORKING EXAMPLES ===\n"
             prompt += "Adapt these proven examples to fulfill the request:\n\n"
-            for i, ex in enumerate(examples[:5], 1):  # Max 5 examples
-                prompt += f"Example {i}: {ex.get('name', 'Unnamed')}\n"
-                prompt += f"Tags: {', '.join(ex.get('tags', []))}\n"
-                prompt += "```python\n"
-                prompt += ex.get('code', '')
-                prompt += "\n```\n"
-                if ex.get('notes'):
-                    prompt += f"Notes: {ex['notes']}\n"
+            for i, block in enumerate(sorted(chosen_examples, key=lambda b: b["rank"]), 1):
+                prompt += f"Example {i}: {block['text']}"
+                if block["text"].count("```") % 2:
+                    prompt += "\n```\n"  # Close a fence cut off by truncation
                 prompt += "\n"
 
-        return prompt
+        return prompt, report
+
+    def _context_blocks(self, examples: List[Dict[str, Any]], api_refs: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Turn examples and API refs into budget blocks, most relevant first.
+
+        Blocks are ordered by retrieval relevance: the fused rank score
+        ("rrf") from hybrid search, else the vector score. Examples without
+        either (explicitly selected or keyword matches) rank ahead of everything.
+        """
+        blocks = []
+
+        for rank, ref in enumerate((api_refs or [])[:10]):
+            if self.compact_context and ref.get("compact"):
+                text = ref["compact"]
+                # Summary keeps the class line and signatures, drops the docstring
+                lines = text.splitlines()
+                summary = "\n".join(lines[:1] + [l for l in lines[1:] if l.startswith("  .")])
+            else:
+                header = f"--- {ref.get('name', '')} ({ref.get('module', '')}) ---\n"
+                content = ref.get('content', '')
+                text = header + content
+                # Summary keeps the header lines and method list, drops the docstring
+                summary_lines = [
+                    line for line in content.splitlines()
+                    if line.startswith(("Class:", "Module:", "Bases:", "  - "))
+                ]
+                summary = header + "\n".join(summary_lines) if summary_lines else None
+            blocks.append({
+                "kind": "api",
+                "label": f"api:{ref.get('name', '')}",
+                "rank": rank,
+                "score": ref.get("rrf", ref.get("score", 0.0)),
+                "text": text,
+                "summary": summary,
+            })
+
+        for rank, ex in enumerate((examples or [])[:5]):  # Max 5 examples
+            compact = self.compact_context and ex.get("compact_code")
+            code = ex["compact_code"] if compact else ex.get('code', '')
+            notes = ex.get("compact_notes", "") if compact else ex.get('notes', '')
+
+            header = f"{ex.get('name', 'Unnamed')}\n"
+            header += f"Tags: {', '.join(ex.get('tags', []))}\n"
+            text = header + "```python\n" + code + "\n```\n"
+            if notes:
+                text += f"Notes: {notes}\n"
+            summary = header
+            if ex.get('description'):
+                summary += f"Description: {ex['description']}\n"
+            blocks.append({
+                "kind": "example",
+                "label": f"example:{ex.get('id', ex.get('name', ''))}",
+                "rank": rank,
+                "score": ex.get("rrf", ex.get("score", float("inf"))),
+                "text": text,
+                "summary": summary,
+            })
+
+        blocks.sort(key=lambda b: b["score"], reverse=True)
+        return blocks
+
+    async def _structured_call(self, system_prompt: str, user_prompt: str, tool: Dict[str, Any], max_tokens: int, model: str = None) -> Tuple[Dict[str, Any], str]:
+        """
+        Call Claude forcing `tool`, and return (tool input, response text).
+
+        If the response has no matching tool call, JSON is extracted from its
+        text instead; the tool input is None when both fail.
+        """
+        response = await self.client.create(
+            model=model or self.model,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            tools=[tool],
+            tool_choice={"type": "tool", "name": tool["name"]},
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ]
+        )
+
+        with stage("parse"):
+            text = ""
+            for block in response.content:
+                if block.type == "tool_use" and block.name == tool["name"] and isinstance(block.input, dict):
+                    self.parse_stats["tool_use"] += 1
+                    return block.input, text
+                if block.type == "text":
+                    text += block.text
+
+            result = self._extract_json(text)
+            if result:
+                self.parse_stats["json_fallback"] += 1
+            else:
+                self.parse_stats["parse_failures"] += 1
+                logger.warning(f"Could not parse structured output for {tool['name']}")
+            return result, text
 
     def _extract_json(self, text: str) -> Dict[str, Any]:
         """Extract JSON from LLM response (handling markdown code blocks)."""
@@ -246,10 +863,9 @@ CRITICAL RULES:
 
     def _build_scene_file(self, imports: str, scene_code: str, notes: str) -> str:
         """Assemble the complete scene.py file."""
-        # Unescape literal \n characters if present
-        imports = imports.replace('\\n', '\n').replace('\\t', '\t')
-        scene_code = scene_code.replace('\\n', '\n').replace('\\t', '\t')
-        notes = notes.replace('\\n', '\n')
+        imports = self._unescape(imports)
+        scene_code = self._unescape(scene_code)
+        notes = self._unescape(notes)
 
         header = f'''"""
 Generated Manim scene.
@@ -260,3 +876,14 @@ Notes:
 
 '''
         return header + imports.strip() + "\n\n" + scene_code.strip() + "\n"
+
+    def _unescape(self, text: str) -> str:
+        """
+        Undo double-escaped newlines/tabs from a text-JSON response.
+
+        Only applied when the text has no real newlines: in multi-line code a
+        literal "\\n" is part of a string and must be kept.
+        """
+        if "\n" in text or "\\n" not in text:
+            return text
+        return text.replace('\\n', '\n').replace('\\t', '\t')
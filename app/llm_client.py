@@ -0,0 +1,227 @@
+"""
+Anthropic client wrapper with concurrency limits, rate limiting and retries.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Any, Optional
+
+from anthropic import (
+    AsyncAnthropic,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+    DEFAULT_CONNECTION_LIMITS,
+    DefaultAsyncHttpxClient,
+    Timeout,
+)
+
+from app.metrics import stage, record_usage
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "50"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# Backoff: base * 2**attempt seconds, capped, with full jitter
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Keep-alive connections are reused across calls to skip TLS handshakes
+POOL_MAX_CONNECTIONS = 20
+POOL_MAX_KEEPALIVE = 10
+POOL_KEEPALIVE_EXPIRY = 60.0
+CONNECT_TIMEOUT = 10.0
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class LLMCallError(Exception):
+    """Raised when a call fails after all retries or runs past its deadline."""
+
+
+class LLMClient:
+    """Bounded, rate-limited and retrying front for `AsyncAnthropic.messages.create`."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+        timeout: float = LLM_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        # Build the limits with the SDK's own httpx classes (it may vendor httpx)
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        # Retries are ours, so the SDK's own retry loop is switched off
+        self._client = AsyncAnthropic(
+            api_key=api_key,
+            base_url=base_url or os.getenv("ANTHROPIC_BASE_URL") or None,
+            http_client=DefaultAsyncHttpxClient(limits=limits),
+            timeout=Timeout(timeout, connect=CONNECT_TIMEOUT),
+            max_retries=0,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(
+            rate=requests_per_minute / 60.0,
+            capacity=max(1.0, min(max_concurrency, requests_per_minute / 60.0 * 10)),
+        )
+
+        self._in_flight = 0
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "connection_errors": 0,
+            "deadline_exceeded": 0,
+            "max_in_flight": 0,
+            "rate_wait_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+            "latency_seconds": 0.0,
+        }
+
+    async def create(self, deadline: Optional[float] = None, **kwargs):
+        """
+        Call `messages.create` with retries on 429, 5xx and connection errors.
+
+        `deadline` (seconds, default LLM_TIMEOUT) bounds the whole call,
+        including queueing and backoff. Raises LLMCallError on final failure.
+        Time and token usage go to the current request trace.
+        """
+        with stage("llm"):
+            response = await self._create(deadline, kwargs)
+        tool = (kwargs.get("tool_choice") or {}).get("name", "")
+        record_usage(kwargs.get("model"), getattr(response, "usage", None), task=tool)
+        return response
+
+    async def _create(self, deadline: Optional[float], kwargs: Dict[str, Any]):
+        """Retry loop behind `create`."""
+        deadline = self.timeout if deadline is None else deadline
+        start = time.monotonic()
+        self._stats["calls"] += 1
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._stats["retries"] += 1
+
+            try:
+                response = await asyncio.wait_for(
+                    self._attempt(kwargs),
+                    timeout=max(0.0, deadline - (time.monotonic() - start)),
+                )
+                self._stats["successes"] += 1
+                self._stats["latency_seconds"] += time.monotonic() - start
+                return response
+
+            except asyncio.TimeoutError:
+                self._stats["deadline_exceeded"] += 1
+                last_error = f"deadline of {deadline:.0f}s exceeded"
+                break
+
+            except RateLimitError as e:
+                self._stats["rate_limited"] += 1
+                last_error = e
+                delay = self._retry_after(e) or self._backoff(attempt)
+
+            except APIStatusError as e:
+                if e.status_code < 500:
+                    self._stats["failures"] += 1
+                    raise LLMCallError(f"LLM request rejected ({e.status_code}): {e.message}") from e
+                self._stats["server_errors"] += 1
+                last_error = e
+                delay = self._backoff(attempt)
+
+            except (APIConnectionError, APITimeoutError) as e:
+                self._stats["connection_errors"] += 1
+                last_error = e
+                delay = self._backoff(attempt)
+
+            if attempt == self.max_retries:
+                break
+            if time.monotonic() - start + delay >= deadline:
+                self._stats["deadline_exceeded"] += 1
+                break
+            logger.info(f"LLM call failed ({last_error}); retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self._stats["failures"] += 1
+        raise LLMCallError(f"LLM call failed after {attempt + 1} attempt(s): {last_error}")
+
+    async def _attempt(self, kwargs: Dict[str, Any]):
+        """One rate-limited, concurrency-bounded request."""
+        self._stats["rate_wait_seconds"] += await self._bucket.acquire()
+
+        queued = time.monotonic()
+        async with self._semaphore:
+            self._stats["queue_wait_seconds"] += time.monotonic() - queued
+            self._in_flight += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+            try:
+                return await self._client.messages.create(**kwargs)
+            finally:
+                self._in_flight -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def _retry_after(self, error: APIStatusError) -> Optional[float]:
+        """Honor the server's retry-after header when it sends one."""
+        try:
+            return min(BACKOFF_CAP, float(error.response.headers.get("retry-after")))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters and averages for the /metrics endpoint."""
+        stats = dict(self._stats)
+        stats["in_flight"] = self._in_flight
+        stats["max_concurrency"] = self.max_concurrency
+        stats["avg_latency_seconds"] = (
+            round(stats["latency_seconds"] / stats["successes"], 3) if stats["successes"] else 0.0
+        )
+        for key in ("rate_wait_seconds", "queue_wait_seconds", "latency_seconds"):
+            stats[key] = round(stats[key], 3)
+        return stats
@@ -3,9 +3,10 @@ FastAPI server for Manim web app.
 """
 import os
 import json
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -19,6 +20,14 @@ load_dotenv()
 from app.generator import ManimGenerator
 from app.renderer import ManimRenderer
 from app.examples import ExampleManager
+from app.pipeline import ScenePipeline
+from app.fix_cache import FixCache
+from app.sessions import SessionStore
+from app.planner import ScenePlanner
+from app.metrics import RequestMetrics, RequestTrace, stage
+from app.fast_path import TemplateFastPath
+from app.retrieval_cache import RetrievalCache
+from app.tracebacks import failing_api_symbols
 
 logger = logging.getLogger(__name__)
 
@@ -37,21 +46,33 @@ templates = Jinja2Templates(directory=str(BASE_DIR / "app" / "templates"))
 generator = ManimGenerator()
 renderer = ManimRenderer()
 examples_manager = ExampleManager()
-
-# RAG retriever (initialized on startup if VOYAGE_API_KEY is set)
+fix_cache = FixCache()
+# _fix_api_refs (below) reads the RAG retriever set up at startup
+pipeline = ScenePipeline(generator, renderer, fix_cache=fix_cache, api_lookup=lambda tb, code: _fix_api_refs(tb, code))
+sessions = SessionStore(GENERATED_DIR / "sessions")
+planner = ScenePlanner(generator, pipeline, renderer)
+request_metrics = RequestMetrics()
+fast_path = TemplateFastPath(examples_manager)
+retrieval_cache = RetrievalCache()
+
+# /retrieve ignores prompts shorter than this (still being typed)
+MIN_RETRIEVE_WORDS = 3
+
+# RAG retriever (initialized on startup if the embedding backend is available)
 rag_retriever = None
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize RAG retriever on startup if Voyage API key is available."""
+    """Initialize RAG retriever on startup if the embedding backend is available."""
     global rag_retriever
 
-    voyage_key = os.getenv("VOYAGE_API_KEY")
-    if not voyage_key:
+    from app.rag import rag_available
+
+    if not rag_available():
         logger.warning(
             "VOYAGE_API_KEY not set — RAG disabled, falling back to keyword search. "
-            "Set VOYAGE_API_KEY in .env to enable semantic search."
+            "Set VOYAGE_API_KEY in .env, or RAG_EMBEDDING_BACKEND=local, to enable semantic search."
         )
         return
 
@@ -78,11 +99,29 @@ async def startup_event():
 class GenerateRequest(BaseModel):
     prompt: str
     example_ids: Optional[List[str]] = None
+    auto_fix: bool = True
+    max_fix_attempts: Optional[int] = None
+    session_id: Optional[str] = None
+    multi_scene: Optional[bool] = None  # None: split long prompts automatically
+    use_templates: bool = True  # Render matching parameterized examples directly
+    mode: str = "python"  # "dsl": JSON scene description, Python as fallback
+
+
+class RetrieveRequest(BaseModel):
+    prompt: str
 
 
 class FixRequest(BaseModel):
     prompt: str
     traceback: str
+    max_fix_attempts: Optional[int] = None
+    session_id: Optional[str] = None
+
+
+class EditRequest(BaseModel):
+    session_id: str
+    edit: str
+    max_fix_attempts: Optional[int] = None
 
 
 class GenerateResponse(BaseModel):
@@ -91,6 +130,145 @@ class GenerateResponse(BaseModel):
     plan: Optional[str] = None
     errors: Optional[str] = None
     code: Optional[str] = None
+    attempts: Optional[List[Dict[str, Any]]] = None
+    stop_reason: Optional[str] = None
+    total_seconds: Optional[float] = None
+    session_id: Optional[str] = None
+    parts: Optional[List[Dict[str, Any]]] = None
+    track_keys: Optional[List[str]] = None
+    trace: Optional[Dict[str, Any]] = None
+
+
+def _session_render_options(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Render into the session's own media dir, reusing unchanged animations."""
+    return {"media_dir": session["media_dir"], "use_cache": True}
+
+
+def _save_session_code(session: Dict[str, Any], outcome: Dict[str, Any]):
+    """
+    Mirror the latest code to generated/scene.py, and keep it on the session
+    once it renders (follow-up edits always start from a working scene).
+    """
+    if not outcome.get("code"):
+        return
+    (GENERATED_DIR / "scene.py").write_text(outcome["code"], encoding="utf-8")
+    if outcome["status"] == "success":
+        sessions.update(session["id"], code=outcome["code"])
+
+
+def _pipeline_response(outcome: Dict[str, Any], session_id: Optional[str] = None) -> GenerateResponse:
+    """Convert a ScenePipeline outcome into the API response."""
+    video_url = None
+    if outcome["status"] == "success":
+        video_url = f"/video/latest.mp4?t={os.path.getmtime(outcome['video_path'])}"
+
+    return GenerateResponse(
+        status=outcome["status"],
+        video_url=video_url,
+        plan=outcome.get("plan") or None,
+        errors=outcome.get("error"),
+        code=outcome.get("code"),
+        attempts=outcome["attempts"],
+        stop_reason=outcome["stop_reason"],
+        total_seconds=outcome["total_seconds"],
+        session_id=session_id,
+        parts=outcome.get("parts"),
+        track_keys=outcome.get("track_keys"),
+    )
+
+
+def _traced(trace: RequestTrace, response: GenerateResponse) -> GenerateResponse:
+    """Close the request trace and attach its timings and token usage."""
+    response.trace = request_metrics.finish(trace, response.status)
+    return response
+
+
+async def _retrieve_context(prompt: str, example_ids: Optional[List[str]] = None):
+    """
+    Examples and API refs for a prompt: the selected examples if any,
+    otherwise RAG search, falling back to keyword search.
+
+    Searches are cached by prompt text, so a prompt already looked up by
+    `/retrieve` while it was typed costs nothing here.
+    """
+    with stage("retrieval"):
+        if example_ids:
+            return await _search_context(prompt, example_ids)
+        await asyncio.to_thread(_refresh_index)
+        result, _ = await retrieval_cache.get_or_compute(
+            prompt, lambda: _search_context(prompt), cacheable=_from_rag
+        )
+        return result
+
+
+def _refresh_index():
+    """Pick up examples added or edited on disk; cached results are then stale."""
+    if rag_retriever and rag_retriever.is_ready:
+        try:
+            if rag_retriever.refresh_examples():
+                retrieval_cache.clear()
+        except Exception as e:
+            logger.warning(f"Example re-indexing failed: {e}")
+
+
+def _fix_api_refs(traceback: str, code: str) -> List[Dict[str, Any]]:
+    """Exact API chunks (with base classes) of the symbols a traceback names."""
+    if not (rag_retriever and rag_retriever.is_ready):
+        return []
+    symbols = failing_api_symbols(traceback, code)["symbols"]
+    if not symbols:
+        return []
+    with stage("retrieval"):
+        try:
+            return rag_retriever.lookup_symbols(symbols)
+        except Exception as e:
+            logger.warning(f"API lookup for fix failed: {e}")
+            return []
+
+
+async def _search_context(prompt: str, example_ids: Optional[List[str]] = None):
+    """Selected examples, RAG search or keyword search (untimed)."""
+    example_snippets = []
+    api_refs = None
+
+    # If user explicitly selected examples, use those
+    if example_ids:
+        for ex_id in example_ids:
+            snippet = examples_manager.get_example(ex_id)
+            if snippet:
+                example_snippets.append(snippet)
+
+    # Otherwise, use RAG search or fall back to keyword search
+    if not example_snippets:
+        if rag_retriever and rag_retriever.is_ready:
+            try:
+                rag_results = await rag_retriever.asearch(prompt)
+                example_snippets = rag_results.get("examples", [])
+                api_refs = rag_results.get("api_refs", [])
+                logger.info(
+                    f"RAG search: {len(example_snippets)} examples, "
+                    f"{len(api_refs)} API refs"
+                )
+            except Exception as e:
+                logger.warning(f"RAG search failed, falling back to keywords: {e}")
+                example_snippets = examples_manager.search_examples(
+                    prompt, max_results=5
+                )
+        else:
+            example_snippets = examples_manager.search_examples(
+                prompt, max_results=5
+            )
+
+    return example_snippets, api_refs
+
+
+def _from_rag(context) -> bool:
+    """
+    Whether `_search_context` results came from RAG search (api_refs is a
+    list). Keyword fallbacks are not cached, so RAG is used again as soon as
+    it recovers.
+    """
+    return context[1] is not None
 
 
 # Routes
@@ -110,85 +288,103 @@ async def list_examples():
     return examples_manager.list_examples()
 
 
+@app.post("/retrieve")
+async def retrieve(req: RetrieveRequest):
+    """
+    Run retrieval for a prompt that is still being typed and cache it, so
+    the following /generate starts with its context ready.
+    """
+    if len(req.prompt.split()) < MIN_RETRIEVE_WORDS:
+        return {"status": "skipped", "cached": False, "examples": [], "api_refs": []}
+
+    await asyncio.to_thread(_refresh_index)
+    (example_snippets, api_refs), cached = await retrieval_cache.get_or_compute(
+        req.prompt, lambda: _search_context(req.prompt), cacheable=_from_rag
+    )
+    return {
+        "status": "success",
+        "cached": cached,
+        "examples": [
+            {"id": ex.get("id"), "name": ex.get("name"), "score": ex.get("score")}
+            for ex in example_snippets
+        ],
+        "api_refs": [ref.get("name") for ref in api_refs or []],
+    }
+
+
 @app.post("/generate", response_model=GenerateResponse)
 async def generate(req: GenerateRequest):
     """
     Generate Manim animation from prompt.
 
+    Long multi-step prompts are split into parts that are generated and
+    rendered concurrently, then stitched (see ScenePlanner).
+
     1. Retrieve relevant examples + API refs (RAG or keyword fallback)
-    2. Generate code using LLM
-    3. Write to generated/scene.py
+    2. Generate code using LLM (or fill in a matching example template)
+    3. Write to the session's scene.py (and generated/scene.py)
     4. Render using local Manim
-    5. Return video URL
+    5. On render errors, fix and re-render (bounded attempts and time budget)
+    6. Return video URL, session id plus per-attempt timings
     """
+    trace = request_metrics.start("generate")
     try:
-        example_snippets = []
-        api_refs = None
-
-        # If user explicitly selected examples, use those
-        if req.example_ids:
-            for ex_id in req.example_ids:
-                snippet = examples_manager.get_example(ex_id)
-                if snippet:
-                    example_snippets.append(snippet)
-
-        # Otherwise, use RAG search or fall back to keyword search
-        if not example_snippets:
-            if rag_retriever and rag_retriever.is_ready:
-                try:
-                    rag_results = rag_retriever.search(req.prompt)
-                    example_snippets = rag_results.get("examples", [])
-                    api_refs = rag_results.get("api_refs", [])
-                    logger.info(
-                        f"RAG search: {len(example_snippets)} examples, "
-                        f"{len(api_refs)} API refs"
-                    )
-                except Exception as e:
-                    logger.warning(f"RAG search failed, falling back to keywords: {e}")
-                    example_snippets = examples_manager.search_examples(
-                        req.prompt, max_results=5
-                    )
-            else:
-                example_snippets = examples_manager.search_examples(
-                    req.prompt, max_results=5
-                )
-
-        # Generate code
-        result = await generator.generate(req.prompt, example_snippets, api_refs=api_refs)
-
-        if result["status"] == "error":
-            return GenerateResponse(
-                status="error",
-                errors=result["error"]
+        max_fix_attempts = req.max_fix_attempts if req.auto_fix else 0
+
+        # Long multi-step prompts: plan parts, build them concurrently, stitch
+        multi_scene = planner.should_split(req.prompt) if req.multi_scene is None else req.multi_scene
+        if multi_scene:
+            # A session only for its work dir (and cleanup); parts are not editable
+            session = sessions.create(req.prompt)
+            outcome = await planner.generate_and_render(
+                req.prompt,
+                work_dir=session["dir"],
+                retrieve=lambda part_prompt: _retrieve_context(part_prompt, req.example_ids),
+                max_fix_attempts=max_fix_attempts,
             )
-
-        # Write scene code
-        scene_path = GENERATED_DIR / "scene.py"
-        scene_path.write_text(result["scene_code"], encoding="utf-8")
-
-        # Render
-        render_result = await renderer.render(scene_path)
-
-        if render_result["status"] == "error":
-            return GenerateResponse(
-                status="error",
-                errors=render_result["error"],
-                code=result["scene_code"],
-                plan=result["plan"]
+            return _traced(trace, _pipeline_response(outcome, session_id=session["id"]))
+
+        example_snippets, api_refs = await _retrieve_context(req.prompt, req.example_ids)
+
+        session = sessions.get(req.session_id)
+        if session:
+            sessions.update(session["id"], prompt=req.prompt, history=session["history"] + [req.prompt])
+        else:
+            session = sessions.create(req.prompt)
+
+        # Near-verbatim match for a parameterized example: render it directly
+        outcome = None
+        template = fast_path.match(req.prompt, example_snippets) if req.use_templates else None
+        if template:
+            outcome = await pipeline.render_template(
+                template,
+                scene_path=session["scene_path"],
+                render_options=_session_render_options(session),
             )
-
-        return GenerateResponse(
-            status="success",
-            video_url=f"/video/latest.mp4?t={os.path.getmtime(render_result['video_path'])}",
-            plan=result["plan"],
-            code=result["scene_code"]
-        )
+            if outcome["status"] != "success":
+                logger.warning(f"Template {template['example_id']} failed to render, generating instead")
+                outcome = None
+
+        # Generate, render and fix render errors server-side
+        if outcome is None:
+            outcome = await pipeline.generate_and_render(
+                req.prompt,
+                scene_path=session["scene_path"],
+                examples=example_snippets,
+                api_refs=api_refs,
+                max_fix_attempts=max_fix_attempts,
+                render_options=_session_render_options(session),
+                mode=req.mode,
+            )
+        sessions.update(session["id"], plan=outcome.get("plan") or "")
+        _save_session_code(session, outcome)
+        return _traced(trace, _pipeline_response(outcome, session_id=session["id"]))
 
     except Exception as e:
-        return GenerateResponse(
+        return _traced(trace, GenerateResponse(
             status="error",
             errors=str(e)
-        )
+        ))
 
 
 @app.post("/fix", response_model=GenerateResponse)
@@ -197,56 +393,79 @@ async def fix_error(req: FixRequest):
     Fix compilation error by applying minimal patch.
 
     1. Send traceback to LLM
-    2. Get unified diff patch
-    3. Apply patch to generated/scene.py
-    4. Re-render
+    2. Get fixed code
+    3. Write it to generated/scene.py
+    4. Re-render, fixing again on new errors until the loop stops
     5. Return result
     """
+    trace = request_metrics.start("fix")
     try:
-        scene_path = GENERATED_DIR / "scene.py"
+        session = sessions.get(req.session_id)
+        scene_path = session["scene_path"] if session else GENERATED_DIR / "scene.py"
 
         if not scene_path.exists():
             raise HTTPException(status_code=400, detail="No scene file to fix")
 
         original_code = scene_path.read_text()
 
-        # Generate fix
-        fix_result = await generator.fix_error(
-            original_code=original_code,
+        # Fix, re-render and keep fixing server-side while the budget allows
+        outcome = await pipeline.render_with_fixes(
+            code=original_code,
             prompt=req.prompt,
-            traceback=req.traceback
+            scene_path=scene_path,
+            traceback=req.traceback,
+            max_fix_attempts=req.max_fix_attempts,
+            render_options=_session_render_options(session) if session else None,
         )
+        if session:
+            _save_session_code(session, outcome)
+        return _traced(trace, _pipeline_response(outcome, session_id=session["id"] if session else None))
 
-        if fix_result["status"] == "error":
-            return GenerateResponse(
-                status="error",
-                errors=fix_result["error"]
-            )
+    except Exception as e:
+        return _traced(trace, GenerateResponse(
+            status="error",
+            errors=str(e)
+        ))
 
-        # Write fixed code
-        scene_path.write_text(fix_result["fixed_code"], encoding="utf-8")
 
-        # Re-render
-        render_result = await renderer.render(scene_path)
+@app.post("/edit", response_model=GenerateResponse)
+async def edit_scene(req: EditRequest):
+    """
+    Apply a follow-up request to the session's current scene.
 
-        if render_result["status"] == "error":
-            return GenerateResponse(
-                status="error",
-                errors=render_result["error"],
-                code=fix_result["fixed_code"]
-            )
+    1. Send the previous code and the edit request to the LLM
+    2. Apply the returned line edits (or regenerate from the previous code)
+    3. Re-render in the session's media dir, so unchanged animations are
+       taken from Manim's cache
+    4. On render errors, fix and re-render as in /generate
+    """
+    session = sessions.get(req.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    if not session.get("code"):
+        raise HTTPException(status_code=404, detail="No editable scene in this session")
 
-        return GenerateResponse(
-            status="success",
-            video_url=f"/video/latest.mp4?t={os.path.getmtime(render_result['video_path'])}",
-            code=fix_result["fixed_code"]
+    trace = request_metrics.start("edit")
+    try:
+        sessions.update(session["id"], history=session["history"] + [req.edit])
+        outcome = await pipeline.edit_and_render(
+            previous_code=session["code"],
+            edit_request=req.edit,
+            prompt=session["prompt"],
+            scene_path=session["scene_path"],
+            plan=session["plan"],
+            max_fix_attempts=req.max_fix_attempts,
+            render_options=_session_render_options(session),
         )
+        _save_session_code(session, outcome)
+        return _traced(trace, _pipeline_response(outcome, session_id=session["id"]))
 
     except Exception as e:
-        return GenerateResponse(
+        return _traced(trace, GenerateResponse(
             status="error",
-            errors=str(e)
-        )
+            errors=str(e),
+            session_id=session["id"]
+        ))
 
 
 @app.post("/admin/rebuild-index")
@@ -254,10 +473,12 @@ async def rebuild_index():
     """Force rebuild the RAG index from scratch."""
     global rag_retriever
 
-    if not os.getenv("VOYAGE_API_KEY"):
+    from app.rag import rag_available
+
+    if not rag_available():
         raise HTTPException(
             status_code=400,
-            detail="VOYAGE_API_KEY not set. Cannot rebuild index."
+            detail="VOYAGE_API_KEY not set (and RAG_EMBEDDING_BACKEND is not 'local'). Cannot rebuild index."
         )
 
     try:
@@ -265,6 +486,7 @@ async def rebuild_index():
 
         rag_retriever = RAGRetriever()
         counts = rag_retriever.initialize(rebuild=True)
+        retrieval_cache.clear()
         return {
             "status": "success",
             "message": f"Index rebuilt: {counts.get('api_chunks', 0)} API chunks, "
@@ -275,6 +497,28 @@ async def rebuild_index():
         raise HTTPException(status_code=500, detail=f"Rebuild failed: {str(e)}")
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Return runtime counters: per-stage latency percentiles, token usage and
+    cost per video, the LLM client layer, response parsing and routing.
+    """
+    return {
+        "requests": request_metrics.summary(),
+        "llm": generator.client.metrics(),
+        "parsing": generator.parse_stats,
+        "routing": generator.router.stats(),
+        "templates": fast_path.stats,
+        "retrieval_cache": retrieval_cache.summary(),
+    }
+
+
+@app.get("/admin/fix-cache")
+async def fix_cache_stats():
+    """Return hit rate and per-patch success rates of the learned fix cache."""
+    return fix_cache.stats()
+
+
 @app.get("/rag/browse", response_class=HTMLResponse)
 async def rag_browse(request: Request, collection: str = "examples", page: int = 1, per_page: int = 50):
     """Browse the ChromaDB RAG database as HTML tables."""
@@ -411,10 +655,13 @@ if __name__ == "__main__":
     print("="*60)
     print(f"Server: http://localhost:8000")
     print(f"Generated files: {GENERATED_DIR}")
-    if os.getenv("VOYAGE_API_KEY"):
-        print("RAG: Enabled (Voyage AI + ChromaDB)")
+    from app.rag import EMBEDDING_BACKEND, rag_available
+
+    if rag_available():
+        backend = "local embeddings" if EMBEDDING_BACKEND == "local" else "Voyage AI"
+        print(f"RAG: Enabled ({backend} + ChromaDB)")
     else:
-        print("RAG: Disabled (set VOYAGE_API_KEY to enable)")
+        print("RAG: Disabled (set VOYAGE_API_KEY or RAG_EMBEDDING_BACKEND=local to enable)")
     print("="*60 + "\n")
 
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
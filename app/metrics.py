@@ -0,0 +1,206 @@
+"""
+Per-request stage timings and token usage, with aggregation.
+
+A RequestTrace is bound to the running request through a context variable,
+so the LLM client, pipeline and renderer can record into it without having
+it passed through every call (asyncio tasks and to_thread inherit it).
+"""
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Finished traces kept for percentiles
+MAX_TRACES = 1000
+
+# USD per million tokens: (input, output). Cache writes cost 1.25x input,
+# cache reads 0.1x input. Matched by substring of the model id, longest first.
+MODEL_PRICES = {
+    "haiku-4": (1.0, 5.0),
+    "haiku": (0.8, 4.0),
+    "sonnet": (3.0, 15.0),
+    "opus-4-5": (5.0, 25.0),
+    "opus": (15.0, 75.0),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional["RequestTrace"]:
+    """The trace of the request being handled, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` of the current trace (no-op without one)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, time.perf_counter() - start)
+
+
+def record_usage(model: str, usage: Any, task: str = ""):
+    """Record an API response's `usage` on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None and usage is not None:
+        trace.add_usage(model, usage, task)
+
+
+def call_cost(model: str, usage: Dict[str, int]) -> float:
+    """USD cost of one call from its token counts."""
+    key = next((k for k in sorted(MODEL_PRICES, key=len, reverse=True) if k in (model or "")), "sonnet")
+    input_price, output_price = MODEL_PRICES[key]
+    cost = (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("output_tokens", 0) * output_price
+        + usage.get("cache_creation_input_tokens", 0) * input_price * CACHE_WRITE_MULTIPLIER
+        + usage.get("cache_read_input_tokens", 0) * input_price * CACHE_READ_MULTIPLIER
+    )
+    return cost / 1_000_000
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class RequestTrace:
+    """Stage timings and per-call token usage of one request."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.started = time.time()
+        self.status = None
+        self.total_seconds = None
+        self.stages: List[Dict[str, Any]] = []
+        self.calls: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages.append({"stage": name, "seconds": round(seconds, 4)})
+
+    def add_usage(self, model: str, usage: Any, task: str = ""):
+        counts = {field: int(getattr(usage, field, 0) or 0) for field in USAGE_FIELDS}
+        with self._lock:
+            self.calls.append({
+                "task": task,
+                "model": model,
+                **counts,
+                "cost_usd": round(call_cost(model, counts), 6),
+            })
+
+    def usage_totals(self) -> Dict[str, Any]:
+        """Token counts and cost summed over all calls."""
+        totals = {field: sum(c[field] for c in self.calls) for field in USAGE_FIELDS}
+        totals["calls"] = len(self.calls)
+        totals["cost_usd"] = round(sum(c["cost_usd"] for c in self.calls), 6)
+        return totals
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Seconds per stage name, summed over repeats (e.g. several renders)."""
+        totals: Dict[str, float] = {}
+        for s in self.stages:
+            totals[s["stage"]] = round(totals.get(s["stage"], 0.0) + s["seconds"], 4)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total_seconds": self.total_seconds,
+            "stages": self.stage_totals(),
+            "usage": self.usage_totals(),
+            "calls": list(self.calls),
+        }
+
+
+class RequestMetrics:
+    """Collects finished traces and aggregates them for /metrics."""
+
+    def __init__(self, max_traces: int = MAX_TRACES):
+        self._traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def start(self, kind: str) -> RequestTrace:
+        """Begin a trace and bind it to the current request context."""
+        trace = RequestTrace(kind)
+        trace._token = _current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: RequestTrace, status: str) -> Dict[str, Any]:
+        """Close a trace, log it as one JSON line and keep it for aggregation."""
+        trace.status = status
+        trace.total_seconds = round(time.perf_counter() - trace._start, 4)
+        if trace._token is not None:
+            _current_trace.reset(trace._token)
+            trace._token = None
+
+        record = trace.to_dict()
+        logger.info(json.dumps({"event": "request_trace", **record}))
+        with self._lock:
+            self._traces.append(trace)
+        return record
+
+    def summary(self) -> Dict[str, Any]:
+        """p50/p95/p99 per stage, token totals and cost per successful video."""
+        with self._lock:
+            traces = list(self._traces)
+
+        stage_samples: Dict[str, List[float]] = {}
+        for trace in traces:
+            stage_samples.setdefault("total", []).append(trace.total_seconds)
+            for s in trace.stages:
+                stage_samples.setdefault(s["stage"], []).append(s["seconds"])
+
+        stages = {
+            name: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+            }
+            for name, values in stage_samples.items()
+        }
+
+        tokens = {field: 0 for field in USAGE_FIELDS}
+        cost = 0.0
+        for trace in traces:
+            totals = trace.usage_totals()
+            for field in USAGE_FIELDS:
+                tokens[field] += totals[field]
+            cost += totals["cost_usd"]
+
+        successes = sum(1 for t in traces if t.status == "success")
+        return {
+            "requests": len(traces),
+            "successes": successes,
+            "stages": stages,
+            "tokens": tokens,
+            "cost_usd": round(cost, 4),
+            # All spend, failed requests included, over the videos delivered
+            "cost_per_successful_video": round(cost / successes, 4) if successes else None,
+        }
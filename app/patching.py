@@ -0,0 +1,88 @@
+"""
+Line-based patches for scene code.
+
+Fix and edit responses describe changes as line-range replacements against
+the numbered code they were shown; these helpers build that view and apply
+the edits locally.
+"""
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply cleanly."""
+
+
+def number_lines(code: str, start: int = 1, end: Optional[int] = None) -> str:
+    """Return lines `start`..`end` (1-based, inclusive) prefixed with line numbers."""
+    lines = code.splitlines()
+    end = len(lines) if end is None else min(end, len(lines))
+    width = len(str(end))
+    return "\n".join(f"{i:>{width}}| {lines[i - 1]}" for i in range(max(start, 1), end + 1))
+
+
+def code_window(code: str, line_numbers: List[int], context: int = 8) -> Optional[Tuple[int, int]]:
+    """
+    Return the (start, end) line range covering `line_numbers` plus context.
+
+    Returns None if there is nothing to centre the window on.
+    """
+    total = len(code.splitlines())
+    lines = [n for n in line_numbers if 1 <= n <= total]
+    if not lines:
+        return None
+    return max(1, min(lines) - context), min(total, max(lines) + context)
+
+
+def apply_line_edits(code: str, edits: List[Dict[str, Any]], window: Optional[Tuple[int, int]] = None) -> str:
+    """
+    Apply line-range edits to `code` and return the patched code.
+
+    Each edit is {"start_line", "end_line", "original", "replacement"}, with
+    1-based inclusive line numbers referring to the unpatched code. An edit
+    with end_line == start_line - 1 inserts before start_line. When
+    "original" is given it must match the current lines (ignoring
+    surrounding whitespace) or the patch is rejected, as are overlapping
+    edits and edits outside `window`. The result must still compile.
+    """
+    if not edits:
+        raise PatchError("Patch contains no edits")
+
+    lines = code.splitlines()
+    normalized = []
+    for edit in edits:
+        try:
+            start = int(edit["start_line"])
+            end = int(edit["end_line"])
+        except (KeyError, TypeError, ValueError):
+            raise PatchError(f"Edit is missing valid line numbers: {edit}")
+
+        if start < 1 or end < start - 1 or end > len(lines):
+            raise PatchError(f"Edit range {start}-{end} is outside the file")
+        if window and (start < window[0] or end > window[1]):
+            raise PatchError(f"Edit range {start}-{end} is outside the shown code {window[0]}-{window[1]}")
+
+        original = edit.get("original")
+        if original is not None:
+            current = [l.strip() for l in lines[start - 1:end]]
+            expected = [l.strip() for l in original.splitlines()]
+            if current != expected:
+                raise PatchError(f"Lines {start}-{end} do not match the edit's original text")
+
+        replacement = edit.get("replacement", "")
+        normalized.append((start, end, replacement.splitlines() if replacement else []))
+
+    normalized.sort(key=lambda e: e[0])
+    for prev, cur in zip(normalized, normalized[1:]):
+        if cur[0] <= prev[1]:
+            raise PatchError("Edits overlap")
+
+    # Apply bottom-up so earlier line numbers stay valid
+    for start, end, replacement in reversed(normalized):
+        lines[start - 1:end] = replacement
+
+    patched = "\n".join(lines) + "\n"
+    try:
+        compile(patched, "scene.py", "exec")
+    except SyntaxError as e:
+        raise PatchError(f"Patched code does not compile: {e}")
+    return patched
@@ -0,0 +1,337 @@
+"""
+Server-side generate → render → fix loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+from app.fix_cache import FixCache
+from app.tracebacks import error_signature
+from app.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_FIX_ATTEMPTS = int(os.getenv("MANIM_MAX_FIX_ATTEMPTS", "3"))
+DEFAULT_FIX_TIME_BUDGET = float(os.getenv("MANIM_FIX_TIME_BUDGET", "180"))
+
+
+class ScenePipeline:
+    """Generates a scene and keeps fixing it until it renders or the budget runs out."""
+
+    def __init__(
+        self,
+        generator,
+        renderer,
+        max_fix_attempts: int = DEFAULT_MAX_FIX_ATTEMPTS,
+        time_budget: float = DEFAULT_FIX_TIME_BUDGET,
+        fix_cache: Optional[FixCache] = None,
+        api_lookup: Optional[Callable[[str, str], List[Dict[str, Any]]]] = None,
+    ):
+        self.generator = generator
+        self.renderer = renderer
+        self.fix_cache = fix_cache
+        # (traceback, code) -> exact API chunks of the failing symbols
+        self.api_lookup = api_lookup
+        self.max_fix_attempts = max_fix_attempts
+        self.time_budget = time_budget
+
+    async def generate_and_render(
+        self,
+        prompt: str,
+        scene_path: Path,
+        examples: List[Dict[str, Any]],
+        api_refs: List[Dict[str, Any]] = None,
+        max_fix_attempts: Optional[int] = None,
+        render_options: Optional[Dict[str, Any]] = None,
+        mode: str = "python",
+    ) -> Dict[str, Any]:
+        """
+        Generate code for a prompt, render it and fix render errors server-side.
+
+        `render_options` are passed through to `ManimRenderer.render`. With
+        mode "dsl" the LLM writes a JSON scene description (app.scene_dsl)
+        and the outcome carries its "track_keys"; requests it cannot express
+        fall back to Python generation, whose outcome has no "track_keys".
+
+        Returns:
+            {
+                "status": "success" | "error",
+                "plan": str,
+                "code": str,
+                "video_path": Path (if success),
+                "error": str (if error),
+                "attempts": [{"attempt", "stage", "status", "seconds", "error"}, ...],
+                "stop_reason": str,
+                "total_seconds": float,
+                "track_keys": [str, ...] (DSL scenes only)
+            }
+        """
+        start = time.perf_counter()
+        attempts = []
+
+        result = None
+        if mode == "dsl":
+            stage_start = time.perf_counter()
+            result = await self.generator.generate_dsl(prompt, examples, api_refs=api_refs)
+            attempts.append(self._attempt_record(0, "generate_dsl", result, stage_start))
+            if result["status"] == "error":
+                logger.info(f"Scene description unavailable, generating Python: {result['error'][:200]}")
+
+        if result is None or result["status"] == "error":
+            stage_start = time.perf_counter()
+            result = await self.generator.generate(prompt, examples, api_refs=api_refs)
+            attempts.append(self._attempt_record(0, "generate", result, stage_start))
+
+        if result["status"] == "error":
+            return self._final(
+                "error", start, attempts, "generation_failed",
+                plan="", code=None, error=result["error"],
+            )
+
+        outcome = await self.render_with_fixes(
+            code=result["scene_code"],
+            prompt=prompt,
+            scene_path=scene_path,
+            max_fix_attempts=max_fix_attempts,
+            render_options=render_options,
+            _start=start,
+            _attempts=attempts,
+        )
+        outcome["plan"] = result["plan"]
+        if result.get("track_keys"):
+            outcome["track_keys"] = result["track_keys"]
+        if result.get("route"):
+            # Did the routed generation end up as a video (fixes included)?
+            self.generator.router.record(
+                "scene", result["route"], outcome["status"] == "success", outcome["total_seconds"],
+            )
+        return outcome
+
+    async def render_template(
+        self,
+        match: Dict[str, Any],
+        scene_path: Path,
+        render_options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Render a filled-in example template (see TemplateFastPath) with no LLM call.
+
+        Same result shape as `generate_and_render`, plus "template". No fix
+        loop: a failing template is the caller's cue to generate instead.
+        """
+        start = time.perf_counter()
+        scene_path.write_text(match["code"], encoding="utf-8")
+
+        stage_start = time.perf_counter()
+        with stage("render"):
+            render_result = await self.renderer.render(scene_path, **(render_options or {}))
+        record = self._attempt_record(0, "template", render_result, stage_start)
+        record["example_id"] = match["example_id"]
+
+        params = ", ".join(f"{k}={v}" for k, v in match["params"].items())
+        fields = {
+            "plan": f"Template {match['example_id']} ({params})",
+            "code": match["code"],
+            "template": {k: match[k] for k in ("example_id", "params", "coverage")},
+        }
+        if render_result["status"] == "success":
+            return self._final("success", start, [record], "rendered",
+                               video_path=render_result["video_path"], **fields)
+        return self._final("error", start, [record], "template_failed", error=render_result["error"], **fields)
+
+    async def edit_and_render(
+        self,
+        previous_code: str,
+        edit_request: str,
+        prompt: str,
+        scene_path: Path,
+        plan: str = "",
+        max_fix_attempts: Optional[int] = None,
+        render_options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Apply a follow-up edit to a rendered scene, re-render and fix.
+
+        Same result shape as `generate_and_render`; the first attempt entry
+        is the "edit" stage.
+        """
+        start = time.perf_counter()
+        attempts = []
+
+        stage_start = time.perf_counter()
+        result = await self.generator.edit_scene(previous_code, edit_request, prompt=prompt, plan=plan)
+        record = self._attempt_record(0, "edit", result, stage_start)
+        if result.get("edit_mode"):
+            record["edit_mode"] = result["edit_mode"]
+        attempts.append(record)
+
+        if result["status"] == "error":
+            return self._final(
+                "error", start, attempts, "generation_failed",
+                plan=plan, code=previous_code, error=result["error"],
+            )
+
+        outcome = await self.render_with_fixes(
+            code=result["scene_code"],
+            prompt=f"{prompt}\n\nFollow-up edit: {edit_request}",
+            scene_path=scene_path,
+            max_fix_attempts=max_fix_attempts,
+            render_options=render_options,
+            _start=start,
+            _attempts=attempts,
+        )
+        outcome["plan"] = plan
+        return outcome
+
+    async def render_with_fixes(
+        self,
+        code: str,
+        prompt: str,
+        scene_path: Path,
+        traceback: Optional[str] = None,
+        max_fix_attempts: Optional[int] = None,
+        render_options: Optional[Dict[str, Any]] = None,
+        _start: Optional[float] = None,
+        _attempts: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Render `code`, fixing and re-rendering on failure.
+
+        If `traceback` is given the code is known to be broken, so the loop
+        starts with a fix instead of a render. Known patches from the fix
+        cache are tried once per error before asking the LLM; they do not
+        count towards `max_fix_attempts`.
+        """
+        start = _start if _start is not None else time.perf_counter()
+        attempts = _attempts if _attempts is not None else []
+        max_fixes = self.max_fix_attempts if max_fix_attempts is None else max_fix_attempts
+
+        fix_number = 0
+        llm_fixes = 0
+        seen_signatures = set()
+        cache_tried = set()
+        last_fix = None  # (source, entry id or pre-fix code, error it addressed)
+        error = traceback
+
+        while True:
+            if error is None:
+                scene_path.write_text(code, encoding="utf-8")
+                stage_start = time.perf_counter()
+                with stage("render"):
+                    render_result = await self.renderer.render(scene_path, **(render_options or {}))
+                attempts.append(self._attempt_record(fix_number, "render", render_result, stage_start))
+                self._learn(last_fix, code, render_result)
+
+                if render_result["status"] == "success":
+                    return self._final(
+                        "success", start, attempts, "rendered",
+                        code=code, video_path=render_result["video_path"],
+                    )
+                error = render_result["error"]
+
+            signature = error_signature(error)
+            if signature in seen_signatures:
+                return self._final("error", start, attempts, "repeated_error", code=code, error=error)
+
+            remaining = self.time_budget - (time.perf_counter() - start)
+            if remaining <= 0:
+                return self._final("error", start, attempts, "time_budget", code=code, error=error)
+
+            # Known patch first: local and takes milliseconds
+            if self.fix_cache and signature not in cache_tried:
+                cache_tried.add(signature)
+                stage_start = time.perf_counter()
+                cached = self.fix_cache.apply(code, error)
+                if cached:
+                    fix_number += 1
+                    attempts.append(self._attempt_record(
+                        fix_number, "fix",
+                        {"status": "success", "fix_mode": "cache"},
+                        stage_start,
+                    ))
+                    last_fix = ("cache", cached["entry_id"], error)
+                    code = cached["fixed_code"]
+                    error = None
+                    continue
+
+            if llm_fixes >= max_fixes:
+                return self._final("error", start, attempts, "max_attempts", code=code, error=error)
+
+            seen_signatures.add(signature)
+            fix_number += 1
+            llm_fixes += 1
+            stage_start = time.perf_counter()
+            api_refs = await asyncio.to_thread(self.api_lookup, error, code) if self.api_lookup else []
+            try:
+                fix_result = await asyncio.wait_for(
+                    self.generator.fix_error(
+                        original_code=code, prompt=prompt, traceback=error, attempt=llm_fixes,
+                        api_refs=api_refs,
+                    ),
+                    timeout=remaining,
+                )
+            except asyncio.TimeoutError:
+                fix_result = {"status": "error", "error": "Fix timed out (time budget exhausted)"}
+            attempts.append(self._attempt_record(fix_number, "fix", fix_result, stage_start))
+            if api_refs:
+                attempts[-1]["api_refs"] = [ref["name"] for ref in api_refs]
+
+            if fix_result["status"] == "error":
+                return self._final(
+                    "error", start, attempts, "fix_failed",
+                    code=code, error=f"{error}\n\n{fix_result['error']}",
+                )
+
+            last_fix = ("llm", code, error)
+            code = fix_result["fixed_code"]
+            error = None
+
+    def _learn(self, last_fix, code: str, render_result: Dict[str, Any]):
+        """
+        Feed the outcome of the last fix back into the fix cache.
+
+        A fix counts as successful when the error it targeted is gone, even if
+        the render then fails on something else.
+        """
+        if not self.fix_cache or last_fix is None:
+            return
+
+        source, ref, fixed_error = last_fix
+        resolved = (
+            render_result["status"] == "success"
+            or error_signature(render_result["error"]) != error_signature(fixed_error)
+        )
+        if source == "cache":
+            self.fix_cache.report(ref, resolved)
+        elif resolved:
+            self.fix_cache.record(ref, code, fixed_error)
+
+    def _attempt_record(self, attempt: int, stage: str, result: Dict[str, Any], stage_start: float) -> Dict[str, Any]:
+        """Build the per-attempt timing entry returned to the client."""
+        record = {
+            "attempt": attempt,
+            "stage": stage,
+            "status": result["status"],
+            "seconds": round(time.perf_counter() - stage_start, 3),
+        }
+        if result.get("fix_mode"):
+            record["fix_mode"] = result["fix_mode"]
+        if result.get("route"):
+            record["route"] = result["route"]
+        if result["status"] == "error":
+            record["error"] = error_signature(result.get("error", ""))
+        return record
+
+    def _final(self, status: str, start: float, attempts: List[Dict[str, Any]], stop_reason: str, **fields) -> Dict[str, Any]:
+        """Build the consolidated result of a loop run."""
+        result = {
+            "status": status,
+            "attempts": attempts,
+            "stop_reason": stop_reason,
+            "total_seconds": round(time.perf_counter() - start, 3),
+        }
+        result.update(fields)
+        return result
@@ -0,0 +1,249 @@
+"""
+Multi-scene planning: split long prompts into short parts, build them
+concurrently and stitch the videos in order.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple, Awaitable
+
+from app.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+MULTI_SCENE_ENABLED = os.getenv("MANIM_MULTI_SCENE", "1") == "1"
+MAX_SCENE_PARTS = int(os.getenv("MANIM_MAX_SCENE_PARTS", "4"))
+PART_SECONDS = 15
+
+# Requests asking for more than this many seconds are split
+SPLIT_ABOVE_SECONDS = 20
+
+# Step lists with no duration are split only when the prompt is this long:
+# short step-by-step prompts build better (and faster) as one scene
+SPLIT_MIN_WORDS = 40
+
+# A part that still fails after its fix loop is regenerated this many times
+MAX_PART_REGENERATIONS = 1
+
+# "1. ...", "2) ...", "- ..." step lines
+_NUMBERED_STEP_RE = re.compile(r'^\s*(?:\d+[.)]|-|\*)\s+')
+# "45 seconds", "45-second", "45 secs", "45s" (a bare "s" only right after the number)
+_DURATION_RE = re.compile(r'(\d+)(?:\s*-?\s*(?:seconds?|secs?)\b|s\b)', re.IGNORECASE)
+
+# Retrieval callback: prompt -> awaitable (examples, api_refs)
+Retrieve = Callable[[str], Awaitable[Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]]]
+
+
+def requested_seconds(prompt: str) -> Optional[int]:
+    """Total duration the prompt asks for, if it names one ("a 45-second animation")."""
+    values = [int(m) for m in _DURATION_RE.findall(prompt)]
+    return max(values) if values else None
+
+
+def heuristic_parts(prompt: str, max_parts: int = MAX_SCENE_PARTS) -> List[Dict[str, Any]]:
+    """
+    Split a prompt on its numbered or bulleted steps.
+
+    The text before the first step is shared setup and, with the full step
+    list, is repeated in every part: each part can be generated on its own
+    and later steps keep what they refer to ("make it blue"). Steps beyond
+    `max_parts` are merged into the last part.
+    """
+    lines = prompt.strip().splitlines()
+    setup, steps = [], []
+    for line in lines:
+        if _NUMBERED_STEP_RE.match(line):
+            steps.append(_NUMBERED_STEP_RE.sub("", line, count=1).strip())
+        elif steps and line.strip():
+            steps[-1] += " " + line.strip()
+        elif line.strip():
+            setup.append(line.strip())
+
+    if len(steps) < 2:
+        return []
+
+    if len(steps) > max_parts:
+        steps = steps[:max_parts - 1] + [" Then ".join(steps[max_parts - 1:])]
+
+    context = re.sub(r'\s+', ' ', _DURATION_RE.sub("", " ".join(setup))).strip()
+    all_steps = " ".join(f"{i}. {step}" for i, step in enumerate(steps, 1))
+    return [
+        {
+            "title": step[:60],
+            "prompt": f"Create a {PART_SECONDS}-second animation of step {i}: {step}"
+                      f"\n(Part {i} of {len(steps)} of a longer video."
+                      + (f" Overall request: {context}." if context else "")
+                      + f" All steps: {all_steps})",
+            "seconds": PART_SECONDS,
+        }
+        for i, step in enumerate(steps, 1)
+    ]
+
+
+class ScenePlanner:
+    """Builds long animations as independently generated, parallel-rendered parts."""
+
+    def __init__(
+        self,
+        generator,
+        pipeline,
+        renderer,
+        max_parts: int = MAX_SCENE_PARTS,
+        enabled: bool = MULTI_SCENE_ENABLED,
+    ):
+        self.generator = generator
+        self.pipeline = pipeline
+        self.renderer = renderer
+        self.max_parts = max_parts
+        self.enabled = enabled
+
+    def should_split(self, prompt: str) -> bool:
+        """
+        Split when the prompt asks for a long video, or is long and lists
+        more steps than fit in SPLIT_ABOVE_SECONDS.
+        """
+        if not self.enabled:
+            return False
+        seconds = requested_seconds(prompt)
+        if seconds is not None:
+            return seconds > SPLIT_ABOVE_SECONDS
+        steps = len(heuristic_parts(prompt, self.max_parts))
+        return (
+            steps >= 2
+            and steps * PART_SECONDS > SPLIT_ABOVE_SECONDS
+            and len(prompt.split()) >= SPLIT_MIN_WORDS
+        )
+
+    async def plan(self, prompt: str) -> Dict[str, Any]:
+        """
+        Decompose `prompt` into part specs, with the LLM or by its numbered steps.
+
+        Returns {"parts": [{"title", "prompt", "seconds"}, ...], "source": "llm" | "heuristic"}.
+        """
+        result = await self.generator.plan_scenes(prompt, max_parts=self.max_parts, part_seconds=PART_SECONDS)
+        if result["status"] == "success" and len(result["parts"]) >= 2:
+            return {"parts": result["parts"], "source": "llm"}
+
+        logger.info(f"Scene planning fell back to numbered steps: {result.get('error', 'single part')}")
+        parts = heuristic_parts(prompt, self.max_parts)
+        if not parts:
+            parts = [{"title": "Scene", "prompt": prompt, "seconds": PART_SECONDS}]
+        return {"parts": parts, "source": "heuristic"}
+
+    async def generate_and_render(
+        self,
+        prompt: str,
+        work_dir: Path,
+        retrieve: Retrieve,
+        max_fix_attempts: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Plan, build all parts concurrently and stitch them into one video.
+
+        Same result shape as `ScenePipeline.generate_and_render`, plus
+        "parts" with the per-part outcome. Attempt entries carry a "part" index.
+        """
+        start = time.perf_counter()
+        plan = await self.plan(prompt)
+        parts = plan["parts"]
+        plan_text = "\n".join(
+            f"{i}. {p['title'] or p['prompt'][:60]} ({p['seconds']}s)" for i, p in enumerate(parts, 1)
+        )
+        logger.info(f"Building {len(parts)} scene parts ({plan['source']} plan)")
+
+        outcomes = await asyncio.gather(*[
+            self._build_part(i, part, work_dir / f"part_{i}", retrieve, max_fix_attempts)
+            for i, part in enumerate(parts, 1)
+        ])
+
+        attempts = [a for outcome in outcomes for a in outcome["attempts"]]
+        code = "\n\n".join(
+            f"# --- Part {i}: {p['title']} ---\n{o.get('code') or ''}"
+            for i, (p, o) in enumerate(zip(parts, outcomes), 1)
+        )
+        part_results = [
+            {
+                "part": i,
+                "title": p["title"],
+                "prompt": p["prompt"],
+                "status": o["status"],
+                "stop_reason": o["stop_reason"],
+                "regenerations": o["regenerations"],
+                "seconds": o["total_seconds"],
+            }
+            for i, (p, o) in enumerate(zip(parts, outcomes), 1)
+        ]
+
+        failed = [r for r in part_results if r["status"] != "success"]
+        if failed:
+            errors = "\n\n".join(
+                f"Part {r['part']} ({r['title']}):\n{outcomes[r['part'] - 1].get('error', '')}" for r in failed
+            )
+            return self._final("error", start, attempts, "part_failed", plan_text, code, part_results, error=errors)
+
+        stage_start = time.perf_counter()
+        with stage("encode"):
+            stitched = await self.renderer.stitch([o["video_path"] for o in outcomes])
+        attempts.append({
+            "attempt": 0,
+            "stage": "stitch",
+            "status": stitched["status"],
+            "seconds": round(time.perf_counter() - stage_start, 3),
+        })
+        if stitched["status"] == "error":
+            return self._final("error", start, attempts, "stitch_failed", plan_text, code, part_results,
+                               error=stitched["error"])
+
+        return self._final("success", start, attempts, "rendered", plan_text, code, part_results,
+                           video_path=stitched["video_path"])
+
+    async def _build_part(
+        self,
+        index: int,
+        part: Dict[str, Any],
+        part_dir: Path,
+        retrieve: Retrieve,
+        max_fix_attempts: Optional[int],
+    ) -> Dict[str, Any]:
+        """Generate, render (in its own process) and fix one part; regenerate it if that fails."""
+        start = time.perf_counter()
+        part_dir.mkdir(parents=True, exist_ok=True)
+        examples, api_refs = await retrieve(part["prompt"])
+
+        attempts = []
+        outcome = None
+        for regeneration in range(MAX_PART_REGENERATIONS + 1):
+            if regeneration:
+                logger.info(f"Regenerating part {index}: {outcome.get('error', '')[:200]}")
+            outcome = await self.pipeline.generate_and_render(
+                part["prompt"],
+                scene_path=part_dir / "scene.py",
+                examples=examples,
+                api_refs=api_refs,
+                max_fix_attempts=max_fix_attempts,
+                render_options={"media_dir": part_dir / "media", "isolated": True},
+            )
+            attempts.extend({**a, "part": index} for a in outcome["attempts"])
+            if outcome["status"] == "success":
+                break
+
+        outcome["attempts"] = attempts
+        outcome["regenerations"] = regeneration
+        outcome["total_seconds"] = round(time.perf_counter() - start, 3)
+        return outcome
+
+    def _final(self, status, start, attempts, stop_reason, plan, code, parts, **fields) -> Dict[str, Any]:
+        result = {
+            "status": status,
+            "attempts": attempts,
+            "stop_reason": stop_reason,
+            "total_seconds": round(time.perf_counter() - start, 3),
+            "plan": plan,
+            "code": code,
+            "parts": parts,
+        }
+        result.update(fields)
+        return result
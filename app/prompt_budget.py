@@ -0,0 +1,104 @@
+"""
+Token budgeting for the retrieved context in the system prompt.
+"""
+import logging
+import math
+import os
+from typing import List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Budget for retrieved examples + API refs (the fixed instructions are extra)
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+# Code-heavy text averages about 3.5 characters per Claude token
+CHARS_PER_TOKEN = 3.5
+
+# Below this many tokens a truncated block is not worth including
+MIN_TRUNCATED_TOKENS = 120
+
+TRUNCATION_MARKER = "# ... (truncated)"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate; close enough to budget with, no API call."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` at a line boundary so it fits in `max_tokens`, marking the cut."""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN) - len(TRUNCATION_MARKER) - 1
+    if max_chars <= 0:
+        return ""
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        if used + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    if not kept:
+        return ""
+    return "\n".join(kept) + "\n" + TRUNCATION_MARKER
+
+
+class PromptBudget:
+    """Fills a token budget with context blocks in relevance order."""
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_TOKEN_BUDGET):
+        self.max_tokens = max_tokens
+
+    def fill(self, blocks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Choose what fits from `blocks`, most relevant first.
+
+        Each block is {"label": str, "text": str, "summary": str (optional)}.
+        A block that does not fit is replaced by its summary, then truncated,
+        then dropped. Returns the chosen blocks (with "text" set to what will
+        be used and "mode" set to "full" | "summary" | "truncated") and a
+        report of what happened to each block.
+        """
+        remaining = self.max_tokens
+        chosen = []
+        report = {
+            "budget": self.max_tokens,
+            "used": 0,
+            "full": [],
+            "summarized": [],
+            "truncated": [],
+            "dropped": [],
+        }
+
+        for block in blocks:
+            text = block["text"]
+            tokens = estimate_tokens(text)
+            mode = "full"
+
+            if tokens > remaining and block.get("summary"):
+                text = block["summary"]
+                tokens = estimate_tokens(text)
+                mode = "summary"
+
+            if tokens > remaining:
+                text = truncate_to_tokens(text, remaining) if remaining >= MIN_TRUNCATED_TOKENS else ""
+                tokens = estimate_tokens(text)
+                mode = "truncated"
+
+            if not text:
+                report["dropped"].append(block["label"])
+                continue
+
+            remaining -= tokens
+            chosen.append({**block, "text": text, "mode": mode, "tokens": tokens})
+            report[{"full": "full", "summary": "summarized", "truncated": "truncated"}[mode]].append(block["label"])
+
+        report["used"] = self.max_tokens - remaining
+        if report["summarized"] or report["truncated"] or report["dropped"]:
+            logger.info(
+                f"Prompt budget {report['used']}/{self.max_tokens} tokens; "
+                f"summarized={report['summarized']} truncated={report['truncated']} "
+                f"dropped={report['dropped']}"
+            )
+        return chosen, report
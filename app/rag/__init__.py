@@ -1,7 +1,8 @@
 """
 RAG (Retrieval-Augmented Generation) module for Manim code generation.
 
-Uses ChromaDB for vector storage and Voyage AI for embeddings.
+Uses ChromaDB for vector storage and Voyage AI (or a local, offline backend)
+for embeddings.
 """
 import os
 from pathlib import Path
@@ -9,14 +10,53 @@ from pathlib import Path
 # Paths
 CHROMA_DB_PATH = str(Path(__file__).parent.parent.parent / "chroma_db")
 
+# What the index was built from (for incremental updates)
+INDEX_MANIFEST_PATH = str(Path(__file__).parent.parent.parent / "chroma_db" / "index_manifest.json")
+
+# Parsed Manim source chunks, one JSON file per source file
+CHUNK_CACHE_DIR = str(Path(__file__).parent.parent.parent / "chroma_db" / "chunk_cache")
+
+# BM25 keyword indexes, one .npz per collection (hybrid search)
+BM25_DIR = str(Path(__file__).parent.parent.parent / "chroma_db" / "bm25")
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "1") not in ("0", "false", "no")
+
+# Embeddings already computed, reused across index rebuilds
+EMBEDDING_CACHE_PATH = os.getenv(
+    "RAG_EMBEDDING_CACHE_PATH",
+    str(Path(__file__).parent.parent.parent / "chroma_db" / "embedding_cache.sqlite3"),
+)
+
 # Voyage AI config
 VOYAGE_MODEL = "voyage-code-3"
 VOYAGE_API_KEY_ENV = "VOYAGE_API_KEY"
 
+# Embedding backend: "voyage" (needs VOYAGE_API_KEY) or "local" (offline)
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "voyage").strip().lower()
+LOCAL_EMBEDDING_DIM = int(os.getenv("RAG_LOCAL_EMBEDDING_DIM", "256"))
+
+# Where searches run: "numpy" (in-memory copy of the collections), "chroma",
+# or "snapshot" (memory-mapped SNAPSHOT_PATH, shared by all worker processes)
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "numpy").strip().lower()
+
+# Quantized single-file index snapshot ("int8" or "float16" vectors)
+SNAPSHOT_PATH = os.getenv(
+    "RAG_SNAPSHOT_PATH",
+    str(Path(__file__).parent.parent.parent / "chroma_db" / "index_snapshot.bin"),
+)
+SNAPSHOT_DTYPE = os.getenv("RAG_SNAPSHOT_DTYPE", "int8")
+
 # ChromaDB collection names
 COLLECTION_MANIM_API = "manim_api"
 COLLECTION_MANIM_EXAMPLES = "manim_examples"
 
-# Retrieval defaults
-DEFAULT_TOP_K_API = 10
+# Retrieval defaults: hybrid search finds exact API hits, so fewer chunks do
+TOP_K_API_VECTOR = 10
+TOP_K_API_HYBRID = 6
+DEFAULT_TOP_K_API = TOP_K_API_HYBRID if HYBRID_SEARCH else TOP_K_API_VECTOR
 DEFAULT_TOP_K_EXAMPLES = 5
+
+
+def rag_available(backend: str = None) -> bool:
+    """Whether the configured embedding backend can run (Voyage needs an API key)."""
+    backend = backend or EMBEDDING_BACKEND
+    return backend == "local" or bool(os.getenv(VOYAGE_API_KEY_ENV))
@@ -0,0 +1,157 @@
+"""
+BM25 keyword index for the RAG collections, fused with vector results.
+
+Embeddings blur exact identifiers: a prompt naming `TracedPath` or
+`always_redraw` should rank those API chunks first. Tokenization keeps each
+identifier whole (lowercased) and also splits it into its CamelCase and
+snake_case parts, so "TracedPath" matches both the class and prompts that
+say "traced path".
+
+The indexer builds one BM25 index per collection and saves it as a `.npz`
+next to the ChromaDB data; postings are flat NumPy arrays, so loading takes
+milliseconds and scoring is a few vectorized updates per query term.
+"""
+import logging
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.rag import BM25_DIR
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant (the usual 60: damps the head of each list)
+RRF_K = 60
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into",
+    "is", "it", "its", "of", "on", "or", "that", "the", "then", "this", "to",
+    "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Identifier-aware tokens: each identifier lowercased, plus its parts.
+
+    "TracedPath(always_redraw)" -> tracedpath, traced, path, always_redraw, always, redraw
+    """
+    tokens = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        whole = identifier.strip("_").lower()
+        if len(whole) < 2 or whole in _STOPWORDS:
+            continue
+        tokens.append(whole)
+        parts = [p.lower() for p in _PART_RE.findall(identifier)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return tokens
+
+
+def bm25_path(collection_name: str, bm25_dir: str = BM25_DIR) -> Path:
+    return Path(bm25_dir) / f"{collection_name}.npz"
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """(id, fused score) over several best-first rankings, by sum of 1 / (k + rank), best first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index stored as flat arrays."""
+
+    def __init__(self, ids: Sequence[str], lengths, terms: Sequence[str], offsets, rows, tfs):
+        self.ids = list(ids)
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.float32)
+        self.terms = list(terms)
+        self._terms = {term: i for i, term in enumerate(self.terms)}
+        self._avg_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str]) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in terms], out=offsets[1:])
+        flat = [p for t in terms for p in postings[t]]
+        rows = np.array([p[0] for p in flat], dtype=np.int32)
+        tfs = np.array([p[1] for p in flat], dtype=np.float32)
+        return cls(ids, lengths, terms, offsets, rows, tfs)
+
+    @classmethod
+    def from_collection(cls, collection) -> "BM25Index":
+        """Index every document of a ChromaDB collection."""
+        results = collection.get(include=["documents"])
+        return cls.build(results["ids"], results["documents"] or [])
+
+    @classmethod
+    def load(cls, path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["ids"].tolist(), data["lengths"], data["terms"].tolist(),
+                data["offsets"], data["rows"], data["tfs"],
+            )
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(
+            tmp,
+            ids=np.array(self.ids, dtype=str),
+            lengths=self.lengths,
+            terms=np.array(self.terms, dtype=str),
+            offsets=self.offsets,
+            rows=self.rows,
+            tfs=self.tfs,
+        )
+        tmp.replace(path)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """(id, score) of the best `top_k` documents with any query term, best first."""
+        n = len(self.ids)
+        if n == 0 or top_k <= 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self._terms.get(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            rows, tfs = self.rows[start:end], self.tfs[start:end]
+            idf = math.log(1.0 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.lengths[rows] / self._avg_length)
+            scores[rows] += idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.ids[r], float(scores[r])) for r in hits]
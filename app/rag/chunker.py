@@ -2,28 +2,78 @@
 Manim source code chunker using Python AST.
 
 Parses the installed Manim package to extract class-level documentation
-chunks suitable for embedding and retrieval.
+chunks suitable for embedding and retrieval. Files are parsed in a process
+pool and the chunks of each file are cached on disk, keyed by path, size,
+mtime and Manim version.
 """
 import ast
-import inspect
+import hashlib
+import importlib.util
+import json
+import logging
+import os
 import textwrap
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Iterable, Optional, Tuple
+
+from app.rag import CHUNK_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+CHUNK_WORKERS = int(os.getenv("RAG_CHUNK_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Bump when the chunk format changes, to invalidate cached chunks
+CHUNK_FORMAT_VERSION = 1
+
+
+def _chunk_file(manim_path: str, py_file: str) -> List[Dict[str, Any]]:
+    """Process-pool entry point: chunks of one file."""
+    return ManimChunker(manim_path=Path(manim_path), cache_dir=None).extract_file_chunks(Path(py_file))
+
+
+def installed_manim_version() -> str:
+    """Version of the installed Manim package ("unknown" if not found)."""
+    try:
+        from importlib.metadata import version
+        return version("manim")
+    except Exception:
+        return "unknown"
 
 
 class ManimChunker:
     """Extracts structured chunks from the Manim library source."""
 
-    def __init__(self):
-        self._manim_path = self._find_manim_source()
+    def __init__(self, manim_path: Optional[Path] = None, cache_dir: Optional[str] = CHUNK_CACHE_DIR):
+        self._manim_path = Path(manim_path) if manim_path else self._find_manim_source()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._version = None
 
     def _find_manim_source(self) -> Path:
-        """Locate the installed Manim package source directory."""
-        try:
-            import manim
-            return Path(inspect.getfile(manim)).parent
-        except ImportError:
+        """Locate the installed Manim package source directory (without importing it)."""
+        spec = importlib.util.find_spec("manim")
+        if spec is None or not spec.origin:
             raise RuntimeError("Manim is not installed. Run: pip install manim")
+        return Path(spec.origin).parent
+
+    @property
+    def manim_version(self) -> str:
+        """Version of the installed Manim the chunks are extracted from."""
+        if self._version is None:
+            self._version = installed_manim_version()
+        return self._version
+
+    def source_files(self) -> List[Path]:
+        """Python files of the Manim package that are chunked, in a stable order."""
+        return sorted(
+            f for f in self._manim_path.rglob("*.py")
+            # Skip test files, __pycache__, etc.
+            if "__pycache__" not in str(f) and "_test" not in f.name
+        )
+
+    def relative_source(self, py_file: Path) -> str:
+        """Path of a source file relative to the Manim package (the chunks' "source")."""
+        return py_file.relative_to(self._manim_path).as_posix()
 
     def extract_chunks(self) -> List[Dict[str, Any]]:
         """
@@ -34,78 +84,156 @@ class ManimChunker:
             - type: "class" or "module"
             - name: class/module name
             - module: full module path
+            - source: file path relative to the Manim package
             - content: formatted text for embedding
             - bases: list of base class names (for classes)
             - methods: list of method signatures (for classes)
         """
+        return list(self.iter_chunks())
+
+    def iter_chunks(self, workers: int = CHUNK_WORKERS) -> Iterator[Dict[str, Any]]:
+        """Stream chunks as files are parsed (see `iter_file_chunks`)."""
+        for _, chunks in self.iter_file_chunks(workers=workers):
+            yield from chunks
+
+    def iter_file_chunks(
+        self,
+        files: Optional[Iterable[Path]] = None,
+        workers: int = CHUNK_WORKERS,
+    ) -> Iterator[Tuple[Path, List[Dict[str, Any]]]]:
+        """
+        Yield (file, chunks) for `files` (default: all source files).
+
+        Cached files come first; the rest are parsed across `workers`
+        processes and yielded as each finishes, so a consumer can embed
+        early chunks while later files are still being parsed.
+        """
+        files = self.source_files() if files is None else list(files)
+        misses = []
+        for py_file in files:
+            cached = self._cached_chunks(py_file)
+            if cached is None:
+                misses.append(py_file)
+            else:
+                yield py_file, cached
+
+        if not misses:
+            return
+        logger.info(f"Parsing {len(misses)} Manim source files ({len(files) - len(misses)} cached)")
+
+        if workers <= 1 or len(misses) < 2 * workers:
+            for py_file in misses:
+                chunks = self.extract_file_chunks(py_file)
+                self._store_chunks(py_file, chunks)
+                yield py_file, chunks
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_chunk_file, str(self._manim_path), str(f)): f for f in misses}
+            for future in as_completed(futures):
+                py_file = futures[future]
+                chunks = future.result()
+                self._store_chunks(py_file, chunks)
+                yield py_file, chunks
+
+    def _cache_file(self, py_file: Path) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        stat = py_file.stat()
+        key = json.dumps([
+            self.relative_source(py_file), stat.st_size, stat.st_mtime_ns,
+            self.manim_version, CHUNK_FORMAT_VERSION,
+        ])
+        return self.cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _cached_chunks(self, py_file: Path) -> Optional[List[Dict[str, Any]]]:
+        path = self._cache_file(py_file)
+        if path is None or not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def _store_chunks(self, py_file: Path, chunks: List[Dict[str, Any]]):
+        path = self._cache_file(py_file)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(chunks), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            logger.warning(f"Could not cache chunks of {py_file}: {e}")
+
+    def extract_file_chunks(self, py_file: Path) -> List[Dict[str, Any]]:
+        """Chunks of one source file (empty if it does not parse)."""
+        rel_path = py_file.relative_to(self._manim_path)
+        source_name = self.relative_source(py_file)
+        module_name = "manim." + str(rel_path.with_suffix("")).replace("\\", ".").replace("/", ".")
+
+        try:
+            source = py_file.read_text(encoding="utf-8", errors="ignore")
+            tree = ast.parse(source)
+        except (SyntaxError, UnicodeDecodeError):
+            return []
+
         chunks = []
-        py_files = list(self._manim_path.rglob("*.py"))
 
-        for py_file in py_files:
-            rel_path = py_file.relative_to(self._manim_path)
-            module_name = "manim." + str(rel_path.with_suffix("")).replace("\\", ".").replace("/", ".")
+        # Extract module-level docstring
+        module_doc = ast.get_docstring(tree)
+        if module_doc and len(module_doc.strip()) > 20:
+            chunks.append({
+                "id": module_name,
+                "type": "module",
+                "name": rel_path.stem,
+                "module": module_name,
+                "source": source_name,
+                "content": f"Module: {module_name}\n\n{module_doc.strip()}",
+                "bases": [],
+                "methods": [],
+            })
 
-            # Skip test files, __pycache__, etc.
-            if "__pycache__" in str(py_file) or "_test" in py_file.name:
+        # Extract class-level chunks
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.ClassDef):
                 continue
 
-            try:
-                source = py_file.read_text(encoding="utf-8", errors="ignore")
-                tree = ast.parse(source)
-            except (SyntaxError, UnicodeDecodeError):
-                continue
+            class_name = node.name
+            bases = [self._get_name(b) for b in node.bases]
+            docstring = ast.get_docstring(node) or ""
+            methods = self._extract_method_signatures(node)
+
+            # Build content string for embedding
+            content_parts = [
+                f"Class: {class_name}",
+                f"Module: {module_name}",
+                f"Bases: {', '.join(bases)}" if bases else "",
+            ]
+
+            if docstring:
+                # Truncate very long docstrings
+                doc_lines = docstring.strip().split("\n")
+                if len(doc_lines) > 30:
+                    doc_lines = doc_lines[:30] + ["..."]
+                content_parts.append(f"\nDocstring:\n{chr(10).join(doc_lines)}")
+
+            if methods:
+                content_parts.append(f"\nMethods:\n" + "\n".join(f"  - {m}" for m in methods))
+
+            content = "\n".join(p for p in content_parts if p)
 
-            # Extract module-level docstring
-            module_doc = ast.get_docstring(tree)
-            if module_doc and len(module_doc.strip()) > 20:
-                chunks.append({
-                    "id": module_name,
-                    "type": "module",
-                    "name": rel_path.stem,
-                    "module": module_name,
-                    "content": f"Module: {module_name}\n\n{module_doc.strip()}",
-                    "bases": [],
-                    "methods": [],
-                })
-
-            # Extract class-level chunks
-            for node in ast.walk(tree):
-                if not isinstance(node, ast.ClassDef):
-                    continue
-
-                class_name = node.name
-                bases = [self._get_name(b) for b in node.bases]
-                docstring = ast.get_docstring(node) or ""
-                methods = self._extract_method_signatures(node)
-
-                # Build content string for embedding
-                content_parts = [
-                    f"Class: {class_name}",
-                    f"Module: {module_name}",
-                    f"Bases: {', '.join(bases)}" if bases else "",
-                ]
-
-                if docstring:
-                    # Truncate very long docstrings
-                    doc_lines = docstring.strip().split("\n")
-                    if len(doc_lines) > 30:
-                        doc_lines = doc_lines[:30] + ["..."]
-                    content_parts.append(f"\nDocstring:\n{chr(10).join(doc_lines)}")
-
-                if methods:
-                    content_parts.append(f"\nMethods:\n" + "\n".join(f"  - {m}" for m in methods))
-
-                content = "\n".join(p for p in content_parts if p)
-
-                chunks.append({
-                    "id": f"{module_name}.{class_name}",
-                    "type": "class",
-                    "name": class_name,
-                    "module": module_name,
-                    "content": content,
-                    "bases": bases,
-                    "methods": methods,
-                })
+            chunks.append({
+                "id": f"{module_name}.{class_name}",
+                "type": "class",
+                "name": class_name,
+                "module": module_name,
+                "source": source_name,
+                "content": content,
+                "bases": bases,
+                "methods": methods,
+            })
 
         return chunks
 
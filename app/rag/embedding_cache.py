@@ -0,0 +1,79 @@
+"""
+Persistent embedding cache keyed by (model, input_type, sha256(text)).
+
+Rebuilding the index only embeds chunks whose text is new, and a build that
+was interrupted resumes from the batches already stored.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import List, Optional
+
+from app.rag import EMBEDDING_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite store of embeddings as float32 blobs."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, input_type TEXT NOT NULL, hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL, PRIMARY KEY (model, input_type, hash))"
+        )
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_many(self, model: str, input_type: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached embedding per text, None where missing."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # SQLite caps bound parameters; look up in slices
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND input_type = ?"
+                    f" AND hash IN ({','.join('?' * len(part))})",
+                    [model, input_type, *part],
+                ).fetchall()
+                found.update(rows)
+
+        result = []
+        for h in hashes:
+            blob = found.get(h)
+            if blob is None:
+                result.append(None)
+            else:
+                result.append(array("f", blob).tolist())
+        hits = sum(1 for r in result if r is not None)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(result) - hits
+        return result
+
+    def put_many(self, model: str, input_type: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for `texts` (committed at once, so finished batches survive a crash)."""
+        rows = [
+            (model, input_type, text_hash(t), array("f", e).tobytes())
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -1,18 +1,84 @@
 """
-Voyage AI embedding function for ChromaDB.
+Embedding functions for ChromaDB: Voyage AI, or the offline local backend
+(see `get_embedding_function`).
 """
+import logging
 import os
-from typing import List
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Callable, Optional
 
 from chromadb.api.types import EmbeddingFunction, Documents, Embeddings
 
-from app.rag import VOYAGE_MODEL, VOYAGE_API_KEY_ENV
+from app.rag import EMBEDDING_BACKEND, VOYAGE_MODEL, VOYAGE_API_KEY_ENV
+from app.rag.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Query embeddings kept in memory, keyed by normalized prompt
+QUERY_CACHE_SIZE = 512
+
+# Bulk embedding: batches in flight at once, and per-request limits kept
+# under Voyage's (1000 texts, 120K tokens for voyage-code-3)
+EMBED_CONCURRENCY = int(os.getenv("VOYAGE_EMBED_CONCURRENCY", "4"))
+MAX_BATCH_TEXTS = 128
+MAX_BATCH_TOKENS = int(os.getenv("VOYAGE_MAX_BATCH_TOKENS", "100000"))
+EMBED_MAX_RETRIES = 5
+EMBED_BACKOFF_SECONDS = 1.0
+
+# progress(done_texts, total_texts)
+Progress = Callable[[int, int], None]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (code runs about 3 characters per token)."""
+    return len(text) // 3 + 1
+
+
+def token_batches(texts: List[str], max_texts: int = MAX_BATCH_TEXTS, max_tokens: int = MAX_BATCH_TOKENS) -> List[List[int]]:
+    """Split text indices into batches under both the text and token limits."""
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_texts or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def get_embedding_function(backend: str = None) -> EmbeddingFunction:
+    """
+    The embedding function of the configured backend (RAG_EMBEDDING_BACKEND).
+
+    Every backend exposes `embed_documents(texts, concurrency, progress)`,
+    `embed_query(query)` and `aembed_query(query)` besides ChromaDB's `__call__`.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "voyage":
+        return VoyageEmbeddingFunction()
+    if backend == "local":
+        from app.rag.local_embeddings import LocalEmbeddingFunction
+        return LocalEmbeddingFunction()
+    raise ValueError(f"Unknown embedding backend {backend!r} (expected 'voyage' or 'local')")
+
+
+def backend_id(embedding_fn) -> str:
+    """Identifies the vectors an embedding function produces (class and model)."""
+    return f"{type(embedding_fn).__name__}:{getattr(embedding_fn, 'model', '')}"
 
 
 class VoyageEmbeddingFunction(EmbeddingFunction):
     """ChromaDB-compatible embedding function using Voyage AI."""
 
-    def __init__(self, model: str = VOYAGE_MODEL, api_key: str = None):
+    def __init__(self, model: str = VOYAGE_MODEL, api_key: str = None, cache: EmbeddingCache = None):
         import voyageai
 
         self.api_key = api_key or os.getenv(VOYAGE_API_KEY_ENV)
@@ -23,17 +89,101 @@ class VoyageEmbeddingFunction(EmbeddingFunction):
             )
         self.client = voyageai.Client(api_key=self.api_key)
         self.model = model
+        self.cache = cache or EmbeddingCache()
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self._async_client = None
 
     def __call__(self, input: Documents) -> Embeddings:
-        """Embed a list of documents."""
-        if not input:
+        """Embed a list of documents; only texts missing from the cache hit the API."""
+        return self.embed_documents(list(input))
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        concurrency: int = EMBED_CONCURRENCY,
+        progress: Optional[Progress] = None,
+    ) -> List[List[float]]:
+        """
+        Bulk-embed documents: cache misses are split into token-aware batches
+        and sent `concurrency` at a time, each retried with backoff. Every
+        finished batch is cached at once, so an interrupted run resumes.
+        """
+        if not texts:
             return []
 
-        # Voyage AI has a batch limit; process in chunks of 128
-        all_embeddings = []
-        for i in range(0, len(input), 128):
-            batch = input[i : i + 128]
-            result = self.client.embed(batch, model=self.model, input_type="document")
-            all_embeddings.extend(result.embeddings)
+        embeddings = self.cache.get_many(self.model, "document", texts)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        total = len(texts)
+        done = total - len(missing)
+        if progress:
+            progress(done, total)
+        if not missing:
+            return embeddings
+
+        batches = [[missing[j] for j in batch] for batch in token_batches([texts[i] for i in missing])]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {
+                pool.submit(self._embed_batch, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                result = future.result()
+                self.cache.put_many(self.model, "document", [texts[i] for i in batch], result)
+                for i, embedding in zip(batch, result):
+                    embeddings[i] = embedding
+                done += len(batch)
+                if progress:
+                    progress(done, total)
+
+        return embeddings
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """One embed request, retried with exponential backoff and jitter."""
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return self.client.embed(batch, model=self.model, input_type="document").embeddings
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                delay = EMBED_BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query (input_type "query"), memoized by normalized text
+        so a repeated prompt needs no API call.
+        """
+        key = re.sub(r"\s+", " ", query).strip()
+        with self._queries_lock:
+            if key in self._queries:
+                self._queries.move_to_end(key)
+                return self._queries[key]
+
+        embedding = self.client.embed([key], model=self.model, input_type="query").embeddings[0]
+        self._remember_query(key, embedding)
+        return embedding
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """`embed_query` over Voyage's async client, for use inside request handlers."""
+        key = re.sub(r"\s+", " ", query).strip()
+        with self._queries_lock:
+            if key in self._queries:
+                self._queries.move_to_end(key)
+                return self._queries[key]
+
+        if self._async_client is None:
+            import voyageai
+            self._async_client = voyageai.AsyncClient(api_key=self.api_key)
+        result = await self._async_client.embed([key], model=self.model, input_type="query")
+        embedding = result.embeddings[0]
+        self._remember_query(key, embedding)
+        return embedding
 
-        return all_embeddings
+    def _remember_query(self, key: str, embedding: List[float]):
+        with self._queries_lock:
+            self._queries[key] = embedding
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
@@ -1,32 +1,96 @@
 """
 Manim RAG indexer — builds ChromaDB collections from Manim source and curated examples.
+
+Builds are incremental: a manifest records the Manim version, a hash per
+source file and per example directory, and only the chunks whose source
+changed are upserted or deleted.
 """
+import hashlib
 import json
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
 
 import chromadb
+from chromadb.api.types import EmbeddingFunction
 
 from app.rag import (
     CHROMA_DB_PATH,
     COLLECTION_MANIM_API,
     COLLECTION_MANIM_EXAMPLES,
+    INDEX_MANIFEST_PATH,
 )
-from app.rag.embeddings import VoyageEmbeddingFunction
-from app.rag.chunker import ManimChunker
+from app.rag.bm25 import BM25Index, bm25_path
+from app.rag.embeddings import backend_id, get_embedding_function
+from app.rag.chunker import ManimChunker, installed_manim_version
+from app.compact import compact_code, compact_notes, compact_api_chunk
 
 logger = logging.getLogger(__name__)
 
 BATCH_SIZE = 100
 
+# API chunks embedded per group while parsing continues in the background
+STREAM_EMBED_CHUNKS = 512
+MANIFEST_VERSION = 1
+
+EXAMPLES_DIR = Path(__file__).parent.parent.parent / "examples"
+EXAMPLE_FILES = ("example.py", "meta.json", "notes.md")
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def example_hash(example_dir: Path) -> str:
+    """Hash of the files of an example directory that end up in the index."""
+    digest = hashlib.sha256()
+    for name in EXAMPLE_FILES:
+        path = example_dir / name
+        if path.exists():
+            digest.update(name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def example_dirs(examples_dir: Path = EXAMPLES_DIR) -> List[Path]:
+    """Example directories that have an example.py."""
+    if not examples_dir.exists():
+        return []
+    return [d for d in sorted(examples_dir.iterdir()) if d.is_dir() and (d / "example.py").exists()]
+
+
+def index_source(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """What an index was built from: the Manim version and example hashes."""
+    return {"manim_version": manifest.get("manim_version"), "examples": dict(manifest.get("examples", {}))}
+
+
+def current_source() -> Dict[str, Any]:
+    """`index_source` of the installed Manim and the examples on disk."""
+    return {
+        "manim_version": installed_manim_version(),
+        "examples": {d.name: example_hash(d) for d in example_dirs()},
+    }
+
+
+def source_changes(built: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Human-readable differences between two `index_source` results."""
+    changes = []
+    if built.get("manim_version") != current.get("manim_version"):
+        changes.append(f"Manim {built.get('manim_version')} -> {current.get('manim_version')}")
+    old, new = built.get("examples", {}), current.get("examples", {})
+    changed = sorted(name for name in old.keys() | new.keys() if old.get(name) != new.get(name))
+    if changed:
+        changes.append(f"{len(changed)} example(s) changed: {', '.join(changed[:5])}")
+    return changes
+
 
 class ManimIndexer:
     """Builds and manages ChromaDB collections for Manim RAG."""
 
-    def __init__(self, embedding_fn: VoyageEmbeddingFunction = None):
-        self.embedding_fn = embedding_fn or VoyageEmbeddingFunction()
+    def __init__(self, embedding_fn: EmbeddingFunction = None, manifest_path: str = INDEX_MANIFEST_PATH):
+        self.embedding_fn = embedding_fn or get_embedding_function()
         self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        self.manifest_path = Path(manifest_path)
 
     def index_exists(self) -> bool:
         """Check if both collections already exist and have data."""
@@ -37,147 +101,273 @@ class ManimIndexer:
         except Exception:
             return False
 
-    def build_index(self, rebuild: bool = False) -> Dict[str, int]:
+    def build_index(self, rebuild: bool = False, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
         """
-        Build the full index. Returns counts of indexed items.
+        Bring the index up to date. Returns counts of indexed items, plus
+        "changes" with how many sources were upserted and deleted.
 
         Args:
             rebuild: If True, delete existing collections and rebuild from scratch.
+            progress: Called as progress(done, total) while API chunks are embedded.
         """
-        if rebuild:
-            self._delete_collections()
-        elif self.index_exists():
-            api_count = self.client.get_collection(COLLECTION_MANIM_API).count()
-            ex_count = self.client.get_collection(COLLECTION_MANIM_EXAMPLES).count()
-            logger.info(f"Using existing index ({api_count} API chunks, {ex_count} examples)")
-            return {"api_chunks": api_count, "examples": ex_count}
-
-        # Build API collection
-        api_count = self._index_manim_api()
+        manifest = self._load_manifest()
+        backend = self._embedding_backend()
 
-        # Build examples collection
-        ex_count = self._index_examples()
+        if not rebuild and manifest is not None and manifest.get("embedding_backend") != backend:
+            logger.info(f"Embedding backend changed ({manifest.get('embedding_backend')} -> {backend}), rebuilding")
+            rebuild = True
+        if not rebuild and manifest is None and self.index_exists():
+            # Built before manifests existed: chunks carry no "source" to diff against
+            logger.info("Index has no manifest, rebuilding")
+            rebuild = True
 
-        logger.info(f"Indexed {api_count} API chunks, {ex_count} examples")
-        return {"api_chunks": api_count, "examples": ex_count}
+        if rebuild:
+            self._delete_collections()
+            manifest = None
+        manifest = manifest or {
+            "version": MANIFEST_VERSION,
+            "embedding_backend": backend,
+            "manim_version": None,
+            "api_files": {},
+            "examples": {},
+        }
+
+        api_changes = self._sync_manim_api(manifest, progress)
+        self._save_manifest(manifest)
+        self._update_bm25(COLLECTION_MANIM_API, api_changes)
+        example_changes = self._sync_examples(manifest)
+        self._save_manifest(manifest)
+        self._update_bm25(COLLECTION_MANIM_EXAMPLES, example_changes)
+
+        api_count = self.client.get_collection(COLLECTION_MANIM_API).count()
+        ex_count = self.client.get_collection(COLLECTION_MANIM_EXAMPLES).count()
+        logger.info(
+            f"Index up to date: {api_count} API chunks, {ex_count} examples "
+            f"(API files changed {api_changes['upserted']}, removed {api_changes['deleted']}; "
+            f"examples changed {example_changes['upserted']}, removed {example_changes['deleted']})"
+        )
+        return {
+            "api_chunks": api_count,
+            "examples": ex_count,
+            "changes": {"api_files": api_changes, "examples": example_changes},
+        }
+
+    def sync_examples(self) -> Dict[str, int]:
+        """Upsert/delete only the examples that changed since the last build."""
+        manifest = self._load_manifest()
+        if manifest is None:
+            return self.build_index()["changes"]["examples"]
+        changes = self._sync_examples(manifest)
+        self._save_manifest(manifest)
+        self._update_bm25(COLLECTION_MANIM_EXAMPLES, changes)
+        return changes
 
     def _delete_collections(self):
-        """Delete existing collections."""
+        """Delete existing collections, their BM25 indexes and the manifest."""
         for name in [COLLECTION_MANIM_API, COLLECTION_MANIM_EXAMPLES]:
             try:
                 self.client.delete_collection(name)
             except Exception:
                 pass
+            bm25_path(name).unlink(missing_ok=True)
+        self.manifest_path.unlink(missing_ok=True)
+
+    def _update_bm25(self, name: str, changes: Dict[str, int]):
+        """Rebuild the BM25 index of a collection whose documents changed."""
+        path = bm25_path(name)
+        if path.exists() and not (changes["upserted"] or changes["deleted"]):
+            return
+        index = BM25Index.from_collection(self.client.get_collection(name))
+        index.save(path)
+        logger.info(f"BM25 index of {name}: {len(index)} documents")
+
+    def _embedding_backend(self) -> str:
+        return backend_id(self.embedding_fn)
+
+    def _load_manifest(self) -> Optional[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return None
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable index manifest: {e}")
+            return None
+        return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(self.manifest_path)
+
+    def _sync_manim_api(self, manifest: Dict[str, Any], progress=None) -> Dict[str, int]:
+        """
+        Re-index the Manim source files whose hash changed.
 
-    def _index_manim_api(self) -> int:
-        """Index Manim library source into the API collection."""
+        Installed package files only change with the version, so files are
+        not even hashed while the Manim version matches the manifest.
+        """
         collection = self.client.get_or_create_collection(
             name=COLLECTION_MANIM_API,
             embedding_function=self.embedding_fn,
         )
-
         chunker = ManimChunker()
-        chunks = chunker.extract_chunks()
-
-        if not chunks:
+        version = chunker.manim_version
+        if manifest["manim_version"] == version and manifest["api_files"] and collection.count() > 0:
+            return {"upserted": 0, "deleted": 0}
+
+        current = {chunker.relative_source(f): (f, file_hash(f)) for f in chunker.source_files()}
+        known = manifest["api_files"]
+
+        removed = [source for source in known if source not in current]
+        for source in removed:
+            collection.delete(where={"source": source})
+            del known[source]
+
+        changed = [source for source, (_, digest) in current.items() if known.get(source) != digest]
+        for source in changed:
+            if source in known:
+                collection.delete(where={"source": source})
+
+        # Embed in groups while the remaining files are still being parsed
+        pending = []
+        embedded = 0
+
+        def group_progress(done, total):
+            if progress:
+                progress(embedded + done, embedded + total)
+
+        for _, chunks in chunker.iter_file_chunks(current[source][0] for source in changed):
+            pending.extend(chunks)
+            if len(pending) >= STREAM_EMBED_CHUNKS:
+                self._upsert_api_chunks(collection, pending, group_progress)
+                embedded += len(pending)
+                pending = []
+        self._upsert_api_chunks(collection, pending, group_progress)
+        for source in changed:
+            known[source] = current[source][1]
+
+        manifest["manim_version"] = version
+        if not current:
             logger.warning("No Manim API chunks extracted")
-            return 0
+        return {"upserted": len(changed), "deleted": len(removed)}
+
+    def _embed(self, documents: List[str], progress=None) -> List[List[float]]:
+        """Embed all documents up front, concurrently when the backend supports it."""
+        if hasattr(self.embedding_fn, "embed_documents"):
+            return self.embedding_fn.embed_documents(documents, progress=progress)
+        return self.embedding_fn(documents)
 
+    def _upsert_api_chunks(self, collection, chunks: List[Dict[str, Any]], progress=None):
+        if not chunks:
+            return
+        embeddings = self._embed([c["content"] for c in chunks], progress)
         # Batch insert
         for i in range(0, len(chunks), BATCH_SIZE):
             batch = chunks[i : i + BATCH_SIZE]
-            collection.add(
+            collection.upsert(
                 ids=[c["id"] for c in batch],
+                embeddings=embeddings[i : i + BATCH_SIZE],
                 documents=[c["content"] for c in batch],
                 metadatas=[
                     {
                         "type": c["type"],
                         "name": c["name"],
                         "module": c["module"],
+                        "source": c["source"],
                         "bases": json.dumps(c["bases"]),
                         "methods": json.dumps(c["methods"][:20]),  # Cap method list
+                        "compact": compact_api_chunk({**c, "methods": c["methods"][:20]}),
                     }
                     for c in batch
                 ],
             )
 
-        return len(chunks)
-
-    def _index_examples(self) -> int:
-        """Index curated examples into the examples collection."""
+    def _sync_examples(self, manifest: Dict[str, Any]) -> Dict[str, int]:
+        """Upsert examples whose files changed and delete removed ones."""
         collection = self.client.get_or_create_collection(
             name=COLLECTION_MANIM_EXAMPLES,
             embedding_function=self.embedding_fn,
         )
 
-        examples_dir = Path(__file__).parent.parent.parent / "examples"
-        if not examples_dir.exists():
-            logger.warning(f"Examples directory not found: {examples_dir}")
-            return 0
+        if not EXAMPLES_DIR.exists():
+            logger.warning(f"Examples directory not found: {EXAMPLES_DIR}")
 
-        count = 0
+        current = {d.name: (d, example_hash(d)) for d in example_dirs()}
+        known = manifest["examples"]
+
+        removed = [name for name in known if name not in current]
+        if removed:
+            collection.delete(ids=removed)
+            for name in removed:
+                del known[name]
+
+        changed = [name for name, (_, digest) in current.items() if known.get(name) != digest]
         ids = []
         documents = []
         metadatas = []
+        for name in changed:
+            document, metadata = self._example_record(current[name][0])
+            ids.append(name)
+            documents.append(document)
+            metadatas.append(metadata)
 
-        for example_dir in sorted(examples_dir.iterdir()):
-            if not example_dir.is_dir():
-                continue
-
-            code_file = example_dir / "example.py"
-            meta_file = example_dir / "meta.json"
-            notes_file = example_dir / "notes.md"
-
-            if not code_file.exists():
-                continue
-
-            # Load data
-            code = code_file.read_text(encoding="utf-8", errors="ignore")
-            meta = {}
-            if meta_file.exists():
-                try:
-                    meta = json.loads(meta_file.read_text(encoding="utf-8"))
-                except json.JSONDecodeError:
-                    pass
-
-            notes = ""
-            if notes_file.exists():
-                notes = notes_file.read_text(encoding="utf-8", errors="ignore")
-
-            name = meta.get("name", example_dir.name)
-            tags = meta.get("tags", [])
-            description = meta.get("description", "")
-
-            # Build document text for embedding
-            doc_text = f"Example: {name}\n"
-            if description:
-                doc_text += f"Description: {description}\n"
-            if tags:
-                doc_text += f"Tags: {', '.join(tags)}\n"
-            doc_text += f"\nCode:\n{code}"
-            if notes:
-                doc_text += f"\n\nNotes:\n{notes}"
-
-            ids.append(example_dir.name)
-            documents.append(doc_text)
-            metadatas.append({
-                "name": name,
-                "tags": json.dumps(tags),
-                "difficulty": meta.get("difficulty", "medium"),
-                "description": description,
-                "code": code,
-                "notes": notes,
-            })
-            count += 1
-
+        embeddings = self._embed(documents)
         # Batch insert
-        if ids:
-            for i in range(0, len(ids), BATCH_SIZE):
-                end = i + BATCH_SIZE
-                collection.add(
-                    ids=ids[i:end],
-                    documents=documents[i:end],
-                    metadatas=metadatas[i:end],
-                )
-
-        return count
+        for i in range(0, len(ids), BATCH_SIZE):
+            end = i + BATCH_SIZE
+            collection.upsert(
+                ids=ids[i:end],
+                embeddings=embeddings[i:end],
+                documents=documents[i:end],
+                metadatas=metadatas[i:end],
+            )
+        for name in changed:
+            known[name] = current[name][1]
+
+        return {"upserted": len(changed), "deleted": len(removed)}
+
+    def _example_record(self, example_dir: Path):
+        """(document text for embedding, metadata) of one example directory."""
+        code_file = example_dir / "example.py"
+        meta_file = example_dir / "meta.json"
+        notes_file = example_dir / "notes.md"
+
+        # Load data
+        code = code_file.read_text(encoding="utf-8", errors="ignore")
+        meta = {}
+        if meta_file.exists():
+            try:
+                meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+
+        notes = ""
+        if notes_file.exists():
+            notes = notes_file.read_text(encoding="utf-8", errors="ignore")
+
+        name = meta.get("name", example_dir.name)
+        tags = meta.get("tags", [])
+        description = meta.get("description", "")
+
+        # Build document text for embedding
+        doc_text = f"Example: {name}\n"
+        if description:
+            doc_text += f"Description: {description}\n"
+        if tags:
+            doc_text += f"Tags: {', '.join(tags)}\n"
+        doc_text += f"\nCode:\n{code}"
+        if notes:
+            doc_text += f"\n\nNotes:\n{notes}"
+
+        metadata = {
+            "name": name,
+            "tags": json.dumps(tags),
+            "difficulty": meta.get("difficulty", "medium"),
+            "description": description,
+            "code": code,
+            "notes": notes,
+            "compact_code": compact_code(code),
+            "compact_notes": compact_notes(notes),
+        }
+        return doc_text, metadata
@@ -0,0 +1,100 @@
+"""
+Offline embedding backend: hashed n-gram features projected to a dense vector.
+
+Each text is split into identifier words (camelCase and snake_case are split),
+word bigrams and character trigrams. Every feature is hashed (crc32, stable
+across processes) into one of LOCAL_HASH_BUCKETS buckets, weighted by
+sublinear term frequency, and projected with a fixed-seed Gaussian matrix to
+LOCAL_EMBEDDING_DIM dimensions. The result is L2-normalized, so cosine
+distance in ChromaDB behaves as with Voyage vectors.
+
+No network, no model download: a query embeds in well under a millisecond.
+Document frequencies are not used, since IDF weights would change (and every
+stored vector with them) whenever the corpus does.
+"""
+import re
+import zlib
+from typing import Callable, List, Optional
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction, Documents, Embeddings
+
+from app.rag import LOCAL_EMBEDDING_DIM
+
+LOCAL_HASH_BUCKETS = 1 << 14
+LOCAL_PROJECTION_SEED = 1234
+
+# Bump when tokenization or weighting changes: the name ends up in the index
+# manifest, so a new version triggers a rebuild
+LOCAL_MODEL_VERSION = 1
+
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# progress(done_texts, total_texts)
+Progress = Callable[[int, int], None]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased identifier words: "MoveToTarget(run_time)" -> move, to, target, run, time."""
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def text_features(text: str) -> List[str]:
+    """Words, word bigrams and character trigrams of each word."""
+    words = tokenize(text)
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"<{word}>"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+class LocalEmbeddingFunction(EmbeddingFunction):
+    """ChromaDB-compatible embedding function that runs entirely in NumPy."""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, buckets: int = LOCAL_HASH_BUCKETS, seed: int = LOCAL_PROJECTION_SEED):
+        self.dim = dim
+        self.buckets = buckets
+        self.model = f"hashed-ngrams-v{LOCAL_MODEL_VERSION}-{buckets}x{dim}-s{seed}"
+        rng = np.random.default_rng(seed)
+        self._projection = (rng.standard_normal((buckets, dim)) / np.sqrt(dim)).astype(np.float32)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.embed_documents(list(input))
+
+    def embed_documents(self, texts: List[str], concurrency: int = 1, progress: Optional[Progress] = None) -> List[List[float]]:
+        """Embed documents (`concurrency` is accepted for interface parity and ignored)."""
+        if not texts:
+            return []
+        matrix = self.embed_matrix(texts)
+        if progress:
+            progress(len(texts), len(texts))
+        return matrix.tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 array of unit vectors."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = text_features(text)
+            if not features:
+                continue
+            hashed = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) for f in features),
+                dtype=np.uint32,
+                count=len(features),
+            ) % self.buckets
+            buckets, counts = np.unique(hashed, return_counts=True)
+            weights = (1.0 + np.log(counts)).astype(np.float32)
+            out[row] = weights @ self._projection[buckets]
+
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_matrix([query])[0].tolist()
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Same as `embed_query`: it is cheap enough to run on the event loop."""
+        return self.embed_query(query)
@@ -1,8 +1,12 @@
 """
 RAG retriever — searches ChromaDB collections for relevant Manim API refs and examples.
 """
+import asyncio
 import json
 import logging
+import threading
+import time
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
 import chromadb
@@ -11,37 +15,88 @@ from app.rag import (
     CHROMA_DB_PATH,
     COLLECTION_MANIM_API,
     COLLECTION_MANIM_EXAMPLES,
-    DEFAULT_TOP_K_API,
+    TOP_K_API_HYBRID,
+    TOP_K_API_VECTOR,
     DEFAULT_TOP_K_EXAMPLES,
+    HYBRID_SEARCH,
+    SNAPSHOT_DTYPE,
+    SNAPSHOT_PATH,
+    VECTOR_BACKEND,
 )
-from app.rag.embeddings import VoyageEmbeddingFunction
-from app.rag.indexer import ManimIndexer
+from app.rag.bm25 import BM25Index, bm25_path, reciprocal_rank_fusion
+from app.rag.embeddings import backend_id, get_embedding_function
+from app.rag.indexer import ManimIndexer, current_source, example_dirs, source_changes, EXAMPLE_FILES
+from app.rag.snapshot import IndexSnapshot, SnapshotError, export_snapshot
+from app.rag.vector_index import NumpyVectorIndex, squared_l2_distances
+from app.metrics import stage
 
 logger = logging.getLogger(__name__)
 
+# How often (seconds) searches check examples/ for added or edited examples
+EXAMPLES_CHECK_INTERVAL = 2.0
+
+# Candidates taken from the vector and the BM25 ranking before fusion
+HYBRID_CANDIDATES = 20
+
+# Exact API chunks sent with a fix: the failing classes plus their bases
+MAX_SYMBOL_REFS = 4
+
+# Base classes that say nothing about the Manim API
+_IGNORED_BASES = {"object", "ABC", "Generic", "Protocol", "Enum"}
+
 
 class RAGRetriever:
     """Main search interface for Manim RAG."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        vector_backend: str = VECTOR_BACKEND,
+        snapshot_path: str = SNAPSHOT_PATH,
+        hybrid: bool = HYBRID_SEARCH,
+    ):
+        self.vector_backend = vector_backend
+        self.snapshot_path = snapshot_path
+        self.hybrid = hybrid
         self._initialized = False
         self._client = None
         self._embedding_fn = None
         self._api_collection = None
         self._examples_collection = None
+        self._api_index = None
+        self._examples_index = None
+        self._api_bm25 = None
+        self._examples_bm25 = None
+        self._indexer = None
+        self._examples_signature = None
+        self._examples_checked = 0.0
+        self._refresh_lock = threading.Lock()
 
-    def initialize(self, rebuild: bool = False) -> Dict[str, int]:
+    def initialize(self, rebuild: bool = False, progress=None) -> Dict[str, int]:
         """
         Initialize the retriever: build or load the index.
 
+        `progress(done, total)` is called while API chunks are embedded.
         Returns counts of indexed items.
+
+        With the "snapshot" vector backend an existing snapshot is only
+        memory-mapped (no ChromaDB, no sync) if it was built from the
+        installed Manim version and the examples on disk; otherwise the index
+        is built and a snapshot is exported for the next start.
         """
-        self._embedding_fn = VoyageEmbeddingFunction()
+        self._embedding_fn = get_embedding_function()
+        if self.vector_backend == "snapshot" and not rebuild and Path(self.snapshot_path).exists():
+            try:
+                return self._load_snapshot()
+            except SnapshotError as e:
+                logger.warning(f"Index snapshot unusable ({e}), building the index")
+
         self._client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
 
-        # Build index if needed
-        indexer = ManimIndexer(embedding_fn=self._embedding_fn)
-        counts = indexer.build_index(rebuild=rebuild)
+        # Build the index, or update it with what changed since the last build
+        self._indexer = ManimIndexer(embedding_fn=self._embedding_fn)
+        counts = self._indexer.build_index(rebuild=rebuild, progress=progress)
+        self._examples_signature = self._examples_mtimes()
+        self._examples_checked = time.monotonic()
 
         # Get collection references
         self._api_collection = self._client.get_collection(
@@ -52,47 +107,333 @@ class RAGRetriever:
             name=COLLECTION_MANIM_EXAMPLES,
             embedding_function=self._embedding_fn,
         )
+        if self.vector_backend in ("numpy", "snapshot"):
+            self._api_index = NumpyVectorIndex.from_collection(self._api_collection)
+            self._examples_index = NumpyVectorIndex.from_collection(self._examples_collection)
+        if self.vector_backend == "snapshot":
+            export_snapshot(
+                {COLLECTION_MANIM_API: self._api_collection, COLLECTION_MANIM_EXAMPLES: self._examples_collection},
+                self.snapshot_path,
+                dtype=SNAPSHOT_DTYPE,
+                embedding_backend=backend_id(self._embedding_fn),
+                source=current_source(),
+            )
+        self._load_bm25()
 
         self._initialized = True
         logger.info("RAG retriever initialized")
         return counts
 
+    def _load_snapshot(self) -> Dict[str, Any]:
+        """
+        Serve searches from the memory-mapped snapshot. Its content is frozen:
+        it is checked against the installed Manim and examples/ only here,
+        at startup, and examples are not re-synced while serving.
+        """
+        snapshot = IndexSnapshot(self.snapshot_path)
+        if snapshot.embedding_backend != backend_id(self._embedding_fn):
+            raise SnapshotError(
+                f"snapshot vectors come from {snapshot.embedding_backend}, "
+                f"queries from {backend_id(self._embedding_fn)}"
+            )
+        if not snapshot.source:
+            logger.warning(f"Snapshot {self.snapshot_path} does not record its source, serving it unchecked")
+        else:
+            changes = source_changes(snapshot.source, current_source())
+            if changes:
+                raise SnapshotError(f"snapshot is stale ({'; '.join(changes)})")
+        self._api_index = snapshot.index(COLLECTION_MANIM_API)
+        self._examples_index = snapshot.index(COLLECTION_MANIM_EXAMPLES)
+        if self.hybrid:
+            self._api_bm25 = snapshot.bm25(COLLECTION_MANIM_API)
+            self._examples_bm25 = snapshot.bm25(COLLECTION_MANIM_EXAMPLES)
+            missing = [
+                name for name, bm25 in
+                ((COLLECTION_MANIM_API, self._api_bm25), (COLLECTION_MANIM_EXAMPLES, self._examples_bm25))
+                if bm25 is None
+            ]
+            if missing:
+                self._load_bm25(missing)
+        self._initialized = True
+        logger.info(f"RAG retriever initialized from snapshot {self.snapshot_path}")
+        return {
+            "api_chunks": len(self._api_index),
+            "examples": len(self._examples_index),
+            "snapshot": str(self.snapshot_path),
+        }
+
+    def _load_bm25(self, names=(COLLECTION_MANIM_API, COLLECTION_MANIM_EXAMPLES)):
+        """
+        Load the BM25 indexes written by the indexer. Without one (a snapshot
+        from before BM25 was stored in it, copied to another node), build it
+        from the vector index records.
+        """
+        if not self.hybrid:
+            return
+        for name in names:
+            index = self._api_index if name == COLLECTION_MANIM_API else self._examples_index
+            path = bm25_path(name)
+            if path.exists():
+                bm25 = BM25Index.load(path)
+            elif index is not None:
+                bm25 = BM25Index.build(index.ids, [index.record(row)[1] for row in range(len(index))])
+            else:
+                logger.warning(f"No BM25 index for {name}, keyword matching disabled")
+                bm25 = None
+            if name == COLLECTION_MANIM_API:
+                self._api_bm25 = bm25
+            else:
+                self._examples_bm25 = bm25
+
     @property
     def is_ready(self) -> bool:
         return self._initialized
 
+    def refresh_examples(self, force: bool = False) -> bool:
+        """
+        Index examples added, edited or removed since the last check.
+
+        Only stats example files (at most every EXAMPLES_CHECK_INTERVAL
+        seconds) unless their mtimes changed. Returns True if the index changed.
+        """
+        if not self._initialized or self._indexer is None:
+            return False  # Serving a snapshot: frozen, checked only at startup
+        now = time.monotonic()
+        if not force and now - self._examples_checked < EXAMPLES_CHECK_INTERVAL:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False  # Another request is already syncing
+        try:
+            self._examples_checked = now
+            signature = self._examples_mtimes()
+            if signature == self._examples_signature:
+                return False
+            changes = self._indexer.sync_examples()
+            self._examples_signature = signature
+            if self._examples_index is not None and (changes["upserted"] or changes["deleted"]):
+                self._examples_index = NumpyVectorIndex.from_collection(self._examples_collection)
+            if changes["upserted"] or changes["deleted"]:
+                self._load_bm25([COLLECTION_MANIM_EXAMPLES])
+            logger.info(f"Examples re-indexed: {changes}")
+            return bool(changes["upserted"] or changes["deleted"])
+        finally:
+            self._refresh_lock.release()
+
+    def _examples_mtimes(self):
+        """Cheap fingerprint of examples/: directory names and file mtimes."""
+        return tuple(
+            (d.name, name, (d / name).stat().st_mtime_ns)
+            for d in example_dirs()
+            for name in EXAMPLE_FILES
+            if (d / name).exists()
+        )
+
     def search(
         self,
         query: str,
-        top_k_api: int = DEFAULT_TOP_K_API,
+        top_k_api: Optional[int] = None,
         top_k_examples: int = DEFAULT_TOP_K_EXAMPLES,
     ) -> Dict[str, Any]:
         """
         Search both collections for relevant results.
 
+        `top_k_api` defaults to fewer chunks with hybrid search, which finds
+        exact identifier hits, than with vector search alone.
+
         Returns:
             {
-                "api_refs": [{"name", "module", "content", "score"}, ...],
-                "examples": [{"id", "name", "code", "notes", "tags", "score"}, ...],
+                "api_refs": [{"name", "module", "content", "score", "rrf"}, ...],
+                "examples": [{"id", "name", "code", "notes", "tags", "score", "rrf"}, ...],
             }
+
+        "score" is the vector similarity; "rrf" (hybrid search only) is the
+        fused rank score the results are ordered by.
         """
         if not self._initialized:
             raise RuntimeError("RAG retriever not initialized. Call initialize() first.")
+        top_k_api = top_k_api or self._default_top_k_api()
 
-        api_refs = self._search_api(query, top_k_api)
-        examples = self._search_examples(query, top_k_examples)
+        # One query embedding shared by both collections
+        embedding = self._embedding_fn.embed_query(query)
+        api_refs = self._search_api(embedding, top_k_api, query)
+        examples = self._search_examples(embedding, top_k_examples, query)
 
         return {
             "api_refs": api_refs,
             "examples": examples,
         }
 
-    def _search_api(self, query: str, top_k: int) -> List[Dict[str, Any]]:
-        """Search the Manim API collection."""
+    async def asearch(
+        self,
+        query: str,
+        top_k_api: Optional[int] = None,
+        top_k_examples: int = DEFAULT_TOP_K_EXAMPLES,
+    ) -> Dict[str, Any]:
+        """
+        `search` without blocking the event loop: the query is embedded over
+        Voyage's async client and both collections are queried concurrently
+        in worker threads (or inline, from the in-memory index). Timed as
+        stages "retrieval.embed" and "retrieval.query".
+        """
+        if not self._initialized:
+            raise RuntimeError("RAG retriever not initialized. Call initialize() first.")
+        top_k_api = top_k_api or self._default_top_k_api()
+
+        with stage("retrieval.embed"):
+            embedding = await self._embedding_fn.aembed_query(query)
+        with stage("retrieval.query"):
+            if self._api_index is not None and self._examples_index is not None:
+                # In-memory searches take microseconds: a thread hop would cost more
+                api_refs = self._search_api(embedding, top_k_api, query)
+                examples = self._search_examples(embedding, top_k_examples, query)
+            else:
+                api_refs, examples = await asyncio.gather(
+                    asyncio.to_thread(self._search_api, embedding, top_k_api, query),
+                    asyncio.to_thread(self._search_examples, embedding, top_k_examples, query),
+                )
+
+        return {
+            "api_refs": api_refs,
+            "examples": examples,
+        }
+
+    def _default_top_k_api(self) -> int:
+        return TOP_K_API_HYBRID if self.hybrid else TOP_K_API_VECTOR
+
+    def lookup_symbols(self, names: List[str], max_refs: int = MAX_SYMBOL_REFS) -> List[Dict[str, Any]]:
+        """
+        Fetch the exact API chunks of the named classes, followed by their
+        base classes, breadth first, up to `max_refs` chunks.
+
+        Used by the fix path, where the traceback names the symbol and a
+        similarity search would only guess.
+        """
+        if not self._initialized:
+            raise RuntimeError("RAG retriever not initialized. Call initialize() first.")
+
+        refs = []
+        seen = set()
+        queue = list(names)
+        while queue and len(refs) < max_refs:
+            name = queue.pop(0)
+            if name in seen or name in _IGNORED_BASES:
+                continue
+            seen.add(name)
+
+            ref = self._get_class_chunk(name)
+            if ref is None:
+                continue
+            refs.append(ref)
+            for base in ref["bases"]:
+                if "[" not in base:
+                    queue.append(base.rsplit(".", 1)[-1])
+
+        return refs
+
+    def _get_class_chunk(self, name: str) -> Optional[Dict[str, Any]]:
+        """The class chunk called `name`; the shortest module path wins on duplicates."""
+        if self._api_index is not None:
+            records = [self._api_index.record(row) for row in self._api_index.class_rows(name)]
+        else:
+            try:
+                results = self._api_collection.get(
+                    where={"$and": [{"name": name}, {"type": "class"}]},
+                    include=["documents", "metadatas"],
+                )
+            except Exception as e:
+                logger.error(f"API lookup of {name} failed: {e}")
+                return None
+            records = list(zip(results["ids"], results["documents"], results["metadatas"])) if results else []
+
+        if not records:
+            return None
+
+        doc_id, document, metadata = min(records, key=lambda r: len(r[0]))
+        metadata = metadata or {}
+        try:
+            bases = json.loads(metadata.get("bases") or "[]")
+        except (json.JSONDecodeError, TypeError):
+            bases = []
+
+        return {
+            "id": doc_id,
+            "name": metadata.get("name", name),
+            "module": metadata.get("module", ""),
+            "type": "class",
+            "content": document,
+            "compact": metadata.get("compact", ""),
+            "bases": bases,
+            "score": 1.0,
+        }
+
+    def _query(self, collection, index: Optional[NumpyVectorIndex], embedding: List[float], top_k: int) -> Dict[str, Any]:
+        """Nearest records, from the in-memory index when loaded, else from ChromaDB."""
+        if index is not None:
+            return index.query(embedding, n_results=top_k)
+        return collection.query(query_embeddings=[embedding], n_results=top_k)
+
+    def _hybrid_query(
+        self,
+        collection,
+        index: Optional[NumpyVectorIndex],
+        bm25: Optional[BM25Index],
+        embedding: List[float],
+        query: str,
+        top_k: int,
+    ) -> Dict[str, Any]:
+        """
+        Vector results fused with BM25 keyword hits by reciprocal rank, in the
+        shape of ChromaDB query results plus "rrf", the fused score per result.
+        Distances stay vector distances, so scores keep their meaning; results
+        are ordered by "rrf". Without a BM25 index the vector ranking alone is
+        fused, so "rrf" stays comparable across collections.
+        """
+        if not (self.hybrid and query):
+            return self._query(collection, index, embedding, top_k)
+
+        pool = max(top_k, HYBRID_CANDIDATES) if bm25 is not None else top_k
+        vector = self._query(collection, index, embedding, pool)
+        rankings = [vector["ids"][0]]
+        if bm25 is not None:
+            rankings.append([doc_id for doc_id, _ in bm25.search(query, pool)])
+        fused_scores = dict(reciprocal_rank_fusion(rankings)[:top_k])
+        fused = list(fused_scores)
+
+        records = {
+            doc_id: (vector["distances"][0][i], vector["documents"][0][i], vector["metadatas"][0][i])
+            for i, doc_id in enumerate(vector["ids"][0])
+        }
+        missing = [doc_id for doc_id in fused if doc_id not in records]
+        if missing:
+            extra = self._get_records(collection, index, missing, embedding)
+            records.update(zip(extra["ids"], zip(extra["distances"], extra["documents"], extra["metadatas"])))
+
+        fused = [doc_id for doc_id in fused if doc_id in records]
+        return {
+            "ids": [fused],
+            "distances": [[records[doc_id][0] for doc_id in fused]],
+            "documents": [[records[doc_id][1] for doc_id in fused]],
+            "metadatas": [[records[doc_id][2] for doc_id in fused]],
+            "rrf": [[fused_scores[doc_id] for doc_id in fused]],
+        }
+
+    def _get_records(self, collection, index: Optional[NumpyVectorIndex], ids: List[str], embedding: List[float]) -> Dict[str, list]:
+        """Records of `ids` with their vector distance to `embedding`."""
+        if index is not None:
+            return index.get(ids, embedding)
+        results = collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        return {
+            "ids": results["ids"],
+            "distances": squared_l2_distances(results["embeddings"], embedding).tolist(),
+            "documents": results["documents"],
+            "metadatas": results["metadatas"],
+        }
+
+    def _search_api(self, embedding: List[float], top_k: int, query: str = "") -> List[Dict[str, Any]]:
+        """Search the Manim API collection (hybrid with BM25 when `query` is given)."""
         try:
-            results = self._api_collection.query(
-                query_texts=[query],
-                n_results=top_k,
+            results = self._hybrid_query(
+                self._api_collection, self._api_index, self._api_bm25, embedding, query, top_k
             )
         except Exception as e:
             logger.error(f"API search failed: {e}")
@@ -105,23 +446,26 @@ class RAGRetriever:
                 metadata = results["metadatas"][0][i] if results.get("metadatas") else {}
                 document = results["documents"][0][i] if results.get("documents") else ""
 
-                refs.append({
+                ref = {
                     "id": doc_id,
                     "name": metadata.get("name", ""),
                     "module": metadata.get("module", ""),
                     "type": metadata.get("type", ""),
                     "content": document,
+                    "compact": metadata.get("compact", ""),
                     "score": 1.0 - distance,  # Convert distance to similarity
-                })
+                }
+                if results.get("rrf"):
+                    ref["rrf"] = results["rrf"][0][i]
+                refs.append(ref)
 
         return refs
 
-    def _search_examples(self, query: str, top_k: int) -> List[Dict[str, Any]]:
-        """Search the curated examples collection."""
+    def _search_examples(self, embedding: List[float], top_k: int, query: str = "") -> List[Dict[str, Any]]:
+        """Search the curated examples collection (hybrid with BM25 when `query` is given)."""
         try:
-            results = self._examples_collection.query(
-                query_texts=[query],
-                n_results=top_k,
+            results = self._hybrid_query(
+                self._examples_collection, self._examples_index, self._examples_bm25, embedding, query, top_k
             )
         except Exception as e:
             logger.error(f"Examples search failed: {e}")
@@ -140,14 +484,19 @@ class RAGRetriever:
                     except (json.JSONDecodeError, TypeError):
                         pass
 
-                examples.append({
+                example = {
                     "id": doc_id,
                     "name": metadata.get("name", doc_id),
                     "code": metadata.get("code", ""),
                     "notes": metadata.get("notes", ""),
+                    "compact_code": metadata.get("compact_code", ""),
+                    "compact_notes": metadata.get("compact_notes", ""),
                     "tags": tags,
                     "description": metadata.get("description", ""),
                     "score": 1.0 - distance,
-                })
+                }
+                if results.get("rrf"):
+                    example["rrf"] = results["rrf"][0][i]
+                examples.append(example)
 
         return examples
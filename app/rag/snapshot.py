@@ -0,0 +1,271 @@
+"""
+Single-file, memory-mappable snapshot of the RAG index.
+
+Layout (all integers little-endian, sections 64-byte aligned):
+
+    magic "MRAGSNP1" | uint64 header length | JSON header | sections...
+
+The header records the snapshot version, the quantization dtype, the
+embedding backend the vectors came from, the index source (Manim version and
+example hashes, see `app.rag.indexer.index_source`) and, per collection, the
+row count, dimension and the offset of each section:
+
+    vectors   count x dim, int8 (with per-row float32 scales) or float16
+    scales    count float32 (int8 only)
+    offsets   count + 1 int64, record boundaries in the records blob
+    records   JSON [id, document, metadata] per row, UTF-8, concatenated
+    ids       JSON list of the row ids
+
+and the collection's BM25 index over the same rows (see `app.rag.bm25`):
+
+    bm25_lengths   count float32, tokens per document
+    bm25_offsets   terms + 1 int64, posting list boundaries
+    bm25_rows      int32 row of each posting
+    bm25_tfs       float32 term frequency of each posting
+    bm25_terms     JSON list of the terms
+
+plus, for the API collection, the rows of each class chunk by name (used by
+`RAGRetriever.lookup_symbols`).
+
+Readers `np.memmap` the file, so every uvicorn worker shares one page-cached
+copy: opening a snapshot parses only the header, and a record is decoded
+only when it is returned by a search. Keyword search needs only the ids and
+terms decoded; postings stay memory-mapped.
+"""
+import json
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.rag.bm25 import BM25Index
+from app.rag.vector_index import NumpyVectorIndex
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"MRAGSNP1"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DTYPES = ("int8", "float16")
+SECTION_ALIGNMENT = 64
+
+# Rows dequantized per step while scoring, to bound the float32 scratch memory
+SCORE_BLOCK_ROWS = 4096
+
+
+class SnapshotError(Exception):
+    """The file is not a readable snapshot."""
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(quantized rows, per-row scales); scales are None for float16."""
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales
+    raise ValueError(f"Unknown snapshot dtype {dtype!r} (expected one of {SNAPSHOT_DTYPES})")
+
+
+def write_snapshot(
+    path,
+    indexes: Dict[str, NumpyVectorIndex],
+    dtype: str = "int8",
+    embedding_backend: str = "",
+    source: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Write `indexes` (collection name -> index) to `path` atomically. Returns the header."""
+    sections = []  # (collection, section name, bytes)
+    collections = {}
+    for name, index in indexes.items():
+        vectors, scales = quantize(index.matrix, dtype)
+        rows = [index.record(row) for row in range(len(index))]
+        records = [_json_bytes(list(record)) for record in rows]
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in records], out=offsets[1:])
+
+        collections[name] = {"count": len(index), "dim": int(index.matrix.shape[1])}
+        classes = {}
+        for row, metadata in enumerate(index.metadatas):
+            if metadata.get("type") == "class":
+                classes.setdefault(metadata.get("name"), []).append(row)
+        if classes:
+            collections[name]["classes"] = classes
+        sections.append((name, "vectors", vectors.tobytes()))
+        if scales is not None:
+            sections.append((name, "scales", scales.astype("<f4").tobytes()))
+        sections.append((name, "offsets", offsets.astype("<i8").tobytes()))
+        sections.append((name, "records", b"".join(records)))
+        sections.append((name, "ids", _json_bytes([record[0] for record in rows])))
+
+        bm25 = BM25Index.build([record[0] for record in rows], [record[1] for record in rows])
+        sections.append((name, "bm25_lengths", bm25.lengths.astype("<f4").tobytes()))
+        sections.append((name, "bm25_offsets", bm25.offsets.astype("<i8").tobytes()))
+        sections.append((name, "bm25_rows", bm25.rows.astype("<i4").tobytes()))
+        sections.append((name, "bm25_tfs", bm25.tfs.astype("<f4").tobytes()))
+        sections.append((name, "bm25_terms", _json_bytes(bm25.terms)))
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "dtype": dtype,
+        "embedding_backend": embedding_backend,
+        "source": source or {},
+        "collections": collections,
+    }
+
+    # Section offsets depend on the header length, which depends on the
+    # offsets: grow the space reserved for the header until it fits
+    prefix = len(SNAPSHOT_MAGIC) + 8
+    header_size = 0
+    while True:
+        position = header_size
+        for name, section, data in sections:
+            collections[name][section] = [position, len(data)]
+            position = _align(position + len(data))
+        header_bytes = json.dumps(header).encode("utf-8")
+        if prefix + len(header_bytes) <= header_size:
+            break
+        header_size = _align(prefix + len(header_bytes))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for name, section, data in sections:
+            f.seek(collections[name][section][0])
+            f.write(data)
+        f.truncate(position)
+    tmp.replace(path)
+    logger.info(f"Wrote index snapshot {path} ({position / 1e6:.1f} MB, {dtype})")
+    return header
+
+
+def export_snapshot(
+    collections: Dict[str, Any],
+    path,
+    dtype: str = "int8",
+    embedding_backend: str = "",
+    source: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Snapshot ChromaDB collections (name -> collection)."""
+    indexes = {name: NumpyVectorIndex.from_collection(c) for name, c in collections.items()}
+    return write_snapshot(path, indexes, dtype=dtype, embedding_backend=embedding_backend, source=source)
+
+
+def _align(position: int) -> int:
+    return -(-position // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def _json_bytes(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class IndexSnapshot:
+    """A memory-mapped snapshot file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self._buffer = np.memmap(self.path, dtype=np.uint8, mode="r")
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot open snapshot {self.path}: {e}")
+
+        prefix = len(SNAPSHOT_MAGIC) + 8
+        if len(self._buffer) < prefix or bytes(self._buffer[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{self.path} is not an index snapshot")
+        (header_length,) = struct.unpack("<Q", bytes(self._buffer[len(SNAPSHOT_MAGIC):prefix]))
+        try:
+            self.header = json.loads(bytes(self._buffer[prefix:prefix + header_length]))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise SnapshotError(f"Corrupt snapshot header in {self.path}: {e}")
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {self.header.get('version')}")
+
+    @property
+    def embedding_backend(self) -> str:
+        return self.header.get("embedding_backend", "")
+
+    @property
+    def source(self) -> Dict[str, Any]:
+        """Manim version and example hashes the index was built from ({} if not recorded)."""
+        return self.header.get("source", {})
+
+    @property
+    def collections(self) -> List[str]:
+        return list(self.header["collections"])
+
+    def index(self, name: str) -> "SnapshotVectorIndex":
+        if name not in self.header["collections"]:
+            raise SnapshotError(f"Snapshot {self.path} has no collection {name!r}")
+        return SnapshotVectorIndex(self, self.header["collections"][name])
+
+    def bm25(self, name: str) -> Optional[BM25Index]:
+        """BM25 index of a collection over its memory-mapped postings; None if not stored."""
+        spec = self.header["collections"].get(name, {})
+        if "bm25_rows" not in spec:
+            return None
+        return BM25Index(
+            self.json_section(spec["ids"]),
+            self.section(spec["bm25_lengths"], "<f4"),
+            self.json_section(spec["bm25_terms"]),
+            self.section(spec["bm25_offsets"], "<i8"),
+            self.section(spec["bm25_rows"], "<i4"),
+            self.section(spec["bm25_tfs"], "<f4"),
+        )
+
+    def section(self, spec: List[int], dtype) -> np.ndarray:
+        start, length = spec
+        if start + length > len(self._buffer):
+            raise SnapshotError(f"Truncated snapshot {self.path}")
+        return self._buffer[start:start + length].view(dtype)
+
+    def json_section(self, spec: List[int]) -> Any:
+        return json.loads(bytes(self.section(spec, np.uint8)))
+
+
+class SnapshotVectorIndex(NumpyVectorIndex):
+    """`NumpyVectorIndex` over one collection of a memory-mapped snapshot."""
+
+    def __init__(self, snapshot: IndexSnapshot, spec: Dict[str, Any]):
+        count, dim = spec["count"], spec["dim"]
+        dtype = snapshot.header["dtype"]
+        self.matrix = snapshot.section(spec["vectors"], np.int8 if dtype == "int8" else "<f2").reshape(count, dim)
+        self.scales = snapshot.section(spec["scales"], "<f4") if dtype == "int8" else None
+        self._offsets = snapshot.section(spec["offsets"], "<i8")
+        self._records = snapshot.section(spec["records"], np.uint8)
+        self._classes = spec.get("classes", {})
+        self._rows = None
+        self._ids = None
+        self._snapshot = snapshot
+        self._ids_spec = spec.get("ids")
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    @property
+    def ids(self) -> List[str]:
+        """Decoded on first use (id lookups for keyword hits)."""
+        if self._ids is None:
+            if self._ids_spec is not None:
+                self._ids = self._snapshot.json_section(self._ids_spec)
+            else:
+                self._ids = [self.record(row)[0] for row in range(len(self))]
+        return self._ids
+
+    def record(self, row: int) -> Tuple[str, str, Dict[str, Any]]:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        doc_id, document, metadata = json.loads(bytes(self._records[start:end]))
+        return doc_id, document, metadata
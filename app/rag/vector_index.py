@@ -0,0 +1,131 @@
+"""
+In-process vector index over a ChromaDB collection.
+
+The corpus is small (a few thousand API chunks, a few dozen examples), so a
+brute-force matrix-vector product over a contiguous float32 matrix beats
+ChromaDB's HNSW plus SQLite metadata hydration by orders of magnitude.
+ChromaDB stays the persistence layer: the index is loaded from a collection
+and reloaded after the collection changes.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def squared_l2_distances(vectors, embedding: List[float]) -> np.ndarray:
+    """ChromaDB's default distance between the normalized rows and query."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, len(embedding))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    return 2.0 - 2.0 * (vectors @ query)
+
+
+class NumpyVectorIndex:
+    """
+    Row-normalized embedding matrix with ids, documents and metadatas in
+    parallel lists.
+
+    `query` returns results shaped like `collection.query(...)`, with
+    distances in ChromaDB's default space (squared L2, i.e. 2 - 2*cosine for
+    unit vectors), so scores computed as 1 - distance match the ChromaDB path.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        embeddings,
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ):
+        self.ids = list(ids)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(self.ids), -1) if self.ids else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(matrix / np.where(norms > 0, norms, 1.0))
+        self.documents = list(documents) if documents is not None else [""] * len(self.ids)
+        self.metadatas = [m or {} for m in metadatas] if metadatas is not None else [{} for _ in self.ids]
+        self._classes = None
+        self._rows = None
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyVectorIndex":
+        """Load every record of a ChromaDB collection."""
+        results = collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = results.get("embeddings")
+        if embeddings is None:
+            embeddings = []
+        index = cls(results["ids"], embeddings, results.get("documents"), results.get("metadatas"))
+        logger.info(f"Loaded {len(index)} vectors from {collection.name} ({index.matrix.nbytes / 1e6:.1f} MB)")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def top_k(self, embedding: List[float], k: int):
+        """(row indices, cosine similarities) of the k nearest rows, best first."""
+        if len(self) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = self._scores(query)
+        k = min(k, len(scores))
+        if k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row with the unit vector `query`."""
+        return self.matrix @ query
+
+    def record(self, row: int) -> Tuple[str, str, Dict[str, Any]]:
+        """(id, document, metadata) of one row."""
+        return self.ids[row], self.documents[row], self.metadatas[row]
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return self._rows.get(doc_id)
+
+    def get(self, ids: Sequence[str], embedding: List[float]) -> Dict[str, list]:
+        """Records of `ids` (unknown ids skipped) with their distance to `embedding`."""
+        rows = [row for row in (self.row_of(i) for i in ids) if row is not None]
+        records = [self.record(r) for r in rows]
+        # Rows are normalized again, so quantization scales do not matter here
+        distances = squared_l2_distances(self.matrix[rows], embedding) if rows else np.zeros(0)
+        return {
+            "ids": [r[0] for r in records],
+            "distances": distances.tolist(),
+            "documents": [r[1] for r in records],
+            "metadatas": [r[2] for r in records],
+        }
+
+    def class_rows(self, name: str) -> List[int]:
+        """Rows of the class chunks called `name` (API collection)."""
+        if self._classes is None:
+            classes = {}
+            for row, metadata in enumerate(self.metadatas):
+                if metadata.get("type") == "class":
+                    classes.setdefault(metadata.get("name"), []).append(row)
+            self._classes = classes
+        return self._classes.get(name, [])
+
+    def query(self, embedding: List[float], n_results: int) -> Dict[str, List[list]]:
+        """Nearest records of `embedding`, in the shape of ChromaDB query results."""
+        rows, scores = self.top_k(embedding, n_results)
+        records = [self.record(r) for r in rows]
+        return {
+            "ids": [[r[0] for r in records]],
+            "distances": [(2.0 - 2.0 * scores).tolist()],
+            "documents": [[r[1] for r in records]],
+            "metadatas": [[r[2] for r in records]],
+        }
@@ -1,13 +1,97 @@
 """
 Direct Manim rendering (programmatic, no subprocess).
+
+Parts of a multi-scene video render in parallel through
+`python -m app.renderer <scene.py> <media_dir>`, one process each.
 """
+import asyncio
+import os
+import re
 import sys
 import time
 import shutil
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import importlib.util
 
+from app.metrics import stage
+
+RENDER_TIMEOUT = float(os.getenv("MANIM_RENDER_TIMEOUT", "300"))
+# Isolated renders running at once (each is a full Python + Manim process)
+RENDER_WORKERS = int(os.getenv("MANIM_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def render_scene_file(scene_path: Path, scene_class_name: str, media_dir: Path, use_cache: bool = False) -> Optional[Path]:
+    """Render `scene_class_name` from `scene_path` in this process; return the video path."""
+    import imageio_ffmpeg
+    from manim import tempconfig
+
+    ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+    print(f"Using ffmpeg: {ffmpeg_path}")
+
+    # Load the scene module
+    spec = importlib.util.spec_from_file_location("generated_scene", scene_path)
+    scene_module = importlib.util.module_from_spec(spec)
+    sys.modules["generated_scene"] = scene_module
+    try:
+        spec.loader.exec_module(scene_module)
+
+        # Get the scene class
+        scene_class = getattr(scene_module, scene_class_name)
+
+        # Render with configuration
+        with tempconfig({
+            "ffmpeg_executable": ffmpeg_path,
+            "quality": "medium_quality",
+            "disable_caching": not use_cache,
+            "output_file": "output",
+            "media_dir": str(media_dir)
+        }):
+            scene = scene_class()
+            _time_movie_encoding(scene)
+            scene.render()
+    finally:
+        # Cleanup
+        sys.modules.pop("generated_scene", None)
+
+    print("Rendering complete")
+
+    # Find the generated video (newest, in case the media dir is reused)
+    output_video = None
+    for video_file in media_dir.rglob("*.mp4"):
+        # Skip partial movie files
+        if "partial_movie_files" in str(video_file):
+            continue
+        if output_video is None or video_file.stat().st_mtime > output_video.stat().st_mtime:
+            output_video = video_file
+    return output_video
+
+
+def _time_movie_encoding(scene):
+    """
+    Time the final encode (partial movies combined into the video) as stage
+    "render.encode". Frames are piped to the encoder while they are drawn,
+    so that part stays in "render".
+    """
+    file_writer = getattr(scene.renderer, "file_writer", None)
+    if file_writer is None:
+        return
+    finish = file_writer.finish
+
+    def timed_finish(*args, **kwargs):
+        with stage("render.encode"):
+            return finish(*args, **kwargs)
+
+    file_writer.finish = timed_finish
+
+
+def extract_scene_class(code: str) -> Optional[str]:
+    """Extract the Scene class name from code."""
+    match = re.search(r'class\s+(\w+)\s*\(\s*Scene\s*\)', code)
+    if match:
+        return match.group(1)
+    return None
+
 
 class ManimRenderer:
     """Renders Manim scenes programmatically."""
@@ -16,6 +100,7 @@ class ManimRenderer:
         self.base_dir = Path(__file__).parent.parent
         self.generated_dir = self.base_dir / "generated"
         self.generated_dir.mkdir(exist_ok=True)
+        self._render_slots = asyncio.Semaphore(RENDER_WORKERS)
 
         # Configure Manim to use imageio-ffmpeg
         try:
@@ -26,9 +111,17 @@ class ManimRenderer:
         except Exception as e:
             print(f"Warning: Could not configure ffmpeg: {e}")
 
-    async def render(self, scene_path: Path) -> Dict[str, Any]:
+    async def render(self, scene_path: Path, media_dir: Path = None, use_cache: bool = False, isolated: bool = False) -> Dict[str, Any]:
         """
         Render a Manim scene programmatically.
+
+        By default media goes to generated/media, wiped before each render.
+        With `use_cache`, `media_dir` is kept between renders and Manim's
+        partial-movie cache is on, so animations that did not change since
+        the last render of that directory are reused instead of re-rendered.
+
+        With `isolated`, the scene renders in its own process and the video
+        is left in `media_dir` (for parts rendered in parallel and stitched).
         """
         try:
             if not scene_path.exists():
@@ -48,49 +141,20 @@ class ManimRenderer:
                 }
 
             # Prepare output directory
-            media_dir = self.generated_dir / "media"
-            self._safe_remove_tree(media_dir)
-            media_dir.mkdir(exist_ok=True)
+            if media_dir is None:
+                media_dir = self.generated_dir / "media"
+            if not use_cache:
+                self._safe_remove_tree(media_dir)
+            media_dir.mkdir(parents=True, exist_ok=True)
+
+            if isolated:
+                return await self._render_subprocess(scene_path, media_dir, use_cache)
 
             print(f"\nRendering scene: {scene_class_name}")
 
             # Import and render
             try:
-                import imageio_ffmpeg
-                from manim import config, tempconfig
-
-                ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-                print(f"Using ffmpeg: {ffmpeg_path}")
-
-                # Load the scene module
-                spec = importlib.util.spec_from_file_location("generated_scene", scene_path)
-                scene_module = importlib.util.module_from_spec(spec)
-                sys.modules["generated_scene"] = scene_module
-                spec.loader.exec_module(scene_module)
-
-                # Get the scene class
-                scene_class = getattr(scene_module, scene_class_name)
-
-                # Render with configuration
-                with tempconfig({
-                    "ffmpeg_executable": ffmpeg_path,
-                    "quality": "medium_quality",
-                    "disable_caching": True,
-                    "output_file": "output",
-                    "media_dir": str(media_dir)
-                }):
-                    scene = scene_class()
-                    scene.render()
-
-                print("Rendering complete")
-
-                # Find the generated video
-                output_video = None
-                for video_file in media_dir.rglob("*.mp4"):
-                    # Skip partial movie files
-                    if "partial_movie_files" not in str(video_file):
-                        output_video = video_file
-                        break
+                output_video = render_scene_file(scene_path, scene_class_name, media_dir, use_cache)
 
                 if not output_video or not output_video.exists():
                     return {
@@ -108,10 +172,6 @@ class ManimRenderer:
 
                 print(f"Video saved: {latest_video}")
 
-                # Cleanup
-                if "generated_scene" in sys.modules:
-                    del sys.modules["generated_scene"]
-
                 return {
                     "status": "success",
                     "video_path": latest_video
@@ -131,6 +191,92 @@ class ManimRenderer:
                 "error": f"Error: {str(e)}"
             }
 
+    async def _render_subprocess(self, scene_path: Path, media_dir: Path, use_cache: bool) -> Dict[str, Any]:
+        """
+        Render in a separate Python process.
+
+        Manim's config is process-global, so concurrent renders each need
+        their own process. The video stays in `media_dir`; latest.mp4 is not
+        touched.
+        """
+        args = [sys.executable, "-m", "app.renderer", str(scene_path), str(media_dir)]
+        if use_cache:
+            args.append("--use-cache")
+
+        async with self._render_slots:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=str(self.base_dir),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=RENDER_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return {
+                    "status": "error",
+                    "error": f"Rendering error: render timed out after {RENDER_TIMEOUT:.0f}s"
+                }
+
+        lines = stdout.decode("utf-8", errors="replace").strip().splitlines()
+        if process.returncode == 0 and lines:
+            video_path = Path(lines[-1])
+            if video_path.exists():
+                return {"status": "success", "video_path": video_path}
+
+        return {
+            "status": "error",
+            "error": f"Rendering error:\n\n{stderr.decode('utf-8', errors='replace')[-8000:]}"
+        }
+
+    async def stitch(self, videos: List[Path], output: Path = None) -> Dict[str, Any]:
+        """
+        Concatenate rendered parts in order into one video (latest.mp4 by default).
+
+        Parts rendered at the same quality share codec settings, so the
+        ffmpeg concat demuxer joins them without re-encoding.
+        """
+        output = output or self.generated_dir / "latest.mp4"
+        list_file = output.with_suffix(".concat.txt")
+        list_file.write_text(
+            "".join(f"file '{Path(v).resolve().as_posix()}'\n" for v in videos),
+            encoding="utf-8",
+        )
+
+        try:
+            import imageio_ffmpeg
+            tmp_output = output.with_suffix(".tmp.mp4")
+            process = await asyncio.create_subprocess_exec(
+                imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", str(list_file),
+                "-c", "copy", str(tmp_output),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                return {
+                    "status": "error",
+                    "error": f"Stitching failed: {stderr.decode('utf-8', errors='replace')[-2000:]}"
+                }
+            if not self._safe_copy(tmp_output, output):
+                return {
+                    "status": "error",
+                    "error": "Failed to copy video file"
+                }
+            tmp_output.unlink()
+            return {"status": "success", "video_path": output}
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": f"Stitching failed: {str(e)}"
+            }
+        finally:
+            list_file.unlink(missing_ok=True)
+
     def _safe_remove_tree(self, path: Path, max_retries: int = 3) -> bool:
         """Safely remove directory tree, handling Windows file locks."""
         for attempt in range(max_retries):
@@ -172,8 +318,24 @@ class ManimRenderer:
 
     def _extract_scene_class(self, code: str) -> str:
         """Extract the Scene class name from code."""
-        import re
-        match = re.search(r'class\s+(\w+)\s*\(\s*Scene\s*\)', code)
-        if match:
-            return match.group(1)
-        return None
+        return extract_scene_class(code)
+
+
+if __name__ == "__main__":
+    # Worker entry point for isolated renders: prints the video path last
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render one scene file")
+    parser.add_argument("scene_path", type=Path)
+    parser.add_argument("media_dir", type=Path)
+    parser.add_argument("--use-cache", action="store_true")
+    args = parser.parse_args()
+
+    class_name = extract_scene_class(args.scene_path.read_text())
+    if not class_name:
+        sys.exit("Could not find Scene class in code")
+    args.media_dir.mkdir(parents=True, exist_ok=True)
+    video = render_scene_file(args.scene_path, class_name, args.media_dir, args.use_cache)
+    if not video:
+        sys.exit("Video file not found after rendering")
+    print(video.resolve())
@@ -0,0 +1,109 @@
+"""
+Retrieval results cached by prompt text, so type-ahead lookups from the UI
+(`/retrieve`) leave the submit path with nothing to compute.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+DEFAULT_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "900"))  # seconds
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Cache key: case and whitespace differences do not change retrieval."""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+class RetrievalCache:
+    """
+    LRU of prompt -> (examples, api_refs), with expiry.
+
+    Concurrent lookups of the same prompt wait for the first one instead of
+    searching twice (a submit arriving while its type-ahead search runs).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[str, "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, prompt: str) -> Optional[Any]:
+        """Cached value for `prompt`, or None."""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    async def get_or_compute(
+        self,
+        prompt: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Return (value, cached), awaiting `compute()` at most once per prompt at
+        a time. Values for which `cacheable(value)` is false are handed to
+        concurrent waiters but not stored.
+        """
+        key = normalize_prompt(prompt)
+        value = self.get(prompt)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value, True
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.stats["hits"] += 1
+            # Shielded: a cancelled waiter must not cancel the shared lookup
+            return await asyncio.shield(pending), True
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; nobody else needs to
+            raise
+        finally:
+            self._pending.pop(key, None)
+            if not future.done():
+                future.cancel()
+
+        if cacheable is not None and not cacheable(value):
+            return value, False
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value, False
+
+    def clear(self):
+        """Drop everything (after the index is rebuilt)."""
+        with self._lock:
+            self._entries.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else None,
+        }
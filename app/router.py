@@ -0,0 +1,138 @@
+"""
+Routing between a fast and a strong model by request complexity.
+"""
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional
+
+from app.tracebacks import last_exception_line
+
+FAST_MODEL = os.getenv("MANIM_FAST_MODEL", "claude-haiku-4-5-20251001")
+STRONG_MODEL = os.getenv("MANIM_STRONG_MODEL", "claude-sonnet-4-5-20250929")
+ROUTING_ENABLED = os.getenv("MANIM_MODEL_ROUTING", "1") == "1"
+
+# A request scoring at least this goes to the strong model
+STRONG_THRESHOLD = 2
+
+LONG_PROMPT_CHARS = 400
+HIGH_SCENE_COST = 12
+
+THREE_D_KEYWORDS = (
+    "3d", "three-d", "three dimensional", "threedscene", "surface", "sphere",
+    "cube", "cone", "cylinder", "torus", "camera orientation", "rotate the camera",
+    "z-axis", "z axis",
+)
+
+# "1. ...", "first ... then", "after that", "finally"
+_NUMBERED_STEP_RE = re.compile(r'^\s*(?:\d+[.)]|-|\*)\s+', re.MULTILINE)
+_SEQUENCE_WORDS_RE = re.compile(r'\b(then|after that|afterwards|next|finally|followed by)\b', re.IGNORECASE)
+
+# Errors a small model reliably fixes: a wrong name, kwarg or attribute
+MINOR_ERRORS = ("TypeError", "AttributeError", "NameError", "ImportError", "SyntaxError", "IndentationError")
+
+
+def estimate_scene_cost(code: str) -> int:
+    """
+    Rough static cost of a scene: how much there is to get right and render.
+
+    Counts animations, updaters, loops and 3D constructs; used to judge how
+    hard a previous attempt was.
+    """
+    if not code:
+        return 0
+    cost = len(re.findall(r'self\.play\(', code))
+    cost += len(re.findall(r'self\.wait\(', code)) // 2
+    cost += 2 * len(re.findall(r'always_redraw|add_updater|ValueTracker', code))
+    cost += 2 * len(re.findall(r'^\s*(?:for|while)\b', code, re.MULTILINE))
+    cost += 4 * len(re.findall(r'ThreeDScene|Surface|set_camera_orientation|move_camera', code))
+    return cost
+
+
+class ModelRouter:
+    """Picks the fast or strong model per call and records how each route performs."""
+
+    def __init__(
+        self,
+        fast_model: str = FAST_MODEL,
+        strong_model: str = STRONG_MODEL,
+        enabled: bool = ROUTING_ENABLED,
+    ):
+        self.models = {"fast": fast_model, "strong": strong_model}
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def route_generation(self, prompt: str, previous_code: Optional[str] = None) -> Dict[str, Any]:
+        """Classify a generation request. Returns {"route", "model", "reasons"}."""
+        reasons = []
+        score = 0
+        text = prompt.lower()
+
+        if len(prompt) > LONG_PROMPT_CHARS:
+            score += 1
+            reasons.append("long prompt")
+        if len(_NUMBERED_STEP_RE.findall(prompt)) >= 2 or len(_SEQUENCE_WORDS_RE.findall(prompt)) >= 2:
+            score += 2
+            reasons.append("multi-step")
+        if any(k in text for k in THREE_D_KEYWORDS):
+            score += 2
+            reasons.append("3d")
+        if previous_code and estimate_scene_cost(previous_code) >= HIGH_SCENE_COST:
+            score += 1
+            reasons.append("costly previous attempt")
+
+        return self._decision("strong" if score >= STRONG_THRESHOLD else "fast", reasons)
+
+    def route_planning(self) -> Dict[str, Any]:
+        """Splitting a request into scenes is short and structured: fast model."""
+        return self._decision("fast", ["scene planning"])
+
+    def route_fix(self, code: str, traceback: str, attempt: int = 1) -> Dict[str, Any]:
+        """
+        Classify a fix. Minor errors in cheap scenes go to the fast model on
+        the first attempt; any retry escalates to the strong model.
+        """
+        if attempt > 1:
+            return self._decision("strong", ["escalated after failed fix"])
+
+        exception = last_exception_line(traceback) or ""
+        reasons = []
+        if not exception.startswith(MINOR_ERRORS):
+            reasons.append("non-trivial error")
+        if estimate_scene_cost(code) >= HIGH_SCENE_COST:
+            reasons.append("costly scene")
+        return self._decision("strong" if reasons else "fast", reasons or ["minor error"])
+
+    def escalate(self, decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Strong-model decision to retry with, or None if already strong."""
+        if decision["route"] == "strong":
+            return None
+        return self._decision("strong", decision["reasons"] + ["escalated"])
+
+    def record(self, task: str, route: str, success: bool, seconds: float = 0.0):
+        """Record the outcome and latency of one routed call."""
+        key = f"{task}:{route}"
+        with self._lock:
+            stats = self._stats.setdefault(key, {"calls": 0, "successes": 0, "total_seconds": 0.0})
+            stats["calls"] += 1
+            stats["successes"] += int(success)
+            stats["total_seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Per task/route call counts, success rates and mean latency."""
+        with self._lock:
+            routes = {
+                key: {
+                    "calls": s["calls"],
+                    "success_rate": round(s["successes"] / s["calls"], 3) if s["calls"] else 0.0,
+                    "avg_seconds": round(s["total_seconds"] / s["calls"], 3) if s["calls"] else 0.0,
+                }
+                for key, s in self._stats.items()
+            }
+        return {"enabled": self.enabled, "models": self.models, "routes": routes}
+
+    def _decision(self, route: str, reasons: List[str]) -> Dict[str, Any]:
+        if not self.enabled:
+            route, reasons = "strong", ["routing disabled"]
+        return {"route": route, "model": self.models[route], "reasons": reasons}
@@ -0,0 +1,484 @@
+"""
+JSON scene descriptions, validated and interpreted without exec.
+
+A scene is a list of objects and a timeline of tracks. Each track is one
+`self.play(...)` call whose animations run together, so it is also one
+entry in Manim's partial-movie cache; `track_keys` gives a stable key per
+track that changes when the track or anything before it changes.
+
+    {
+        "background": "BLACK",
+        "objects": [
+            {"id": "ax", "type": "axes", "x_range": [-3, 3, 1], "y_range": [-2, 2, 1]},
+            {"id": "curve", "type": "graph", "axes": "ax", "function": "sin(x)", "color": "BLUE"},
+            {"id": "d", "type": "dot", "color": "RED", "position": [-3, 0]}
+        ],
+        "tracks": [
+            {"animations": [{"action": "create", "target": "ax"}, {"action": "create", "target": "curve"}]},
+            {"animations": [{"action": "move_along", "target": "d", "path": "curve"}],
+             "run_time": 4, "rate_func": "linear", "wait": 1}
+        ]
+    }
+
+Scene files wrap the JSON so the renderer and fix loop treat them like any
+other scene (see `scene_file`).
+"""
+import ast
+import hashlib
+import json
+import math
+import re
+from typing import List, Dict, Any, Optional, Literal, Union
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+MAX_OBJECTS = 40
+MAX_TRACKS = 40
+MAX_DURATION = 60.0
+MAX_FUNCTION_LENGTH = 120
+MAX_EXPONENT = 10  # Bound on exponents that do not depend on x
+
+COLOR_NAMES = {
+    "WHITE", "BLACK", "GRAY", "GREY", "LIGHT_GRAY", "DARK_GRAY", "RED", "GREEN", "BLUE",
+    "YELLOW", "ORANGE", "PURPLE", "PINK", "TEAL", "GOLD", "MAROON",
+    "RED_A", "RED_E", "GREEN_A", "GREEN_E", "BLUE_A", "BLUE_E", "YELLOW_A", "YELLOW_E",
+}
+RATE_FUNCS = {
+    "linear", "smooth", "rush_into", "rush_from", "there_and_back", "double_smooth",
+    "ease_in_sine", "ease_out_sine", "ease_in_out_sine", "ease_in_out_cubic",
+}
+FUNCTIONS = {
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "exp": math.exp,
+    "log": math.log, "sqrt": math.sqrt, "abs": abs,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+_ID_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,31}$')
+_HEX_RE = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+ObjectType = Literal[
+    "circle", "square", "rectangle", "triangle", "dot", "line", "arrow", "polygon",
+    "axes", "number_plane", "number_line", "graph",
+]
+Action = Literal[
+    "create", "fade_in", "fade_out", "grow", "add", "remove", "transform",
+    "move_to", "shift", "rotate", "scale", "set_color", "move_along", "indicate", "camera",
+]
+
+Point = List[float]
+
+
+class SceneDslError(ValueError):
+    """Raised for scene descriptions that fail validation."""
+
+
+def _check_point(value: Optional[Point]) -> Optional[Point]:
+    if value is not None and len(value) not in (2, 3):
+        raise ValueError("points are [x, y] or [x, y, z]")
+    return value
+
+
+def _check_range(value: Optional[List[float]]) -> Optional[List[float]]:
+    if value is not None and (len(value) not in (2, 3) or value[0] >= value[1]):
+        raise ValueError("ranges are [min, max] or [min, max, step] with min < max")
+    return value
+
+
+def _check_color(value: Optional[str]) -> Optional[str]:
+    if value is not None and value.upper() not in COLOR_NAMES and not _HEX_RE.match(value):
+        raise ValueError(f"unknown color {value!r}; use a Manim color name or #RRGGBB")
+    return value
+
+
+class ObjectSpec(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    id: str
+    type: ObjectType
+    color: Optional[str] = None
+    fill_opacity: Optional[float] = Field(None, ge=0, le=1)
+    stroke_width: Optional[float] = Field(None, ge=0, le=20)
+    position: Optional[Point] = None
+    scale: Optional[float] = Field(None, gt=0, le=10)
+    # Shape sizes
+    radius: Optional[float] = Field(None, gt=0, le=10)
+    side_length: Optional[float] = Field(None, gt=0, le=14)
+    width: Optional[float] = Field(None, gt=0, le=14)
+    height: Optional[float] = Field(None, gt=0, le=8)
+    start: Optional[Point] = None
+    end: Optional[Point] = None
+    points: Optional[List[Point]] = None
+    # Coordinate systems and graphs
+    x_range: Optional[List[float]] = None
+    y_range: Optional[List[float]] = None
+    x_length: Optional[float] = Field(None, gt=0, le=14)
+    y_length: Optional[float] = Field(None, gt=0, le=8)
+    axes: Optional[str] = None
+    function: Optional[str] = Field(None, max_length=MAX_FUNCTION_LENGTH)
+
+    _point = field_validator("position", "start", "end")(_check_point)
+    _range = field_validator("x_range", "y_range")(_check_range)
+    _color = field_validator("color")(_check_color)
+
+    @field_validator("id")
+    @classmethod
+    def _valid_id(cls, value: str) -> str:
+        if not _ID_RE.match(value):
+            raise ValueError("ids are identifiers of up to 32 characters")
+        return value
+
+    @field_validator("function")
+    @classmethod
+    def _valid_function(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            compile_function(value)
+        return value
+
+    @model_validator(mode="after")
+    def _required_fields(self):
+        required = {
+            "line": ("start", "end"),
+            "arrow": ("start", "end"),
+            "polygon": ("points",),
+            "graph": ("axes", "function"),
+        }.get(self.type, ())
+        missing = [f for f in required if getattr(self, f) is None]
+        if missing:
+            raise ValueError(f"{self.type} needs {', '.join(missing)}")
+        if self.points is not None and len(self.points) < 3:
+            raise ValueError("polygons need at least 3 points")
+        return self
+
+
+class AnimationSpec(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    action: Action
+    target: Optional[str] = None
+    into: Optional[str] = None  # transform
+    path: Optional[str] = None  # move_along
+    position: Optional[Point] = None  # move_to, camera center
+    vector: Optional[Point] = None  # shift
+    angle: Optional[float] = None  # rotate, degrees
+    factor: Optional[float] = Field(None, gt=0, le=10)  # scale, camera zoom
+    color: Optional[str] = None  # set_color
+
+    _point = field_validator("position", "vector")(_check_point)
+    _color = field_validator("color")(_check_color)
+
+    @model_validator(mode="after")
+    def _required_fields(self):
+        required = {
+            "transform": ("target", "into"),
+            "move_to": ("target", "position"),
+            "shift": ("target", "vector"),
+            "rotate": ("target", "angle"),
+            "scale": ("target", "factor"),
+            "set_color": ("target", "color"),
+            "move_along": ("target", "path"),
+            "camera": (),
+        }.get(self.action, ("target",))
+        missing = [f for f in required if getattr(self, f) is None]
+        if missing:
+            raise ValueError(f"{self.action} needs {', '.join(missing)}")
+        if self.action == "camera" and self.factor is None and self.position is None:
+            raise ValueError("camera needs factor (zoom) and/or position (center)")
+        return self
+
+
+class TrackSpec(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    animations: List[AnimationSpec] = Field(default_factory=list)
+    run_time: float = Field(1.0, gt=0, le=20)
+    rate_func: str = "smooth"
+    wait: float = Field(0.0, ge=0, le=10)
+
+    @field_validator("rate_func")
+    @classmethod
+    def _valid_rate_func(cls, value: str) -> str:
+        if value not in RATE_FUNCS:
+            raise ValueError(f"unknown rate_func {value!r}; use one of {sorted(RATE_FUNCS)}")
+        return value
+
+
+class SceneSpec(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    background: Optional[str] = None
+    objects: List[ObjectSpec] = Field(default_factory=list, max_length=MAX_OBJECTS)
+    tracks: List[TrackSpec] = Field(min_length=1, max_length=MAX_TRACKS)
+
+    _color = field_validator("background")(_check_color)
+
+    @model_validator(mode="after")
+    def _references(self):
+        types = {}
+        for obj in self.objects:
+            if obj.id in types:
+                raise ValueError(f"duplicate object id {obj.id!r}")
+            types[obj.id] = obj.type
+
+        for obj in self.objects:
+            if obj.axes is not None and types.get(obj.axes) != "axes":
+                raise ValueError(f"{obj.id}: {obj.axes!r} is not an axes object")
+
+        for i, track in enumerate(self.tracks, 1):
+            for anim in track.animations:
+                for ref in (anim.target, anim.into, anim.path):
+                    if ref is not None and ref not in types:
+                        raise ValueError(f"track {i}: unknown object {ref!r}")
+
+        duration = sum(t.run_time + t.wait for t in self.tracks)
+        if duration > MAX_DURATION:
+            raise ValueError(f"scene lasts {duration:.0f}s, more than {MAX_DURATION:.0f}s")
+        return self
+
+
+class DslAnswer(BaseModel):
+    """What the LLM returns: a scene, or why the request needs Python."""
+
+    expressible: bool
+    reason: str = ""
+    scene: Optional[SceneSpec] = None
+
+
+def compile_function(expression: str):
+    """
+    Turn "sin(x) + x**2 / 4" into a float function of x without eval.
+
+    Only numbers, x, pi, e, + - * / ** and the functions in FUNCTIONS are allowed,
+    and exponents that do not depend on x must stay within MAX_EXPONENT.
+    Arithmetic is done in floats; points where the function is undefined
+    (division by zero, overflow, math domain errors, complex results) are NaN.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid function {expression!r}: {e.msg}")
+
+    binary = {
+        ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b,
+        ast.Mult: lambda a, b: a * b, ast.Div: lambda a, b: a / b,
+        ast.Pow: lambda a, b: float(a) ** float(b),
+    }
+
+    def uses_x(node):
+        return any(isinstance(n, ast.Name) and n.id == "x" for n in ast.walk(node))
+
+    def check(node):
+        if isinstance(node, ast.Expression):
+            return check(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return
+        if isinstance(node, ast.Name) and (node.id == "x" or node.id in CONSTANTS):
+            return
+        if isinstance(node, ast.BinOp) and type(node.op) in binary:
+            check(node.left)
+            check(node.right)
+            if isinstance(node.op, ast.Pow) and not uses_x(node.right):
+                exponent = safe_evaluate(node.right, 0.0)
+                if not abs(exponent) <= MAX_EXPONENT:
+                    raise ValueError(f"exponent out of range in {expression!r} (at most {MAX_EXPONENT})")
+            return
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            check(node.operand)
+            return
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in FUNCTIONS and len(node.args) == 1 and not node.keywords):
+            check(node.args[0])
+            return
+        raise ValueError(f"unsupported expression in {expression!r}: {ast.dump(node)[:60]}")
+
+    def evaluate(node, x):
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return x if node.id == "x" else CONSTANTS[node.id]
+        if isinstance(node, ast.BinOp):
+            return binary[type(node.op)](evaluate(node.left, x), evaluate(node.right, x))
+        if isinstance(node, ast.UnaryOp):
+            value = evaluate(node.operand, x)
+            return -value if isinstance(node.op, ast.USub) else value
+        return FUNCTIONS[node.func.id](evaluate(node.args[0], x))
+
+    def safe_evaluate(node, x):
+        try:
+            value = evaluate(node, float(x))
+        except (ZeroDivisionError, OverflowError, ValueError):
+            return math.nan
+        return value if isinstance(value, float) else math.nan  # Complex: (-1) ** 0.5
+
+    check(tree)
+    body = tree.body
+    return lambda x: safe_evaluate(body, x)
+
+
+def parse_spec(data: Union[str, Dict[str, Any]]) -> SceneSpec:
+    """Validate a scene description (JSON text or dict). Raises SceneDslError."""
+    try:
+        if isinstance(data, str):
+            return SceneSpec.model_validate_json(data)
+        return SceneSpec.model_validate(data)
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(p) for p in err['loc']) or 'scene'}: {err['msg']}" for err in e.errors()
+        )
+        raise SceneDslError(f"Invalid scene description: {problems}") from None
+
+
+def track_keys(spec: SceneSpec) -> List[str]:
+    """
+    One key per track, chained so a key changes when its track, the objects
+    it uses or any earlier track changes.
+    """
+    objects = {obj.id: obj.model_dump(exclude_none=True) for obj in spec.objects}
+    previous = hashlib.sha256(json.dumps({"background": spec.background}).encode()).hexdigest()
+    keys = []
+    for track in spec.tracks:
+        refs = sorted({r for a in track.animations for r in (a.target, a.into, a.path) if r})
+        payload = json.dumps(
+            {"previous": previous, "track": track.model_dump(exclude_none=True),
+             "objects": [objects[r] for r in refs]},
+            sort_keys=True,
+        )
+        previous = hashlib.sha256(payload.encode()).hexdigest()
+        keys.append(previous[:16])
+    return keys
+
+
+def scene_file(spec: SceneSpec) -> str:
+    """Scene module that validates and interprets `spec` at render time."""
+    text = json.dumps(spec.model_dump(exclude_none=True), indent=2)
+    return f'''"""
+Generated Manim scene (scene description, interpreted by app.scene_dsl).
+"""
+from manim import Scene
+
+from app.scene_dsl import parse_spec, run_spec
+
+SPEC = parse_spec(r"""
+{text}
+""")
+
+
+class DslScene(Scene):
+    def construct(self):
+        run_spec(self, SPEC)
+'''
+
+
+def run_spec(scene, spec: SceneSpec):
+    """Build the objects and play the tracks of `spec` on `scene`."""
+    import manim as m
+
+    def color(value):
+        return getattr(m, value.upper()) if value.upper() in COLOR_NAMES else value
+
+    def point(value):
+        return m.np.array(list(value) + [0.0] * (3 - len(value)), dtype=float)
+
+    if spec.background:
+        scene.camera.background_color = color(spec.background)
+
+    mobjects = {}
+    for obj in spec.objects:
+        mobjects[obj.id] = _build_object(m, obj, mobjects, color, point)
+
+    for track in spec.tracks:
+        animations = [_build_animation(m, scene, anim, mobjects, color, point) for anim in track.animations]
+        animations = [a for a in animations if a is not None]
+        if animations:
+            scene.play(*animations, run_time=track.run_time, rate_func=getattr(m, track.rate_func))
+        if track.wait:
+            scene.wait(track.wait)
+
+
+def _build_object(m, obj: ObjectSpec, mobjects: Dict[str, Any], color, point):
+    style = {}
+    if obj.color:
+        style["color"] = color(obj.color)
+    if obj.stroke_width is not None:
+        style["stroke_width"] = obj.stroke_width
+
+    if obj.type == "circle":
+        mob = m.Circle(radius=obj.radius or 1.0, **style)
+    elif obj.type == "square":
+        mob = m.Square(side_length=obj.side_length or 2.0, **style)
+    elif obj.type == "rectangle":
+        mob = m.Rectangle(width=obj.width or 4.0, height=obj.height or 2.0, **style)
+    elif obj.type == "triangle":
+        mob = m.Triangle(**style)
+    elif obj.type == "dot":
+        mob = m.Dot(radius=obj.radius or m.DEFAULT_DOT_RADIUS, **{k: v for k, v in style.items() if k == "color"})
+    elif obj.type == "line":
+        mob = m.Line(point(obj.start), point(obj.end), **style)
+    elif obj.type == "arrow":
+        mob = m.Arrow(point(obj.start), point(obj.end), buff=0, **style)
+    elif obj.type == "polygon":
+        mob = m.Polygon(*[point(p) for p in obj.points], **style)
+    elif obj.type == "axes":
+        kwargs = {"x_range": obj.x_range or [-5, 5, 1], "y_range": obj.y_range or [-3, 3, 1]}
+        if obj.x_length:
+            kwargs["x_length"] = obj.x_length
+        if obj.y_length:
+            kwargs["y_length"] = obj.y_length
+        mob = m.Axes(**kwargs, **style)
+    elif obj.type == "number_plane":
+        mob = m.NumberPlane(x_range=obj.x_range or [-7, 7, 1], y_range=obj.y_range or [-4, 4, 1])
+    elif obj.type == "number_line":
+        mob = m.NumberLine(x_range=obj.x_range or [-5, 5, 1], length=obj.width or 10, include_numbers=False, **style)
+    else:  # graph
+        axes = mobjects[obj.axes]
+        kwargs = {"x_range": obj.x_range} if obj.x_range else {}
+        mob = axes.plot(compile_function(obj.function), **kwargs, **style)
+
+    if obj.fill_opacity is not None:
+        mob.set_fill(opacity=obj.fill_opacity)
+    if obj.scale:
+        mob.scale(obj.scale)
+    if obj.position is not None and obj.type not in ("line", "arrow", "graph"):
+        mob.move_to(point(obj.position))
+    return mob
+
+
+def _build_animation(m, scene, anim: AnimationSpec, mobjects: Dict[str, Any], color, point):
+    """One Manim animation; "add" and "remove" act at once and return None."""
+    mob = mobjects.get(anim.target)
+    action = anim.action
+
+    if action == "add":
+        scene.add(mob)
+        return None
+    if action == "remove":
+        scene.remove(mob)
+        return None
+    if action == "create":
+        return m.Create(mob)
+    if action == "fade_in":
+        return m.FadeIn(mob)
+    if action == "fade_out":
+        return m.FadeOut(mob)
+    if action == "grow":
+        return m.GrowFromCenter(mob)
+    if action == "indicate":
+        return m.Indicate(mob)
+    if action == "transform":
+        return m.ReplacementTransform(mob, mobjects[anim.into])
+    if action == "move_to":
+        return mob.animate.move_to(point(anim.position))
+    if action == "shift":
+        return mob.animate.shift(point(anim.vector))
+    if action == "rotate":
+        return m.Rotate(mob, angle=anim.angle * m.DEGREES)
+    if action == "scale":
+        return mob.animate.scale(anim.factor)
+    if action == "set_color":
+        return mob.animate.set_color(color(anim.color))
+    if action == "move_along":
+        return m.MoveAlongPath(mob, mobjects[anim.path])
+
+    # camera: zoom/pan by transforming everything on screen around the center
+    center = point(anim.position) if anim.position is not None else m.ORIGIN
+    group = m.Group(*scene.mobjects)
+    return group.animate.shift(-center).scale(anim.factor or 1.0, about_point=m.ORIGIN)
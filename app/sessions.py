@@ -0,0 +1,89 @@
+"""
+In-memory editing sessions: the last prompt, plan and code per user.
+"""
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+DEFAULT_MAX_SESSIONS = 100
+DEFAULT_SESSION_TTL = 6 * 3600  # seconds
+
+
+class SessionStore:
+    """
+    Keeps recent sessions, least recently used evicted first.
+
+    Each session owns a directory under `base_dir` holding its scene file and
+    Manim media cache, so follow-up edits can reuse rendered animations.
+    """
+
+    def __init__(self, base_dir: Path, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_SESSION_TTL):
+        self.base_dir = Path(base_dir)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, prompt: str) -> Dict[str, Any]:
+        """Start a new session for `prompt`."""
+        session_id = uuid.uuid4().hex[:12]
+        session_dir = self.base_dir / session_id
+        session_dir.mkdir(parents=True, exist_ok=True)
+
+        session = {
+            "id": session_id,
+            "prompt": prompt,
+            "plan": "",
+            "code": None,
+            "history": [prompt],
+            "dir": session_dir,
+            "scene_path": session_dir / "scene.py",
+            "media_dir": session_dir / "media",
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._sessions[session_id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a live session, or None if unknown or expired."""
+        if not session_id:
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session["updated"] > self.ttl:
+                self._remove(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def update(self, session_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Update fields of a session and mark it as recently used."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(fields)
+            session["updated"] = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _evict(self):
+        """Drop expired sessions and the oldest ones beyond the cap (lock held)."""
+        now = time.time()
+        for session_id in [sid for sid, s in self._sessions.items() if now - s["updated"] > self.ttl]:
+            self._remove(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._remove(next(iter(self._sessions)))
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session:
+            shutil.rmtree(session["dir"], ignore_errors=True)
@@ -0,0 +1,177 @@
+"""
+Helpers for reading render tracebacks.
+"""
+import re
+from typing import List, Dict, Any, Optional
+
+# Final "SomeError: message" line of a Python traceback
+_EXCEPTION_LINE_RE = re.compile(r'^(\w+(?:\.\w+)*(?:Error|Exception|Warning|Exit)):?\s*(.*)$')
+_HEX_ADDRESS_RE = re.compile(r'0x[0-9a-fA-F]+')
+_LINE_NUMBER_RE = re.compile(r'\bline \d+')
+# 'File "/path/scene.py", line 12, in construct'
+_FRAME_RE = re.compile(r'^\s*File "(?P<path>[^"]+)", line (?P<line>\d+)(?:, in (?P<func>\S+))?')
+# "Mobject.__init__() got an unexpected keyword argument 'colour'"
+_UNEXPECTED_KWARG_RE = re.compile(r"(?:(\w+)\.)?(\w+)\(\) got an unexpected keyword argument '(\w+)'")
+# "'Axes' object has no attribute 'get_graph'"
+_MISSING_ATTRIBUTE_RE = re.compile(r"'(\w+)' object has no attribute '(\w+)'")
+# Class-style calls on a source line: Circle(...), Axes(...)
+_CLASS_CALL_RE = re.compile(r'\b([A-Z]\w*)\s*\(')
+
+# Most symbols looked up for one error
+MAX_FAILING_SYMBOLS = 3
+
+
+def last_exception_line(traceback: str) -> Optional[str]:
+    """Return the final exception line ("TypeError: ...") of a traceback."""
+    for line in reversed(traceback.strip().splitlines()):
+        line = line.strip()
+        if _EXCEPTION_LINE_RE.match(line):
+            return line
+    return None
+
+
+def error_signature(traceback: str) -> str:
+    """
+    Reduce an error to a stable signature so repeated failures can be spotted.
+
+    Memory addresses and line numbers are dropped; exception type and message
+    are kept, so two different kwargs on the same call are still distinct.
+    """
+    line = last_exception_line(traceback)
+    if line is None:
+        lines = [l.strip() for l in traceback.strip().splitlines() if l.strip()]
+        line = lines[-1] if lines else ""
+    line = _HEX_ADDRESS_RE.sub("0x?", line)
+    line = _LINE_NUMBER_RE.sub("line ?", line)
+    return line
+
+
+def scene_line_numbers(traceback: str, code: str) -> List[int]:
+    """
+    Return the 1-based line numbers of `code` that appear in the traceback.
+
+    A frame belongs to the scene when the source line printed under it matches
+    the same line of `code`, so this works whatever path the scene was loaded from.
+    """
+    code_lines = code.splitlines()
+    found = []
+    for _, line_no, source in _frames(traceback.strip().splitlines()):
+        if 1 <= line_no <= len(code_lines) and source and source == code_lines[line_no - 1].strip():
+            if line_no not in found:
+                found.append(line_no)
+    return found
+
+
+def trim_traceback(traceback: str, code: Optional[str] = None, max_library_frames: int = 2) -> str:
+    """
+    Shorten a render traceback to what a fix needs.
+
+    Keeps the frames inside the scene (all non site-packages frames if `code`
+    is not given), the innermost `max_library_frames` other frames and the
+    final exception line. Dropped runs of frames become a single "...".
+    """
+    lines = traceback.strip().splitlines()
+    frames = list(_frames(lines))
+    if not frames:
+        return traceback.strip()
+
+    code_lines = code.splitlines() if code is not None else None
+
+    def is_scene_frame(frame) -> bool:
+        start, line_no, source = frame
+        if code_lines is None:
+            return "site-packages" not in lines[start]
+        return 1 <= line_no <= len(code_lines) and bool(source) and source == code_lines[line_no - 1].strip()
+
+    library = [f for f in frames if not is_scene_frame(f)]
+    keep = {f[0] for f in frames if is_scene_frame(f)}
+    keep.update(f[0] for f in library[-max_library_frames:] if max_library_frames > 0)
+
+    out = []
+    skipped = False
+    for start, _, _ in frames:
+        if start in keep:
+            out.append(lines[start])
+            # Source line and caret markers printed under the frame header
+            j = start + 1
+            while j < len(lines) and lines[j].startswith("    ") and not _FRAME_RE.match(lines[j]):
+                out.append(lines[j])
+                j += 1
+            skipped = False
+        elif not skipped:
+            out.append("  ...")
+            skipped = True
+
+    out.append(last_exception_line(traceback) or lines[-1].strip())
+    return "\n".join(out)
+
+
+def failing_api_symbols(traceback: str, code: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Name the Manim symbols an error is about, for exact API lookup.
+
+    Returns {"symbols": [class names, most specific first], "kwarg": str | None,
+    "attribute": str | None}. The class called with the rejected keyword on the
+    failing scene line comes first, then the class named in the message
+    (often a base class such as Mobject).
+    """
+    message = last_exception_line(traceback) or ""
+    kwarg = attribute = None
+    from_message = []
+
+    match = _UNEXPECTED_KWARG_RE.search(message)
+    if match:
+        owner, function, kwarg = match.groups()
+        from_message.append(owner or function)
+    match = _MISSING_ATTRIBUTE_RE.search(message)
+    if match:
+        from_message.append(match.group(1))
+        attribute = match.group(2)
+
+    lines = traceback.strip().splitlines()
+    code_lines = code.splitlines() if code is not None else None
+    sources = []
+    for start, line_no, source in _frames(lines):
+        if code_lines is not None:
+            if 1 <= line_no <= len(code_lines) and source and source == code_lines[line_no - 1].strip():
+                sources.append(source)
+        elif source and "site-packages" not in lines[start]:
+            sources.append(source)
+
+    from_scene = []
+    # Innermost scene line first: that is where the bad call is
+    for source in reversed(sources):
+        calls = list(_CLASS_CALL_RE.finditer(source))
+        if kwarg and f"{kwarg}=" in source:
+            position = source.index(f"{kwarg}=")
+            calls = [c for c in calls if c.start() < position][-1:] or calls
+        from_scene.extend(c.group(1) for c in calls)
+        if from_scene:
+            break
+
+    symbols = []
+    for name in from_scene + from_message:
+        if name and name[0].isupper() and name not in symbols:
+            symbols.append(name)
+    return {"symbols": symbols[:MAX_FAILING_SYMBOLS], "kwarg": kwarg, "attribute": attribute}
+
+
+def _frames(lines: List[str]):
+    """Yield (index, line number, stripped source line) for each traceback frame."""
+    for i, line in enumerate(lines):
+        match = _FRAME_RE.match(line)
+        if not match:
+            continue
+        source = lines[i + 1].strip() if i + 1 < len(lines) and not _FRAME_RE.match(lines[i + 1]) else ""
+        yield i, int(match.group("line")), source
+
+
+def normalized_signature(traceback: str) -> str:
+    """
+    A coarser `error_signature` used to key learned fixes.
+
+    Numbers are masked as well, so "index 3 out of range" and "index 7 out of
+    range" share a key while names in the message (kwargs, attributes) still
+    tell different errors apart.
+    """
+    return re.sub(r'\b\d+(?:\.\d+)?\b', 'N', error_signature(traceback))
@@ -1,5 +1,12 @@
 from manim import *
 
+# Template parameters (filled from the prompt, see meta.json)
+CURVE_COLOR = BLUE
+DOT_COLOR = RED
+X_START = -3
+X_END = 3
+RUN_TIME = 4
+
 class MovingDotExample(Scene):
     def construct(self):
         # Create axes and graph
@@ -10,12 +17,12 @@ class MovingDotExample(Scene):
             y_length=4
         )
 
-        graph = axes.plot(lambda x: np.sin(x), color=BLUE)
+        graph = axes.plot(lambda x: np.sin(x), color=CURVE_COLOR)
 
         # Create moving dot with tracker
-        t = ValueTracker(-3)
+        t = ValueTracker(X_START)
         dot = always_redraw(
-            lambda: Dot(color=RED).move_to(
+            lambda: Dot(color=DOT_COLOR).move_to(
                 axes.c2p(t.get_value(), np.sin(t.get_value()))
             )
         )
@@ -23,5 +30,5 @@ class MovingDotExample(Scene):
         # Animate
         self.play(Create(axes), Create(graph))
         self.add(dot)
-        self.play(t.animate.set_value(3), run_time=4, rate_func=linear)
+        self.play(t.animate.set_value(X_END), run_time=RUN_TIME, rate_func=linear)
         self.wait()
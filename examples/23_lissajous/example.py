@@ -1,10 +1,16 @@
 from manim import *
 
+# Template parameters (filled from the prompt, see meta.json)
+CURVE_COLOR = GREEN
+DOT_COLOR = RED
+FREQ_A = 3
+FREQ_B = 2
+
 class LissajousExample(Scene):
     def construct(self):
         # Parameters
-        a_tracker = ValueTracker(3)
-        b_tracker = ValueTracker(2)
+        a_tracker = ValueTracker(FREQ_A)
+        b_tracker = ValueTracker(FREQ_B)
         delta_tracker = ValueTracker(PI / 2)
 
         curve = always_redraw(
@@ -15,14 +21,14 @@ class LissajousExample(Scene):
                     0,
                 ]),
                 t_range=[0, 2 * PI, 0.01],
-                color=GREEN,
+                color=CURVE_COLOR,
                 stroke_width=3,
             )
         )
 
         # Dot tracing the curve
         dot = always_redraw(
-            lambda: Dot(color=RED, radius=0.08).move_to(
+            lambda: Dot(color=DOT_COLOR, radius=0.08).move_to(
                 curve.get_end()
             )
         )
@@ -30,8 +36,8 @@ class LissajousExample(Scene):
         self.add(curve, dot)
         self.wait(1)
 
-        # Change frequency ratio from 3:2 to 3:4
-        self.play(b_tracker.animate.set_value(4), run_time=3)
+        # Change the second frequency (3:2 -> 3:4 with the defaults)
+        self.play(b_tracker.animate.set_value(FREQ_B + 2), run_time=3)
         self.wait(1)
 
         # Change phase
@@ -1,14 +1,37 @@
 from manim import *
 
+# Template parameters (filled from the prompt, see meta.json)
+X_MIN = -5
+X_MAX = 5
+LINE_COLOR = WHITE
+POINTER_COLOR = RED
+START = None  # None: near the left end of the line
+END = None  # None: near the right end of the line
+
 class NumberLineExample(Scene):
     def construct(self):
+        # Keep the range ordered and at least 2 units wide
+        x_min, x_max = min(X_MIN, X_MAX), max(X_MIN, X_MAX)
+        x_max = max(x_max, x_min + 2)
+        span = x_max - x_min
+
+        def at(fraction):
+            """Position a fraction of the way along the line."""
+            return x_min + fraction * span
+
+        def on_line(value, fraction):
+            """`value` clamped to the line, or `at(fraction)` if not given."""
+            return at(fraction) if value is None else min(max(value, x_min), x_max)
+
+        start, end = on_line(START, 0.1), on_line(END, 0.9)
+
         # Create number line
         number_line = NumberLine(
-            x_range=[-5, 5, 1],
+            x_range=[x_min, x_max, 1],
             length=10,
             include_numbers=False,  # no LaTeX numbers
             include_tip=True,
-            color=WHITE,
+            color=LINE_COLOR,
         )
 
         # Add tick marks (already included by default)
@@ -16,11 +39,11 @@ class NumberLineExample(Scene):
         self.wait(0.5)
 
         # Value tracker for pointer position
-        tracker = ValueTracker(-4)
+        tracker = ValueTracker(start)
 
         # Pointer triangle
         pointer = always_redraw(
-            lambda: Triangle(color=RED, fill_opacity=1)
+            lambda: Triangle(color=POINTER_COLOR, fill_opacity=1)
             .scale(0.15)
             .rotate(PI)
             .next_to(number_line.n2p(tracker.get_value()), UP, buff=0.1)
@@ -30,7 +53,7 @@ class NumberLineExample(Scene):
         dot = always_redraw(
             lambda: Dot(
                 number_line.n2p(tracker.get_value()),
-                color=RED, radius=0.1,
+                color=POINTER_COLOR, radius=0.1,
             )
         )
 
@@ -46,19 +69,19 @@ class NumberLineExample(Scene):
         self.play(FadeIn(pointer), FadeIn(dot), FadeIn(indicator_line), run_time=0.5)
 
         # Animate pointer moving right
-        self.play(tracker.animate.set_value(4), run_time=3, rate_func=smooth)
+        self.play(tracker.animate.set_value(end), run_time=3, rate_func=smooth)
         self.wait(0.5)
 
-        # Move to specific positions
-        self.play(tracker.animate.set_value(0), run_time=1.5)
+        # Move to positions along the line (the middle, a quarter, near the end)
+        self.play(tracker.animate.set_value(at(0.5)), run_time=1.5)
         self.wait(0.5)
 
-        self.play(tracker.animate.set_value(-2.5), run_time=1.5)
+        self.play(tracker.animate.set_value(at(0.25)), run_time=1.5)
         self.wait(0.5)
 
-        self.play(tracker.animate.set_value(3.5), run_time=2, rate_func=there_and_back)
+        self.play(tracker.animate.set_value(at(0.85)), run_time=2, rate_func=there_and_back)
         self.wait(0.5)
 
         # Bounce to final position
-        self.play(tracker.animate.set_value(0), run_time=1.5, rate_func=rush_from)
+        self.play(tracker.animate.set_value(at(0.5)), run_time=1.5, rate_func=rush_from)
         self.wait(2)
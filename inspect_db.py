@@ -8,6 +8,10 @@ Usage:
     python inspect_db.py --search "query"   # Search for examples/APIs
     python inspect_db.py --list-examples    # List all indexed examples
     python inspect_db.py --list-api         # List all API chunks
+    python inspect_db.py --export-snapshot PATH [--snapshot-dtype float16]
+                                            # Write a quantized single-file snapshot
+    python inspect_db.py --import-snapshot PATH
+                                            # Install a snapshot (RAG_VECTOR_BACKEND=snapshot)
 """
 import sys
 import argparse
@@ -16,7 +20,14 @@ from pathlib import Path
 # Add app to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app.rag import CHROMA_DB_PATH, COLLECTION_MANIM_API, COLLECTION_MANIM_EXAMPLES
+from app.rag import (
+    CHROMA_DB_PATH,
+    COLLECTION_MANIM_API,
+    COLLECTION_MANIM_EXAMPLES,
+    INDEX_MANIFEST_PATH,
+    SNAPSHOT_DTYPE,
+    SNAPSHOT_PATH,
+)
 
 
 def check_db_exists():
@@ -27,7 +38,6 @@ def check_db_exists():
     
     try:
         import chromadb
-        from app.rag.embeddings import VoyageEmbeddingFunction
         
         client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
         
@@ -53,12 +63,20 @@ def initialize_db(rebuild=False):
     try:
         from app.rag.retriever import RAGRetriever
         
+        def progress(done, total):
+            print(f"\r  Embedding API chunks: {done}/{total}", end="", flush=True)
+
         retriever = RAGRetriever()
-        counts = retriever.initialize(rebuild=rebuild)
+        counts = retriever.initialize(rebuild=rebuild, progress=progress)
+        print()
         
         print("✓ Database initialized successfully!")
         print(f"  - API chunks indexed: {counts['api_chunks']}")
         print(f"  - Examples indexed: {counts['examples']}")
+        changes = counts.get("changes", {})
+        for kind, label in [("api_files", "API source files"), ("examples", "Examples")]:
+            if kind in changes:
+                print(f"  - {label} updated: {changes[kind]['upserted']}, removed: {changes[kind]['deleted']}")
         print(f"  - Location: {CHROMA_DB_PATH}")
         return True
     except Exception as e:
@@ -108,10 +126,10 @@ def list_examples():
     """List all indexed examples."""
     try:
         import chromadb
-        from app.rag.embeddings import VoyageEmbeddingFunction
+        from app.rag.embeddings import get_embedding_function
         
         client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        embedding_fn = VoyageEmbeddingFunction()
+        embedding_fn = get_embedding_function()
         collection = client.get_collection(
             name=COLLECTION_MANIM_EXAMPLES,
             embedding_function=embedding_fn
@@ -142,10 +160,10 @@ def list_api_chunks():
     """List sample API chunks."""
     try:
         import chromadb
-        from app.rag.embeddings import VoyageEmbeddingFunction
+        from app.rag.embeddings import get_embedding_function
         
         client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        embedding_fn = VoyageEmbeddingFunction()
+        embedding_fn = get_embedding_function()
         collection = client.get_collection(
             name=COLLECTION_MANIM_API,
             embedding_function=embedding_fn
@@ -172,6 +190,65 @@ def list_api_chunks():
         print(f"✗ Error listing API chunks: {e}")
 
 
+def export_snapshot(path, dtype):
+    """Write the ChromaDB collections to a single-file snapshot."""
+    try:
+        import json
+        import chromadb
+        from app.rag.indexer import index_source
+        from app.rag.snapshot import export_snapshot as write
+
+        manifest = json.loads(Path(INDEX_MANIFEST_PATH).read_text(encoding="utf-8"))
+        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        collections = {name: client.get_collection(name) for name in [COLLECTION_MANIM_API, COLLECTION_MANIM_EXAMPLES]}
+        header = write(
+            collections, path, dtype=dtype,
+            embedding_backend=manifest.get("embedding_backend", ""),
+            source=index_source(manifest),
+        )
+
+        print(f"✓ Snapshot written to {path} ({Path(path).stat().st_size / 1e6:.1f} MB, {dtype})")
+        for name, spec in header["collections"].items():
+            print(f"  {name}: {spec['count']} vectors x {spec['dim']}")
+    except Exception as e:
+        print(f"✗ Error exporting snapshot: {e}")
+        return False
+    return True
+
+
+def import_snapshot(path):
+    """Validate a snapshot and install it where the retriever looks for it."""
+    try:
+        import shutil
+        from app.rag.indexer import current_source, source_changes
+        from app.rag.snapshot import IndexSnapshot
+
+        snapshot = IndexSnapshot(path)
+        for name in [COLLECTION_MANIM_API, COLLECTION_MANIM_EXAMPLES]:
+            print(f"  {name}: {len(snapshot.index(name))} vectors")
+        print(f"  Embedding backend: {snapshot.embedding_backend} ({snapshot.header['dtype']})")
+        if snapshot.source:
+            print(f"  Manim {snapshot.source.get('manim_version')}, {len(snapshot.source.get('examples', {}))} examples")
+            for change in source_changes(snapshot.source, current_source()):
+                print(f"  ⚠ Differs from this node: {change} (the retriever will rebuild the index)")
+        else:
+            print("  ⚠ Snapshot does not record its Manim version and examples: it is served unchecked")
+
+        target = Path(SNAPSHOT_PATH)
+        if target.resolve() != Path(path).resolve():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + ".import.tmp")
+            shutil.copyfile(path, tmp)
+            tmp.replace(target)
+        print(f"✓ Snapshot installed at {target}")
+        print("  Set RAG_VECTOR_BACKEND=snapshot to serve searches from it")
+        print("  The snapshot is frozen: edits to examples/ need a new snapshot (or a rebuild)")
+    except Exception as e:
+        print(f"✗ Error importing snapshot: {e}")
+        return False
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Inspect and manage the ChromaDB RAG database"
@@ -186,12 +263,19 @@ def main():
                        help='List all indexed examples')
     parser.add_argument('--list-api', action='store_true',
                        help='List sample API chunks')
+    parser.add_argument('--export-snapshot', type=str, metavar='PATH',
+                       help='Write a quantized single-file index snapshot')
+    parser.add_argument('--import-snapshot', type=str, metavar='PATH',
+                       help='Install a snapshot for RAG_VECTOR_BACKEND=snapshot')
+    parser.add_argument('--snapshot-dtype', choices=['int8', 'float16'], default=SNAPSHOT_DTYPE,
+                       help='Vector quantization of exported snapshots')
     
     args = parser.parse_args()
     
     # If no arguments, show status
     if not any([args.init, args.rebuild, args.search, 
-                args.list_examples, args.list_api]):
+                args.list_examples, args.list_api,
+                args.export_snapshot, args.import_snapshot]):
         print("=" * 60)
         print("ChromaDB RAG Database Status")
         print("=" * 60)
@@ -209,6 +293,7 @@ def main():
             print("  --list-examples     # List all examples")
             print("  --list-api          # List API chunks")
             print("  --rebuild           # Rebuild from scratch")
+            print("  --export-snapshot P # Write a single-file snapshot")
         return
     
     # Handle commands
@@ -226,6 +311,10 @@ def main():
         list_examples()
     elif args.list_api:
         list_api_chunks()
+    elif args.export_snapshot:
+        export_snapshot(args.export_snapshot, args.snapshot_dtype)
+    elif args.import_snapshot:
+        import_snapshot(args.import_snapshot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+"""
+Test template parameter extraction, template filling and fast path matching.
+
+Usage:
+    python test_fast_path.py
+
+Needs no API keys and no Manim install (templates are filled, not rendered).
+"""
+from app.examples import ExampleManager
+from app.fast_path import TemplateFastPath, extract_params, fill_template
+
+examples = ExampleManager()
+
+
+def params_of(example_id):
+    return examples.get_example(example_id)["template"]["params"]
+
+
+def test_extract_params():
+    """Numbers are parsed and clamped (bounds included); colors bind to aliases."""
+    dot = params_of("05_moving_dot")
+    values = extract_params("a green dot moving from -3 to 3 along a blue sine wave in 6 seconds", dot)
+    assert values == {"CURVE_COLOR": "BLUE", "DOT_COLOR": "GREEN", "X_START": -3, "X_END": 3, "RUN_TIME": 6}
+    values = extract_params("a dot moving from -10 to 50 for 30 seconds", dot)
+    assert (values["X_START"], values["X_END"], values["RUN_TIME"]) == (-3, 3, 15)
+    # "into" and "onto" are not "to"
+    assert extract_params("a dot moving into 2 curves", dot)["X_END"] == 3
+
+    line = params_of("25_number_line")
+    values = extract_params("number line from 0 to 10", line)
+    assert (values["X_MIN"], values["X_MAX"]) == (0, 10)
+    values = extract_params("number line from -50 to 5 starting at 2", line)
+    assert (values["X_MIN"], values["X_MAX"], values["START"], values["END"]) == (-20, 5, 2, None)
+
+    lissajous = params_of("23_lissajous")
+    values = extract_params("a purple lissajous figure with ratio 5:4", lissajous)
+    assert values["CURVE_COLOR"] == "PURPLE" and (values["FREQ_A"], values["FREQ_B"]) == (5, 4)
+    assert extract_params("lissajous 20:0", lissajous)["FREQ_A"] == 9
+
+    # Numbers the patterns do not ask for keep the defaults
+    values = extract_params("a lissajous curve, 3 loops and 7 colors", lissajous)
+    assert (values["FREQ_A"], values["FREQ_B"]) == (3, 2)
+    print("[extract_params] PASSED")
+
+
+def test_fill_template():
+    """Template constants are rewritten; missing constants are an error."""
+    code = "X_MIN = -5\nSTART = None  # note\nx = X_MIN\n"
+    filled = fill_template(code, {"X_MIN": -2, "START": 1.5})
+    assert filled == "X_MIN = -2\nSTART = 1.5\nx = X_MIN\n"
+    compile(fill_template(examples.get_example("25_number_line")["code"], {"X_MIN": 0, "END": None}), "t.py", "exec")
+    try:
+        fill_template(code, {"MISSING": 1})
+        raise AssertionError("missing constant accepted")
+    except ValueError:
+        pass
+    print("[fill_template] PASSED")
+
+
+def test_match():
+    """Template prompts match (bounds included); others fall back to the LLM."""
+    fast_path = TemplateFastPath(examples, enabled=True)
+    result = fast_path.match("a red dot moving from -3 to 3 along a sine wave", [])
+    assert result and result["example_id"] == "05_moving_dot"
+    assert "X_START = -3\n" in result["code"]
+    assert fast_path.match("number line from -50 to 5", [])["params"]["X_MIN"] == -20
+
+    assert fast_path.match("a red dot moving along a sine wave, then zoom into the camera", []) is None
+    assert fast_path.match("explain the fundamental theorem of calculus with integrals", []) is None
+    assert fast_path.match("a red dot moving along a sine wave", [{"id": "05_moving_dot", "score": 0.1}]) is None
+    print("[match] PASSED")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Template Fast Path Tests")
+    print("=" * 50)
+
+    test_extract_params()
+    test_fill_template()
+    test_match()
+
+    print("\n" + "=" * 50)
+    print("All tests passed!")
@@ -0,0 +1,125 @@
+"""
+Test the local fix helpers (traceback parsing, line patches, fix cache).
+
+Usage:
+    python test_fix.py
+
+Needs no API keys and no Manim install.
+"""
+import tempfile
+from pathlib import Path
+
+from app.fix_cache import FixCache
+from app.patching import PatchError, code_window, number_lines, apply_line_edits
+from app.tracebacks import error_signature, failing_api_symbols, scene_line_numbers, trim_traceback
+
+SCENE_CODE = '''from manim import *
+
+class BrokenScene(Scene):
+    def construct(self):
+        circle = Circle(colour=RED)
+        self.play(Create(circle))
+        self.wait()
+'''
+
+TRACEBACK = '''Rendering error: Mobject.__init__() got an unexpected keyword argument 'colour'
+
+Traceback (most recent call last):
+  File "/app/app/renderer.py", line 80, in render
+    scene.render()
+  File "/venv/lib/site-packages/manim/scene/scene.py", line 223, in render
+    self.construct()
+  File "/app/generated/scene.py", line 5, in construct
+    circle = Circle(colour=RED)
+             ^^^^^^^^^^^^^^^^^^
+  File "/venv/lib/site-packages/manim/mobject/geometry/arc.py", line 467, in __init__
+    super().__init__(**kwargs)
+  File "/venv/lib/site-packages/manim/mobject/geometry/arc.py", line 158, in __init__
+    super().__init__(**kwargs)
+  File "/venv/lib/site-packages/manim/mobject/mobject.py", line 92, in __init__
+    raise TypeError(
+TypeError: Mobject.__init__() got an unexpected keyword argument 'colour'
+'''
+
+
+def test_traceback_helpers():
+    """Scene frames are found and the traceback is trimmed around them."""
+    assert scene_line_numbers(TRACEBACK, SCENE_CODE) == [5]
+
+    trimmed = trim_traceback(TRACEBACK, code=SCENE_CODE)
+    assert "generated/scene.py" in trimmed
+    assert "renderer.py" not in trimmed
+    assert trimmed.endswith("unexpected keyword argument 'colour'")
+
+    moved = TRACEBACK.replace("line 5,", "line 9,").replace("0x1", "0x2")
+    assert error_signature(TRACEBACK) == error_signature(moved)
+
+    # The class called with the bad kwarg first, then the class that rejected it
+    failing = failing_api_symbols(TRACEBACK, SCENE_CODE)
+    assert failing["symbols"] == ["Circle", "Mobject"] and failing["kwarg"] == "colour"
+    print("[tracebacks] PASSED")
+
+
+def test_line_edits():
+    """Line edits apply inside the window and are rejected when they do not match."""
+    window = code_window(SCENE_CODE, [5], context=2)
+    assert window == (3, 7)
+    assert number_lines(SCENE_CODE, 5, 5) == "5|         circle = Circle(colour=RED)"
+
+    fixed = apply_line_edits(SCENE_CODE, [{
+        "start_line": 5,
+        "end_line": 5,
+        "original": "circle = Circle(colour=RED)",
+        "replacement": "        circle = Circle(color=RED)",
+    }], window=window)
+    assert "Circle(color=RED)" in fixed
+    assert fixed.count("\n") == SCENE_CODE.count("\n")
+
+    for bad_edit in [
+        {"start_line": 5, "end_line": 5, "original": "self.wait()", "replacement": "        pass"},
+        {"start_line": 1, "end_line": 1, "replacement": "import numpy"},
+        {"start_line": 5, "end_line": 5, "replacement": "        circle = Circle("},
+    ]:
+        try:
+            apply_line_edits(SCENE_CODE, [bad_edit], window=window)
+        except PatchError:
+            continue
+        raise AssertionError(f"Edit should have been rejected: {bad_edit}")
+
+    print("[patching] PASSED")
+
+
+def test_fix_cache():
+    """A learned fix is reapplied to the same error in a different scene."""
+    cache = FixCache(Path(tempfile.mkdtemp()) / "fix_cache.json")
+    fixed = SCENE_CODE.replace("colour=", "color=")
+    assert cache.record(SCENE_CODE, fixed, TRACEBACK)
+
+    other_scene = SCENE_CODE.replace("Circle(colour=RED)", "Square(side_length=2, colour=BLUE)")
+    hit = cache.apply(other_scene, TRACEBACK)
+    assert hit is not None
+    assert "Square(side_length=2, color=BLUE)" in hit["fixed_code"]
+
+    other_error = TRACEBACK.replace("'colour'", "'fill_colour'")
+    assert cache.apply(other_scene, other_error) is None
+
+    for _ in range(3):
+        cache.report(hit["entry_id"], success=False)
+    assert cache.apply(other_scene, TRACEBACK) is None, "Failing patch should be disabled"
+
+    stats = FixCache(cache.path).stats()
+    assert stats["entries"] == 1 and stats["patches"][0]["failures"] == 3
+    print("[fix_cache] PASSED")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Fix Helper Tests")
+    print("=" * 50)
+
+    test_traceback_helpers()
+    test_line_edits()
+    test_fix_cache()
+
+    print("\n" + "=" * 50)
+    print("All tests passed!")
@@ -0,0 +1,140 @@
+"""
+Test the LLM client layer against a local stub of the Messages API.
+
+Usage:
+    python test_llm_client.py
+
+Needs no API key: the stub answers on localhost.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.llm_client import LLMClient, LLMCallError
+from app.metrics import RequestMetrics
+
+MESSAGE = {
+    "id": "msg_stub",
+    "type": "message",
+    "role": "assistant",
+    "model": "stub",
+    "content": [{"type": "text", "text": "{\"ok\": true}"}],
+    "stop_reason": "end_turn",
+    "stop_sequence": None,
+    "usage": {"input_tokens": 10, "output_tokens": 5},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Replays the queued status codes, then answers 200."""
+
+    script = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        with StubHandler.lock:
+            status = StubHandler.script.pop(0) if StubHandler.script else 200
+            StubHandler.in_flight += 1
+            StubHandler.max_in_flight = max(StubHandler.max_in_flight, StubHandler.in_flight)
+        time.sleep(0.05)
+
+        body = MESSAGE if status == 200 else {
+            "type": "error",
+            "error": {"type": "rate_limit_error" if status == 429 else "api_error", "message": "stub"},
+        }
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        if status == 429:
+            self.send_header("retry-after", "0.05")
+        self.end_headers()
+        self.wfile.write(data)
+        with StubHandler.lock:
+            StubHandler.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def run_checks(base_url: str):
+    client = LLMClient(api_key="stub", base_url=base_url, max_concurrency=2,
+                       requests_per_minute=6000, max_retries=3, timeout=10)
+    call = dict(model="stub", max_tokens=10, messages=[{"role": "user", "content": "hi"}])
+
+    # 429 and 500 are retried until the stub answers
+    StubHandler.script = [429, 500]
+    response = await client.create(**call)
+    assert response.content[0].text == '{"ok": true}'
+    stats = client.metrics()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 1 and stats["server_errors"] == 1
+    print("[llm_client] retries on 429/5xx PASSED")
+
+    # 4xx other than 429 is not retried
+    StubHandler.script = [400]
+    try:
+        await client.create(**call)
+        raise AssertionError("400 should not be retried")
+    except LLMCallError:
+        pass
+    assert client.metrics()["retries"] == 2
+    print("[llm_client] no retry on 400 PASSED")
+
+    # Concurrency stays within the cap
+    StubHandler.max_in_flight = 0
+    await asyncio.gather(*(client.create(**call) for _ in range(6)))
+    assert StubHandler.max_in_flight <= 2, StubHandler.max_in_flight
+    assert client.metrics()["max_in_flight"] <= 2
+    print("[llm_client] concurrency cap PASSED")
+
+    # Deadline covers retries
+    StubHandler.script = [500] * 10
+    try:
+        await client.create(deadline=0.3, **call)
+        raise AssertionError("Deadline should have been exceeded")
+    except LLMCallError:
+        pass
+    StubHandler.script = []
+    print("[llm_client] deadline PASSED")
+
+    # Token usage and LLM time land on the request trace
+    request_metrics = RequestMetrics()
+    trace = request_metrics.start("test")
+    await client.create(**call)
+    record = request_metrics.finish(trace, "success")
+    assert record["usage"]["input_tokens"] == 10 and record["usage"]["output_tokens"] == 5
+    assert record["stages"]["llm"] > 0
+    assert request_metrics.summary()["stages"]["llm"]["count"] == 1
+    print("[llm_client] request trace PASSED")
+
+
+def test_llm_client():
+    """Retries, concurrency cap, deadline and tracing against the local stub."""
+    server, url = start_stub()
+    try:
+        asyncio.run(run_checks(url))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("LLM Client Tests (local stub)")
+    print("=" * 50)
+
+    test_llm_client()
+
+    print("\n" + "=" * 50)
+    print("All tests passed!")
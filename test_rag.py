@@ -4,10 +4,11 @@ Test RAG retrieval quality across diverse queries.
 Usage:
     python test_rag.py
 
-Requires VOYAGE_API_KEY to be set.
+test_retrieval requires VOYAGE_API_KEY to be set; test_local_embeddings runs offline.
 """
 import os
 import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -38,6 +39,113 @@ def test_chunker():
     print("[chunker] PASSED")
 
 
+def test_local_embeddings():
+    """The offline backend is deterministic, normalized and ranks by shared terms."""
+    from app.rag.local_embeddings import LocalEmbeddingFunction
+
+    docs = [
+        "class Circle(Arc): A circle with a given radius",
+        "class Axes(CoordinateSystem): axes to plot graphs of functions",
+        "class ValueTracker(Mobject): tracks a real number value",
+    ]
+    fn = LocalEmbeddingFunction()
+    vectors = fn(docs)
+    assert vectors == LocalEmbeddingFunction()(docs), "Embeddings must not depend on the instance"
+    assert all(abs(sum(x * x for x in v) - 1.0) < 1e-4 for v in vectors)
+
+    query = fn.embed_query("plot a function on axes")
+    scores = [sum(a * b for a, b in zip(query, v)) for v in vectors]
+    assert max(range(len(docs)), key=scores.__getitem__) == 1, scores
+    print("[local_embeddings] PASSED")
+
+
+def test_vector_index():
+    """The in-memory index returns the same top-k as a brute-force scan, best first."""
+    import numpy as np
+    from app.rag.vector_index import NumpyVectorIndex
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 32)).astype(np.float32)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    index = NumpyVectorIndex(ids, vectors, metadatas=[{"name": i} for i in ids])
+
+    query = rng.standard_normal(32)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = [ids[i] for i in np.argsort(-(unit @ (query / np.linalg.norm(query))))[:5]]
+
+    results = index.query(query.tolist(), n_results=5)
+    assert results["ids"][0] == expected, (results["ids"][0], expected)
+    assert results["metadatas"][0][0]["name"] == expected[0]
+    assert results["distances"][0] == sorted(results["distances"][0])
+    assert NumpyVectorIndex([], []).query(query.tolist(), n_results=5)["ids"] == [[]]
+    print("[vector_index] PASSED")
+
+
+def test_snapshot():
+    """A quantized snapshot round-trips records and keeps the nearest neighbours."""
+    import tempfile
+    import numpy as np
+    from app.rag.snapshot import IndexSnapshot, write_snapshot
+    from app.rag.vector_index import NumpyVectorIndex
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((300, 64)).astype(np.float32)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    metadatas = [{"name": f"Class{i}", "type": "class" if i % 2 else "module"} for i in range(len(ids))]
+    index = NumpyVectorIndex(ids, vectors, documents=[f"doc {i}" for i in ids], metadatas=metadatas)
+
+    path = Path(tempfile.mkdtemp()) / "snapshot.bin"
+    for dtype in ("int8", "float16"):
+        source = {"manim_version": "0.18.1", "examples": {"circle": "abc"}}
+        write_snapshot(path, {"api": index}, dtype=dtype, embedding_backend="test:model", source=source)
+        snapshot = IndexSnapshot(path)
+        assert snapshot.embedding_backend == "test:model" and snapshot.source == source
+        loaded = snapshot.index("api")
+        assert len(loaded) == len(index)
+        assert loaded.record(7) == index.record(7)
+        assert loaded.class_rows("Class7") == [7] and loaded.class_rows("Class8") == []
+
+        query = rng.standard_normal(64).tolist()
+        assert loaded.query(query, 1)["ids"] == index.query(query, 1)["ids"], dtype
+
+        # BM25 postings travel in the snapshot, memory-mapped
+        bm25 = snapshot.bm25("api")
+        assert len(bm25) == len(index) and loaded.ids == ids
+        assert bm25.search("where is chunk_42", 1)[0][0] == "chunk_42"
+
+    # Stale snapshots are detected from the recorded source
+    from app.rag.indexer import source_changes
+    assert source_changes(source, dict(source)) == []
+    assert len(source_changes(source, {"manim_version": "0.19.0", "examples": {}})) == 2
+    print("[snapshot] PASSED")
+
+
+def test_bm25():
+    """Identifier-aware BM25 puts exact identifier matches first; RRF merges rankings."""
+    from app.rag.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+    assert tokenize("TracedPath(always_redraw)") == [
+        "tracedpath", "traced", "path", "always_redraw", "always", "redraw",
+    ]
+
+    ids = ["path", "traced_path", "redraw", "dot"]
+    docs = [
+        "class VMobject: a path of cubic curves",
+        "class TracedPath(VMobject): traces the path of a point over time",
+        "def always_redraw(func): rebuild the mobject every frame",
+        "class Dot(Circle): a small filled circle",
+    ]
+    index = BM25Index.build(ids, docs)
+    assert index.search("leave a TracedPath behind the dot", 2)[0][0] == "traced_path"
+    assert index.search("use always_redraw", 1)[0][0] == "redraw"
+    assert index.search("nothing relevant", 3) == []
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    assert fused[0][0] == "c" and {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
+    assert [score for _, score in fused] == sorted((score for _, score in fused), reverse=True)
+    print("[bm25] PASSED")
+
+
 def test_retrieval():
     """Test end-to-end retrieval quality."""
     if not os.getenv("VOYAGE_API_KEY"):
@@ -77,6 +185,11 @@ def test_retrieval():
             "expect_api": ["Graph"],
             "expect_example_tags": ["graph"],
         },
+        {
+            "query": "a dot leaving a TracedPath trail",
+            "expect_api": ["TracedPath"],
+            "expect_example_tags": ["path", "trace"],
+        },
         {
             "query": "camera zoom animation",
             "expect_api": ["MovingCameraScene"],
@@ -127,6 +240,11 @@ if __name__ == "__main__":
 
     test_chunker()
     print()
+    test_local_embeddings()
+    test_vector_index()
+    test_snapshot()
+    test_bm25()
+    print()
     test_retrieval()
 
     print("\n" + "=" * 50)
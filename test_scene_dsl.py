@@ -0,0 +1,106 @@
+"""
+Test scene description validation, track keys and the generated scene file.
+
+Usage:
+    python test_scene_dsl.py
+
+Needs no API keys and no Manim install (the interpreter itself is not run).
+"""
+import copy
+
+from app.scene_dsl import SceneDslError, compile_function, parse_spec, scene_file, track_keys
+
+SPEC = {
+    "background": "BLACK",
+    "objects": [
+        {"id": "ax", "type": "axes", "x_range": [-3, 3, 1], "y_range": [-2, 2, 1]},
+        {"id": "curve", "type": "graph", "axes": "ax", "function": "sin(x) + x**2 / 4", "color": "BLUE"},
+        {"id": "d", "type": "dot", "color": "#FF0000", "position": [-3, 0]},
+    ],
+    "tracks": [
+        {"animations": [{"action": "create", "target": "ax"}, {"action": "create", "target": "curve"}]},
+        {"animations": [{"action": "fade_in", "target": "d"}], "run_time": 0.5},
+        {"animations": [{"action": "move_along", "target": "d", "path": "curve"}],
+         "run_time": 4, "rate_func": "linear", "wait": 1},
+    ],
+}
+
+
+def test_validation():
+    """Valid specs parse; bad references, types and expressions are rejected."""
+    spec = parse_spec(SPEC)
+    assert len(spec.tracks) == 3
+    assert abs(compile_function("sqrt(x) * pi")(4) - 2 * 3.141592653589793) < 1e-9
+
+    # Undefined points are NaN instead of errors; huge constant powers are rejected
+    for expression, x in [("1 / x", 0), ("(-1) ** x", 0.5), ("sqrt(x)", -1), ("10 ** x", 1000)]:
+        value = compile_function(expression)(x)
+        assert value != value, f"{expression} at {x} should be NaN, got {value}"
+    for expression in ["9**9**9", "x ** 11", "2 ** (1 / 0)", "x ** -(3 * 5)"]:
+        try:
+            compile_function(expression)
+        except ValueError:
+            continue
+        raise AssertionError(f"{expression} should have been rejected")
+
+    bad_specs = []
+    for path, value in [
+        (("objects", 1, "axes"), "d"),
+        (("objects", 1, "function"), "__import__('os').system('ls')"),
+        (("objects", 1, "function"), "9**9**9"),
+        (("objects", 2, "color"), "blurple"),
+        (("tracks", 2, "rate_func"), "bounce"),
+        (("tracks", 2, "run_time"), 90),
+        (("tracks", 0, "animations", 0, "target"), "missing"),
+    ]:
+        bad = copy.deepcopy(SPEC)
+        node = bad
+        for key in path[:-1]:
+            node = node[key]
+        node[path[-1]] = value
+        bad_specs.append(bad)
+    bad_specs.append({**SPEC, "tracks": []})
+
+    for bad in bad_specs:
+        try:
+            parse_spec(bad)
+        except SceneDslError:
+            continue
+        raise AssertionError(f"Spec should have been rejected: {bad}")
+    print("[validation] PASSED")
+
+
+def test_track_keys():
+    """Changing a track changes its key and every later one, not earlier ones."""
+    keys = track_keys(parse_spec(SPEC))
+    assert len(set(keys)) == 3
+
+    changed = copy.deepcopy(SPEC)
+    changed["tracks"][1]["run_time"] = 1.0
+    changed_keys = track_keys(parse_spec(changed))
+    assert changed_keys[0] == keys[0]
+    assert changed_keys[1] != keys[1] and changed_keys[2] != keys[2]
+    print("[track_keys] PASSED")
+
+
+def test_scene_file():
+    """The scene file compiles and round-trips the spec."""
+    code = scene_file(parse_spec(SPEC))
+    compile(code, "scene.py", "exec")
+    assert "class DslScene(Scene):" in code
+    text = code.split('r"""', 1)[1].split('"""', 1)[0]
+    assert parse_spec(text) == parse_spec(SPEC)
+    print("[scene_file] PASSED")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Scene DSL Tests")
+    print("=" * 50)
+
+    test_validation()
+    test_track_keys()
+    test_scene_file()
+
+    print("\n" + "=" * 50)
+    print("All tests passed!")